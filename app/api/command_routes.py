@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from app.ipc.control_plane import control
+
+router = APIRouter()
+
+
+@router.get("/commands/stats")
+def get_command_stats():
+    """Relay command counters and ACK round-trip latency"""
+    return control.command_stats()
+
+
+@router.get("/commands/in-flight")
+def get_commands_in_flight():
+    """Commands sent to relays that are still waiting for their ACK"""
+    return {"commands": control.commands_in_flight()}
+
+
+@router.get("/commands/relays")
+def get_relay_states():
+    """Desired and reported boiler state of every relay, and whether it is synced"""
+    return {"relays": control.relays()}
@@ -1,17 +1,47 @@
-from fastapi import APIRouter, HTTPException
-from app.repositories import config_repo, state_repo
+from typing import Callable, List, Optional
+from fastapi import APIRouter, Body, Header, HTTPException, Response
+from app.repositories import config_repo
+from app.ipc.control_plane import control
 
 router = APIRouter()
 
+
+def _expected_etag(if_match: Optional[str]) -> Optional[str]:
+    """The ETag an edit was based on, None when the client did not ask for a check"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    etag = if_match.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _edit(name: str, response: Response, apply: Callable[[], str]) -> dict:
+    """Run a configuration edit, mapping repository errors to HTTP ones and returning the new ETag"""
+    try:
+        etag = apply()
+    except config_repo.ConfigConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"ETag": e.current_etag})
+    except (KeyError, IndexError) as e:
+        if not config_repo.config_exists(name):
+            raise HTTPException(status_code=404, detail=f"Configuration '{name}' not found")
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response.headers["ETag"] = etag
+    return {"status": "updated", "name": name, "etag": etag}
+
+
 @router.get("/configs")
 def get_all_configs():
     return config_repo.load_all_configs()
 
 
 @router.get("/configs/{name}")
-def get_config(name: str):
+def get_config(name: str, response: Response):
     try:
-        return config_repo.load_config(name)
+        config = config_repo.load_config(name)
+        response.headers["ETag"] = config_repo.config_etag(name)
+        return config
     except KeyError:
         raise HTTPException(status_code=404, detail = f"Configuration '{name}' not found")
 
@@ -19,7 +49,7 @@ def get_config(name: str):
 @router.post("/configs/{name}")
 def create_config(name: str):
     try:
-        config_repo.create_config(name)
+        control.create_config(name)
         return {"status": "created", "name": name}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -28,19 +58,17 @@ def create_config(name: str):
 @router.delete("/configs/{name}")
 def delete_config(name: str):
     try:
-        state = state_repo.load_state_threadsafe()
-        config_repo.delete_config(name, current_selected_config=state.selected_config)
+        # Refuses to delete a configuration that any zone still follows
+        control.delete_config(name)
         return {"status": "deleted", "name": name}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.put("/configs/{name}")
-def update_config(name: str, config_data: dict):
+def update_config(name: str, config_data: dict, response: Response, if_match: Optional[str] = Header(None)):
     try:
-        all_configs = config_repo.load_all_configs()
-
-        if name not in all_configs:
+        if not config_repo.config_exists(name):
             raise HTTPException(status_code=404, detail=f"Configuration '{name}' not found")
 
         for day in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]:
@@ -48,11 +76,34 @@ def update_config(name: str, config_data: dict):
                 intervals = config_repo.parse_intervals(config_data[day])
                 config_repo.check_interval_list(intervals)
 
-        all_configs[name] = config_data
-        config_repo.save_all_configs(all_configs)
+        etag = control.save_config(name, config_data, _expected_etag(if_match))
+        response.headers["ETag"] = etag
 
-        return {"status": "updated", "name": name}
+        return {"status": "updated", "name": name, "etag": etag}
+    except config_repo.ConfigConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"ETag": e.current_etag})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except KeyError as e:
-        raise HTTPException(status_code=404, detail=f"Configuration '{name}' not found")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail=f"Configuration '{name}' not found")
+
+
+@router.patch("/configs/{name}/days/{day}")
+def update_day(name: str, day: str, response: Response, intervals: List[dict] = Body(...),
+               if_match: Optional[str] = Header(None)):
+    """Replace one day's intervals. Send the ETag from GET /configs/{name} as If-Match to get 409 on conflicting edits."""
+    return _edit(name, response, lambda: control.update_day(name, day, intervals, _expected_etag(if_match)))
+
+
+@router.patch("/configs/{name}/days/{day}/intervals/{index}")
+def update_interval(name: str, day: str, index: int, changes: dict, response: Response,
+                    if_match: Optional[str] = Header(None)):
+    """Change some fields of one interval, e.g. {"ON_temperature": 20.5}"""
+    return _edit(name, response, lambda: control.update_interval(name, day, index, changes, _expected_etag(if_match)))
+
+
+@router.post("/configs/{name}/days/{day}/copy")
+def copy_day(name: str, day: str, response: Response, to: List[str] = Body(..., embed=True),
+             if_match: Optional[str] = Header(None)):
+    """Copy one day's intervals to the days listed in {"to": [...]}"""
+    return _edit(name, response, lambda: control.copy_day(name, day, to, _expected_etag(if_match)))
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from app.api import snapshot
+from app.api.zone_routes import resolve_zone
+from app.ipc.control_plane import control
+
+router = APIRouter()
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, Tuple[str, bytes]] = {}  # zone id -> (ETag, serialized dashboard)
+
+
+def _make_etag(zone_id: str, key: tuple) -> str:
+    state_version, config_signature, device_version, is_stale = key
+    # Versions restart at zero with the control loop, its boot id keeps ETags from an earlier run from matching.
+    # Both come from the control loop, so every API worker builds the same ETag for the same state.
+    return f'"{control.boot_id()}.{zone_id}.{state_version}.{config_signature}.{device_version}.{int(is_stale)}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def _dashboard_body(zone_id: str, etag: str, now: datetime) -> bytes:
+    """Serialized dashboard of a zone, rebuilt only when the ETag changed since the last call"""
+    with _cache_lock:
+        cached = _cache.get(zone_id)
+        if cached is not None and cached[0] == etag:
+            return cached[1]
+
+        dashboard = snapshot.build_dashboard(now, zone_id)
+        # The server time travels in the Date header so the body stays cacheable
+        del dashboard["state"]["server_time"]
+        body = json.dumps(dashboard, separators=(',', ':')).encode()
+        _cache[zone_id] = (etag, body)
+        return body
+
+
+@router.get("/dashboard")
+def get_dashboard(request: Request, zone_id: str = Depends(resolve_zone)):
+    """Get state, active interval, active config and device status of a zone in one response"""
+    try:
+        now = datetime.now()
+        etag = _make_etag(zone_id, snapshot.version_key(now, zone_id))
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        body = _dashboard_body(zone_id, etag, now)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building dashboard: {str(e)}")
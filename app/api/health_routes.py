@@ -0,0 +1,45 @@
+import time
+from datetime import datetime
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import startup
+from app.ipc.control_plane import control
+from app.mqtt import client
+
+router = APIRouter()
+
+
+@router.get("/health/live")
+def get_liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive", "uptime_seconds": round(time.monotonic() - startup.PROCESS_STARTED, 3)}
+
+
+@router.get("/health/ready")
+def get_readiness():
+    """
+    503 until startup has finished and the broker is connected.
+    Relays that are not synced and sensors without recent readings are reported as degraded, not unready.
+    """
+    broker_connected = control.broker_connected()
+    now = datetime.now()
+
+    zones = {}
+    for zone_id in control.list_zones():
+        last_reading = control.last_reading(zone_id)
+        sensor_age = (now - last_reading).total_seconds() if last_reading is not None else None
+        zones[zone_id] = {
+            "relay_synced": control.relay_synced(zone_id),
+            "sensor_age_seconds": round(sensor_age, 1) if sensor_age is not None else None,
+            "sensor_fresh": sensor_age is not None and sensor_age < client.SENSOR_TIMEOUT.total_seconds(),
+        }
+
+    ready = control.warmed_up() and broker_connected
+    degraded = any(not zone["relay_synced"] or not zone["sensor_fresh"] for zone in zones.values())
+    body = {
+        "status": ("degraded" if degraded else "ready") if ready else "not_ready",
+        "broker_connected": broker_connected,
+        "startup": control.startup_report(),
+        "zones": zones,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
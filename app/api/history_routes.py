@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.repositories import history_repo
+from app.api.time_range import parse_time_range
+from app.api.zone_routes import resolve_zone
+
+router = APIRouter()
+
+DEFAULT_RANGE = timedelta(hours=24)
+TARGET_BUCKETS = 500  # bucket count aimed for when no bucket size is given
+MAX_BUCKETS = 100_000
+NICE_BUCKET_SECONDS = [60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400]
+BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_bucket(bucket: str) -> int:
+    """Accept plain seconds or a number with a s/m/h/d/w suffix, e.g. "15m" """
+    bucket = bucket.strip().lower()
+    if bucket[-1:] in BUCKET_UNITS:
+        seconds = int(bucket[:-1]) * BUCKET_UNITS[bucket[-1]]
+    else:
+        seconds = int(bucket)
+    if seconds <= 0:
+        raise ValueError("bucket must be positive")
+    return seconds
+
+
+def default_bucket(span_seconds: int) -> int:
+    for seconds in NICE_BUCKET_SECONDS:
+        if span_seconds / seconds <= TARGET_BUCKETS:
+            return seconds
+    return NICE_BUCKET_SECONDS[-1]
+
+
+def _stream_history(start: datetime, end: datetime, bucket_seconds: int, zone_id: str):
+    start_ts = int(start.timestamp())
+    yield (
+        f'{{"from":"{start.isoformat()}","to":"{end.isoformat()}",'
+        f'"bucket_seconds":{bucket_seconds},"buckets":['
+    )
+
+    records = history_repo.iter_raw_readings(start, end, zone_id)
+    separator = ""
+    for bucket_start, low, high, total, count in history_repo.iter_buckets(records, start_ts, bucket_seconds):
+        yield separator + json.dumps({
+            "start": datetime.fromtimestamp(bucket_start).isoformat(),
+            "min": low / 10,
+            "max": high / 10,
+            "avg": round(total / count / 10, 2),
+            "count": count
+        })
+        separator = ","
+
+    yield "]}"
+
+
+@router.get("/history")
+def get_history(
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    bucket: Optional[str] = None,
+    zone_id: str = Depends(resolve_zone)
+):
+    """
+    Temperature history of a zone downsampled into min/max/avg/count buckets.
+    from and to are ISO timestamps (default: the last 24 hours), bucket is e.g. 300, 5m or 1h.
+    The response is streamed, long ranges are never held in memory.
+    """
+    start_time, end_time = parse_time_range(start, end, DEFAULT_RANGE)
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="from must be before to")
+
+    span_seconds = int((end_time - start_time).total_seconds())
+    try:
+        bucket_seconds = parse_bucket(bucket) if bucket else default_bucket(span_seconds)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bucket must be seconds or a number with s/m/h/d/w suffix")
+
+    if span_seconds / bucket_seconds > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Too many buckets, at most {MAX_BUCKETS} are allowed")
+
+    return StreamingResponse(_stream_history(start_time, end_time, bucket_seconds, zone_id), media_type="application/json")
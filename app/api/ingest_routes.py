@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.ipc.control_plane import control
+
+router = APIRouter()
+
+
+@router.get("/ingest/stats")
+def get_ingest_stats():
+    """MQTT ingest queue depth per lane, drop and coalesce counts and processing lag"""
+    return control.ingest_stats()
@@ -0,0 +1,43 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils import metrics
+
+router = APIRouter()
+
+REQUEST_SECONDS = metrics.Histogram(
+    "boiler_http_request_seconds", "API latency until the response starts, by route template", ["method", "route"]
+)
+
+
+class RequestTimingMiddleware:
+    """
+    Plain ASGI middleware, so streamed responses pass through untouched.
+    Requests are labelled with the matched route template, never the raw path, to keep the label set small.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                REQUEST_SECONDS.labels(scope["method"], route.path if route is not None else "other").observe(
+                    time.perf_counter() - started
+                )
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
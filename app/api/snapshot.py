@@ -0,0 +1,85 @@
+from app.repositories import config_repo
+from app.ipc.control_plane import control
+from app.models.state import State
+from app.constants import DEFAULT_ZONE
+from datetime import datetime, timedelta
+
+OFFLINE_DEVICE = {"status": "offline", "ip_address": None, "device_id": None}
+
+
+def is_temp_stale(state: State, now: datetime) -> bool:
+    return now - state.current_timestamp > timedelta(minutes=1)
+
+
+def version_key(now: datetime, zone_id: str = DEFAULT_ZONE) -> tuple:
+    """Changes whenever anything in build_dashboard would change, apart from the server time"""
+    state = control.load_state(zone_id)
+    return (
+        control.state_version(zone_id),
+        config_repo.get_store_signature(),
+        control.device_status_version(zone_id),
+        is_temp_stale(state, now)
+    )
+
+
+def build_state(state: State, now: datetime) -> dict:
+    return {
+        "selected_config": state.selected_config,
+        "active_interval": state.active_interval,
+        "boiler_state": state.boiler_state,
+        "current_temp": state.current_temp,
+        "current_timestamp": state.current_timestamp.isoformat(),
+        "prev_temp": state.prev_temp,
+        "prev_timestamp": state.prev_timestamp.isoformat(),
+        "temp_measure_period": state.temp_measure_period,
+        "consecutive_measures": state.consecutive_measures,
+        "server_time": now.isoformat(),
+        "is_temp_stale": is_temp_stale(state, now),
+        "hysteresis": state.hysteresis
+    }
+
+
+def build_active_interval_details(state: State) -> dict:
+    if not state.active_interval:
+        return {"active_interval": None}
+
+    config = config_repo.load_config(state.selected_config)
+    interval_obj = config_repo.get_interval_obj(config, state.active_interval)
+    return {
+        "active_interval": state.active_interval,
+        "start_time": str(interval_obj.start_time),
+        "end_time": str(interval_obj.end_time),
+        "ON_temperature": interval_obj.ON_temperature,
+        "OFF_temperature": interval_obj.OFF_temperature
+    }
+
+
+def build_active_config(state: State) -> dict:
+    if not state.selected_config:
+        return {"config_name": None, "config": None}
+
+    all_configs = config_repo.load_all_configs()
+    return {
+        "config_name": state.selected_config,
+        "config": all_configs.get(state.selected_config)
+    }
+
+
+def build_devices_status(zone_id: str = DEFAULT_ZONE) -> dict:
+    devices = control.connected_devices(zone_id)
+    return {
+        "relay": devices.get("relay", OFFLINE_DEVICE),
+        "sensor": devices.get("sensor", OFFLINE_DEVICE)
+    }
+
+
+def build_dashboard(now: datetime = None, zone_id: str = DEFAULT_ZONE) -> dict:
+    """Everything the dashboard shows for a zone, built from one state snapshot"""
+    now = now or datetime.now()
+    state = control.load_state(zone_id)
+    return {
+        "state": build_state(state, now),
+        "active_interval": build_active_interval_details(state),
+        "active_config": build_active_config(state),
+        "devices": build_devices_status(zone_id)
+    }
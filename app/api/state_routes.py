@@ -1,41 +1,25 @@
-from fastapi import APIRouter, HTTPException
-from app.repositories import state_repo, config_repo
+from fastapi import APIRouter, Depends, HTTPException
+from app.repositories import config_repo
+from app.ipc.control_plane import control
 from app.models.time import Time
-from app.mqtt import handlers
-from datetime import datetime, timedelta
+from app.api import snapshot
+from app.api.zone_routes import resolve_zone
+from datetime import datetime
 
 router = APIRouter()
 
 @router.get("/state")
-def get_state():
+def get_state(zone_id: str = Depends(resolve_zone)):
     """Get current system state"""
     try:
-        state = state_repo.load_state_threadsafe()
-        server_time = datetime.now()
-
-        time_since_last_temp = server_time - state.current_timestamp
-        is_temp_stale = time_since_last_temp > timedelta(minutes=1)
-
-        return {
-            "selected_config": state.selected_config,
-            "active_interval": state.active_interval,
-            "boiler_state": state.boiler_state,
-            "current_temp": state.current_temp,
-            "current_timestamp": state.current_timestamp.isoformat(),
-            "prev_temp": state.prev_temp,
-            "prev_timestamp": state.prev_timestamp.isoformat(),
-            "temp_measure_period": state.temp_measure_period,
-            "consecutive_measures": state.consecutive_measures,
-            "server_time": server_time.isoformat(),
-            "is_temp_stale": is_temp_stale,
-            "hysteresis": state.hysteresis
-        }
+        state = control.load_state(zone_id)
+        return snapshot.build_state(state, datetime.now())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading state: {str(e)}")
 
 
 @router.post("/state/select-config")
-def select_config(config_data: dict):
+def select_config(config_data: dict, zone_id: str = Depends(resolve_zone)):
     """Change the selected configuration"""
     try:
         config_name = config_data.get("config_name")
@@ -47,7 +31,7 @@ def select_config(config_data: dict):
         now = datetime.now()
         current_time = Time(now.hour, now.minute)
 
-        state_repo.change_selected_configuration(config_name, current_time)
+        control.select_config(config_name, current_time, zone_id)
         
         return {"status": "success", "selected_config": config_name}
         
@@ -58,53 +42,53 @@ def select_config(config_data: dict):
 
 
 @router.get("/state/active-interval-details")
-def get_active_interval_details():
+def get_active_interval_details(zone_id: str = Depends(resolve_zone)):
     """Get detailed information about the currently active interval"""
     try:
-        state = state_repo.load_state_threadsafe()
-        config = config_repo.load_config(state.selected_config)
-
-        if state.active_interval:
-            interval_obj = config_repo.get_interval_obj(config, state.active_interval)
-            return {
-                "active_interval": state.active_interval,
-                "start_time": str(interval_obj.start_time),
-                "end_time": str(interval_obj.end_time),
-                "ON_temperature": interval_obj.ON_temperature,
-                "OFF_temperature": interval_obj.OFF_temperature
-            }
-        else:
-            return {"active_interval": None}
+        state = control.load_state(zone_id)
+        return snapshot.build_active_interval_details(state)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting interval details: {str(e)}")
 
 
-@router.get("/state/active-config")
-def get_active_config():
-    """Get the complete active configuration"""
+@router.get("/state/upcoming-transitions")
+def get_upcoming_transitions(count: int = 5, zone_id: str = Depends(resolve_zone)):
+    """Get the next interval changes of the selected configuration"""
+    if count < 1 or count > 100:
+        raise HTTPException(status_code=400, detail="count must be between 1 and 100")
+
     try:
-        state = state_repo.load_state_threadsafe()
+        state = control.load_state(zone_id)
+        config = config_repo.load_config(state.selected_config)
 
-        if not state.selected_config:
-            return {"config_name": None, "config": None}
+        transitions = []
+        for starts_at, interval in config_repo.upcoming_transitions(config, datetime.now(), count):
+            interval_obj = config_repo.get_interval_obj(config, interval) if interval else None
+            transitions.append({
+                "starts_at": starts_at.isoformat(),
+                "active_interval": interval,
+                "ON_temperature": interval_obj.ON_temperature if interval_obj else None,
+                "OFF_temperature": interval_obj.OFF_temperature if interval_obj else None
+            })
+
+        return {"config_name": state.selected_config, "transitions": transitions}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting upcoming transitions: {str(e)}")
 
-        all_configs = config_repo.load_all_configs()
-        config_data = all_configs.get(state.selected_config)
 
-        if config_data:
-            return {
-                "config_name": state.selected_config,
-                "config": config_data
-            }
-        else:
-            return {"config_name": state.selected_config, "config": None}
+@router.get("/state/active-config")
+def get_active_config(zone_id: str = Depends(resolve_zone)):
+    """Get the complete active configuration"""
+    try:
+        state = control.load_state(zone_id)
+        return snapshot.build_active_config(state)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting active config: {str(e)}")
 
 
 @router.put("/state/hysteresis")
-def update_hysteresis(data: dict):
+def update_hysteresis(data: dict, zone_id: str = Depends(resolve_zone)):
     """Update the hysteresis value"""
     try:
         hysteresis = data.get("hysteresis")
@@ -114,7 +98,7 @@ def update_hysteresis(data: dict):
         if not isinstance(hysteresis, (int, float)) or hysteresis < 0 or hysteresis > 5:
             raise HTTPException(status_code=400, detail="hysteresis must be between 0 and 5")
 
-        state_repo.update_hysteresis(float(hysteresis))
+        control.update_hysteresis(float(hysteresis), zone_id)
         return {"status": "success", "hysteresis": hysteresis}
     except HTTPException:
         raise
@@ -123,13 +107,9 @@ def update_hysteresis(data: dict):
 
 
 @router.get("/devices/status")
-def get_devices_status():
+def get_devices_status(zone_id: str = Depends(resolve_zone)):
     """Get status of connected devices (relay and sensor)"""
     try:
-        devices = handlers.get_connected_devices()
-        return {
-            "relay": devices.get("relay", {"status": "offline", "ip_address": None, "device_id": None}),
-            "sensor": devices.get("sensor", {"status": "offline", "ip_address": None, "device_id": None})
-        }
+        return snapshot.build_devices_status(zone_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting device status: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""
+The dashboard's static files, prepared once at startup and served from memory.
+
+- index.html is rewritten to point at content-hashed copies of the CSS and JS (style.<hash>.css),
+  which are served as immutable, so browsers keep them until a deploy changes their content
+- optionally the <script> tags of index.html are replaced by one bundle of the scripts, in order
+- text files are precompressed with gzip, and brotli when the brotli package is installed,
+  and each client gets the smallest variant it accepts
+- index.html and the original file names are served with no-cache and an ETag, so they revalidate
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.utils.log import get_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = get_logger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MIN_COMPRESS_SIZE = 256  # bytes, smaller files are not worth the extra header
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+BUNDLE_NAME = "js/bundle.js"
+
+_ASSET_REFERENCE = re.compile(r'(href|src)="([^"]+)"')
+_LOCAL_SCRIPT = re.compile(r'[ \t]*<script src="(?!https?:|//)([^"]+)"></script>\n?')
+
+
+@dataclass
+class Asset:
+    content_type: str
+    cache_control: str
+    # (encoding, body, ETag) for "identity" and each smaller compressed encoding, smallest first
+    variants: List[Tuple[str, bytes, str]] = field(default_factory=list)
+
+
+def _content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:12]
+
+
+def _hashed_name(name: str, body: bytes) -> str:
+    path = Path(name)
+    return str(path.with_name(f"{path.stem}.{_content_hash(body)}{path.suffix}"))
+
+
+def _content_type(name: str) -> str:
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _make_asset(name: str, body: bytes, cache_control: str) -> Asset:
+    content_type = _content_type(name)
+    digest = _content_hash(body)
+    variants = [("identity", body, f'"{digest}"')]
+    if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+        compressed = [("gzip", gzip.compress(body, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            compressed.append(("br", brotli.compress(body, quality=11)))
+        for encoding, data in compressed:
+            if len(data) < len(body):
+                variants.append((encoding, data, f'"{digest}-{encoding}"'))
+    variants.sort(key=lambda variant: len(variant[1]))
+    return Asset(content_type, cache_control, variants)
+
+
+def _bundle_scripts(index: str, files: Dict[str, bytes]) -> Tuple[str, Optional[bytes]]:
+    """Replace the local <script> tags with one tag for their concatenation, in the same order"""
+    names = [name for name in _LOCAL_SCRIPT.findall(index) if name in files]
+    if len(names) < 2:
+        return index, None
+
+    # Classic scripts share one global scope, so concatenating them keeps their meaning
+    bundle = b"".join(b"// " + name.encode() + b"\n" + files[name] + b"\n;\n" for name in names)
+    first = True
+
+    def replace(match: re.Match) -> str:
+        nonlocal first
+        if match.group(1) not in files:
+            return match.group(0)
+        if first:
+            first = False
+            indent = match.group(0)[:len(match.group(0)) - len(match.group(0).lstrip())]
+            return f'{indent}<script src="{BUNDLE_NAME}"></script>\n'
+        return ""
+
+    return _LOCAL_SCRIPT.sub(replace, index), bundle
+
+
+def build_assets(directory: Path, bundle_js: bool = True) -> Dict[str, Asset]:
+    """Every servable path, relative to directory, mapped to its prepared asset"""
+    files = {
+        path.relative_to(directory).as_posix(): path.read_bytes()
+        for path in sorted(directory.rglob("*")) if path.is_file()
+    }
+    assets: Dict[str, Asset] = {}
+    hashed_names: Dict[str, str] = {}
+    for name, body in files.items():
+        # The original names keep working, e.g. for a page loaded before the last deploy
+        assets[name] = _make_asset(name, body, REVALIDATE)
+        if name.endswith((".css", ".js")):
+            hashed_names[name] = _hashed_name(name, body)
+            assets[hashed_names[name]] = _make_asset(name, body, IMMUTABLE)
+
+    index = files.get("index.html")
+    if index is not None:
+        html = index.decode()
+        if bundle_js:
+            html, bundle = _bundle_scripts(html, files)
+            if bundle is not None:
+                hashed_names[BUNDLE_NAME] = _hashed_name(BUNDLE_NAME, bundle)
+                assets[hashed_names[BUNDLE_NAME]] = _make_asset(BUNDLE_NAME, bundle, IMMUTABLE)
+
+        html = _ASSET_REFERENCE.sub(
+            lambda match: f'{match.group(1)}="{hashed_names.get(match.group(2), match.group(2))}"', html
+        )
+        assets["index.html"] = _make_asset("index.html", html.encode(), REVALIDATE)
+
+    log.info("Prepared %d static assets%s%s", len(assets), ", scripts bundled" if BUNDLE_NAME in hashed_names else "",
+             "" if brotli is not None else ", gzip only (brotli not installed)")
+    return assets
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    encodings = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            encodings[token.strip().lower()] = quality
+    return encodings
+
+
+def _choose_variant(asset: Asset, accept_encoding: str) -> Tuple[str, bytes, str]:
+    """The smallest variant the client accepts; identity is always acceptable and always present"""
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    return next(
+        variant for variant in asset.variants
+        if variant[0] == "identity" or accepted.get(variant[0], wildcard) > 0
+    )
+
+
+class StaticAssets:
+    """ASGI app serving the prepared assets; HEAD and If-None-Match are supported"""
+
+    def __init__(self, directory: Path, bundle_js: bool = True):
+        self.assets = build_assets(directory, bundle_js)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        if scope["method"] not in ("GET", "HEAD"):
+            await self._respond(send, 405, [(b"allow", b"GET, HEAD"), (b"content-type", b"text/plain")], b"Method Not Allowed")
+            return
+
+        name = scope["path"].lstrip("/")
+        if name == "" or name.endswith("/"):
+            name += "index.html"
+        asset = self.assets.get(name)
+        if asset is None:
+            await self._respond(send, 404, [(b"content-type", b"text/plain")], b"Not Found")
+            return
+
+        encoding, body, etag = _choose_variant(asset, headers.get("accept-encoding", ""))
+        response_headers = [
+            (b"cache-control", asset.cache_control.encode()),
+            (b"etag", etag.encode()),
+        ]
+        if len(asset.variants) > 1:
+            response_headers.append((b"vary", b"Accept-Encoding"))
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag in (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")):
+            await self._respond(send, 304, response_headers, b"")
+            return
+
+        response_headers.append((b"content-type", asset.content_type.encode()))
+        if encoding != "identity":
+            response_headers.append((b"content-encoding", encoding.encode()))
+        await self._respond(send, 200, response_headers, body, head=scope["method"] == "HEAD")
+
+    @staticmethod
+    async def _respond(send, status: int, headers: list, body: bytes, head: bool = False):
+        if status != 304:
+            headers = headers + [(b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if head else body})
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.repositories import journal_repo
+from app.api.time_range import parse_time_range
+from app.api.zone_routes import resolve_zone
+
+router = APIRouter()
+
+DEFAULT_RANGES = {
+    "hourly": timedelta(hours=48),
+    "daily": timedelta(days=30),
+    "monthly": timedelta(days=365),
+}
+
+
+def _runtime(on_seconds: float, seconds: float) -> dict:
+    return {
+        "burner_hours": round(on_seconds / 3600, 3),
+        "duty_cycle": round(on_seconds / seconds, 4) if seconds else None
+    }
+
+
+@router.get("/stats")
+def get_stats(
+    period: str = "daily",
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    zone_id: str = Depends(resolve_zone)
+):
+    """Burner hours, duty cycle and toggle counts per hour, day or month, also broken down per interval"""
+    if period not in DEFAULT_RANGES:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(DEFAULT_RANGES)}")
+
+    start_time, end_time = parse_time_range(start, end, DEFAULT_RANGES[period])
+
+    try:
+        buckets = []
+        for bucket in journal_repo.get_rollups(period, start_time, end_time, zone_id=zone_id):
+            buckets.append({
+                "period": bucket["period"],
+                **_runtime(bucket["on_seconds"], bucket["seconds"]),
+                "toggles": bucket["toggles"],
+                "intervals": {
+                    interval: _runtime(values["on_seconds"], values["seconds"])
+                    for interval, values in bucket["intervals"].items()
+                }
+            })
+        return {"period": period, "buckets": buckets}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading stats: {str(e)}")
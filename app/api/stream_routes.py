@@ -0,0 +1,144 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Optional, Set
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.api import snapshot
+from app.api.zone_routes import resolve_zone
+from app.utils.log import get_logger
+
+router = APIRouter()
+log = get_logger(__name__)
+
+POLL_INTERVAL = 0.25  # seconds between checks for changed versions
+KEEPALIVE_INTERVAL = 15  # seconds of silence before a keepalive comment is sent
+CLIENT_QUEUE_SIZE = 16  # pending events per client before it is resynced with a full snapshot
+
+
+def _format_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class StateBroadcaster:
+    """
+    Watches a zone's state, configuration and device status versions and fans changes out to stream clients.
+    Every change is serialized once and the same bytes are queued for every client.
+    The polling task only runs while the zone has clients.
+    Snapshots are built in a worker thread, since they take repository locks and may hit storage,
+    and one at a time, so a delta is always taken against the snapshot clients last got.
+    """
+
+    def __init__(self, zone_id: str):
+        self.zone_id = zone_id
+        self._clients: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._key = None
+        self._sections: Optional[dict] = None
+        self._snapshot_event: Optional[bytes] = None
+        self._refresh_lock = asyncio.Lock()
+
+    def _refresh(self) -> Optional[dict]:
+        """Rebuild the snapshot if anything changed and return what differs from the previous one"""
+        now = datetime.now()
+        key = snapshot.version_key(now, self.zone_id)
+        if key == self._key and self._sections is not None:
+            return None
+
+        sections = snapshot.build_dashboard(now, self.zone_id)
+        previous = self._sections
+        self._key = key
+        self._sections = sections
+        self._snapshot_event = _format_event("snapshot", sections)
+
+        if previous is None:
+            return None
+
+        delta = {}
+        for name, section in sections.items():
+            if name == "state":
+                changed = {
+                    field: value for field, value in section.items()
+                    if field != "server_time" and previous["state"].get(field) != value
+                }
+                if changed:
+                    delta["state"] = changed
+            elif section != previous[name]:
+                delta[name] = section
+        return delta or None
+
+    def _send(self, queue: asyncio.Queue, event: bytes):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client fell behind, replace its backlog with one full snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(self._snapshot_event)
+
+    async def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        async with self._refresh_lock:
+            if not self._clients:
+                # Nobody else is listening, so no delta can be lost by refreshing here
+                await asyncio.to_thread(self._refresh)
+            queue.put_nowait(self._snapshot_event)
+            self._clients.add(queue)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    async def _run(self):
+        while self._clients:
+            await asyncio.sleep(POLL_INTERVAL)
+            async with self._refresh_lock:
+                try:
+                    delta = await asyncio.to_thread(self._refresh)
+                except Exception as e:
+                    log.error("Zone %s: error building state snapshot: %s", self.zone_id, e)
+                    continue
+
+                if delta:
+                    event = _format_event("delta", delta)
+                    for queue in list(self._clients):
+                        self._send(queue, event)
+
+
+_broadcasters: Dict[str, StateBroadcaster] = {}
+
+
+def get_broadcaster(zone_id: str) -> StateBroadcaster:
+    # Only touched from the event loop, no lock needed
+    broadcaster = _broadcasters.get(zone_id)
+    if broadcaster is None:
+        broadcaster = _broadcasters[zone_id] = StateBroadcaster(zone_id)
+    return broadcaster
+
+
+@router.get("/state/stream")
+async def stream_state(request: Request, zone_id: str = Depends(resolve_zone)):
+    """Server-Sent Events stream: a full snapshot on connect, then deltas as the zone's state changes"""
+    broadcaster = get_broadcaster(zone_id)
+    queue = await broadcaster.subscribe()
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    event = b": keepalive\n\n"
+                yield event
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from fastapi import HTTPException
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    ISO date or timestamp as a naive local datetime, the form every stored time is in.
+    One with an offset, e.g. 2025-01-01T00:00:00+00:00, is converted to local time.
+    """
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def parse_time_range(start: Optional[str], end: Optional[str], default_range: timedelta) -> Tuple[datetime, datetime]:
+    """The from and to query values, by default default_range up to now. Raises a 400 if either is malformed."""
+    try:
+        end_time = parse_timestamp(end) if end else datetime.now()
+        start_time = parse_timestamp(start) if start else end_time - default_range
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be ISO timestamps")
+    return start_time, end_time
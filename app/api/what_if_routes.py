@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException
+from app import what_if
+from app.repositories import config_repo
+from app.api.time_range import parse_time_range
+from app.api.zone_routes import resolve_zone
+
+router = APIRouter()
+
+DEFAULT_RANGE = timedelta(days=28)
+MAX_RANGE = timedelta(days=366)
+MAX_CONFIGS = 50
+
+
+@router.post("/what-if")
+def compare_configs(
+    configs: Optional[List[str]] = Body(None),
+    candidates: Optional[Dict[str, Dict]] = Body(None),
+    start: Optional[str] = Body(None, alias="from"),
+    end: Optional[str] = Body(None, alias="to"),
+    boiler_on: bool = Body(False),
+    zone_id: str = Depends(resolve_zone)
+):
+    """
+    Compare configurations against the zone's recorded temperatures before selecting one:
+    projected boiler runtime, toggles and comfort deviation per week.
+    configs names stored configurations (default: all of them when no candidates are given),
+    candidates maps names to unsaved configurations in the stored format.
+    from and to are ISO timestamps (default: the last 28 days).
+    """
+    start_time, end_time = parse_time_range(start, end, DEFAULT_RANGE)
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if end_time - start_time > MAX_RANGE:
+        raise HTTPException(status_code=400, detail=f"The range may span at most {MAX_RANGE.days} days")
+
+    if configs is None and not candidates:
+        configs = list(config_repo.load_all_configs())
+    parsed = []
+    for name in configs or []:
+        try:
+            parsed.append(config_repo.load_config(name))
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Configuration '{name}' not found")
+    for name, config in (candidates or {}).items():
+        try:
+            parsed.append(config_repo.parse_candidate(name, config))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="Nothing to compare, give configs or candidates")
+    if len(parsed) > MAX_CONFIGS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CONFIGS} configurations can be compared at once")
+
+    started = time.perf_counter()
+    trace = what_if.load_trace(start_time, end_time, zone_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No temperature readings for zone '{zone_id}' in range")
+    results = what_if.compare(parsed, trace, boiler_on)
+
+    return {
+        "from": trace.start.isoformat(),
+        "to": (trace.start + timedelta(minutes=len(trace.temps))).isoformat(),
+        "readings": trace.readings,
+        "weeks": round(trace.weeks, 3),
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.constants import DEFAULT_ZONE
+from app.repositories import config_repo
+from app.ipc.control_plane import control
+from app.mqtt import topics
+
+router = APIRouter()
+
+
+def resolve_zone(zone: str = Query(DEFAULT_ZONE)) -> str:
+    """Dependency for the zone query parameter shared by all per-zone routes"""
+    if not topics.is_valid_zone_id(zone):
+        raise HTTPException(status_code=400, detail="zone may only contain letters, digits, '-' and '_'")
+    if not control.zone_exists(zone):
+        raise HTTPException(status_code=404, detail=f"Zone '{zone}' not found")
+    return zone
+
+
+@router.get("/zones")
+def get_zones():
+    """List every zone with its selected configuration, temperature and boiler state"""
+    try:
+        zones = []
+        for zone_id in control.list_zones():
+            state = control.load_state(zone_id)
+            zones.append({
+                "zone_id": zone_id,
+                "selected_config": state.selected_config,
+                "active_interval": state.active_interval,
+                "current_temp": state.current_temp,
+                "boiler_state": state.boiler_state
+            })
+        return {"zones": zones}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing zones: {str(e)}")
+
+
+@router.post("/zones/{zone_id}")
+def create_zone(zone_id: str, zone_data: dict = None):
+    """Create a zone, optionally following a given configuration"""
+    if not topics.is_valid_zone_id(zone_id):
+        raise HTTPException(status_code=400, detail="zone id may only contain letters, digits, '-' and '_'")
+    if control.zone_exists(zone_id):
+        raise HTTPException(status_code=400, detail=f"Zone '{zone_id}' already exists")
+
+    config_name = (zone_data or {}).get("config_name")
+    if config_name is not None and not config_repo.config_exists(config_name):
+        raise HTTPException(status_code=404, detail=f"Configuration '{config_name}' not found")
+
+    try:
+        state = control.create_zone(zone_id, config_name)
+        return {
+            "status": "created",
+            "zone_id": zone_id,
+            "selected_config": state.selected_config,
+            "sensor_topic": topics.zone_topic(zone_id, topics.SENSOR_SUFFIX),
+            "boiler_topic": topics.zone_topic(zone_id, topics.BOILER_SUFFIX)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating zone: {str(e)}")
@@ -22,3 +22,9 @@ DEFAULT_INTERVALS = [
         "OFF_temperature": 21.0
     }
 ]
+
+# Zone used by single-zone installs, it keeps the original topics and storage files
+DEFAULT_ZONE = "default"
+
+# Zone ids end up in MQTT topics and file names
+ZONE_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
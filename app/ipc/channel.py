@@ -0,0 +1,103 @@
+"""
+Request/reply commands over a local socket (multiprocessing.connection, authenticated with a shared key).
+A request is (command, kwargs); the reply is ("ok", result) or ("error", exception) and the client re-raises it.
+"""
+import os
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+
+class CommandServer:
+    """Serves every connection on its own thread, so one slow command does not hold up other workers"""
+
+    def __init__(self, address: Path, authkey: bytes, commands: Dict[str, Callable[..., Any]]):
+        self.address = address
+        self.commands = commands
+        if address.exists():
+            address.unlink()  # left behind by a process that did not shut down cleanly
+        self._listener = Listener(str(address), family="AF_UNIX", authkey=authkey)
+        self._closed = False
+
+    def start(self):
+        threading.Thread(target=self._accept, name="command-server", daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if not self._closed:
+                    log.exception("Command server stopped accepting connections")
+                return
+            except Exception as e:
+                log.warning("Rejected command connection: %s", e)  # wrong authkey
+                continue
+            threading.Thread(target=self._serve, args=(connection,), name="command-connection", daemon=True).start()
+
+    def _serve(self, connection: Connection):
+        with connection:
+            while True:
+                try:
+                    command, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                handler = self.commands.get(command)
+                try:
+                    if handler is None:
+                        raise ValueError(f"Unknown command '{command}'")
+                    reply = ("ok", handler(**kwargs))
+                except Exception as e:
+                    reply = ("error", e)
+
+                try:
+                    connection.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # The result or exception could not be pickled, send something that can
+                    connection.send(("error", RuntimeError(f"{command} failed: {reply[1]}")))
+
+
+class CommandClient:
+    """
+    One connection per process, opened on first use and reopened once if the server went away.
+    A command may then run twice, so commands must be idempotent.
+    """
+
+    def __init__(self, address: Path, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._lock = threading.Lock()
+        self._connection: Optional[Connection] = None
+
+    def call(self, command: str, **kwargs) -> Any:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._connection is None:
+                        self._connection = Client(str(self.address), family="AF_UNIX", authkey=self.authkey)
+                    self._connection.send((command, kwargs))
+                    status, result = self._connection.recv()
+                    break
+                except (EOFError, OSError):
+                    self._connection = None
+                    if attempt:
+                        raise
+
+        if status == "error":
+            raise result
+        return result
@@ -0,0 +1,390 @@
+"""
+Everything the HTTP API reads from or asks of the control loop (zone state, relays, devices, MQTT status),
+behind one interface:
+- local: in-process calls, when the API and the control loop share a process
+- remote: the snapshot the control process publishes to shared memory, and commands over its socket,
+  when the API runs in worker processes of its own
+"""
+import secrets
+from abc import ABC, abstractmethod
+from dataclasses import asdict, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+import app.repositories.config_repo as cfg
+import app.repositories.device_status_repo as device_repo
+import app.repositories.state_repo as sr
+from app import settings, startup
+from app.ipc.channel import CommandClient
+from app.ipc.shared_state import SharedStateReader
+from app.models.state import State
+from app.models.time import Time
+from app.mqtt import client, handlers
+
+# Identifies this run of the control loop; its state and device versions restart at zero with it
+BOOT_ID = secrets.token_hex(4)
+
+
+def state_to_dict(state: State) -> Dict:
+    data = asdict(state)
+    data["current_timestamp"] = state.current_timestamp.isoformat()
+    data["prev_timestamp"] = state.prev_timestamp.isoformat()
+    return data
+
+
+def state_from_dict(data: Dict) -> State:
+    return State(**dict(
+        data,
+        current_timestamp=datetime.fromisoformat(data["current_timestamp"]),
+        prev_timestamp=datetime.fromisoformat(data["prev_timestamp"])
+    ))
+
+
+class ControlPlane(ABC):
+    @abstractmethod
+    def boot_id(self) -> str:
+        """Changes when the control loop restarts, and with it every version number"""
+        ...
+
+    @abstractmethod
+    def list_zones(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def zone_exists(self, zone_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def load_state(self, zone_id: str) -> State:
+        """A copy of the zone's state, raises FileNotFoundError for an unknown zone"""
+        ...
+
+    @abstractmethod
+    def state_version(self, zone_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def device_status_version(self, zone_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def connected_devices(self, zone_id: str) -> Dict:
+        ...
+
+    @abstractmethod
+    def last_reading(self, zone_id: str) -> Optional[datetime]:
+        """When the zone's sensor last sent a temperature"""
+        ...
+
+    @abstractmethod
+    def relays(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def command_stats(self) -> Dict:
+        ...
+
+    @abstractmethod
+    def commands_in_flight(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def ingest_stats(self) -> Dict:
+        ...
+
+    @abstractmethod
+    def broker_connected(self) -> bool:
+        ...
+
+    @abstractmethod
+    def warmed_up(self) -> bool:
+        ...
+
+    @abstractmethod
+    def startup_report(self) -> Dict:
+        ...
+
+    @abstractmethod
+    def select_config(self, name: str, current_time: Time, zone_id: str):
+        ...
+
+    @abstractmethod
+    def update_hysteresis(self, value: float, zone_id: str):
+        ...
+
+    @abstractmethod
+    def create_zone(self, zone_id: str, config_name: str = None) -> State:
+        ...
+
+    # Configuration edits go through the control loop too, so one process writes the store and checks ETags
+
+    @abstractmethod
+    def create_config(self, name: str):
+        ...
+
+    @abstractmethod
+    def delete_config(self, name: str):
+        """Raises ValueError if the configuration does not exist or a zone still follows it"""
+        ...
+
+    @abstractmethod
+    def save_config(self, name: str, config: Dict, expected_etag: str = None) -> str:
+        ...
+
+    @abstractmethod
+    def update_day(self, name: str, day: str, intervals: List[Dict], expected_etag: str = None) -> str:
+        ...
+
+    @abstractmethod
+    def update_interval(self, name: str, day: str, index: int, changes: Dict, expected_etag: str = None) -> str:
+        ...
+
+    @abstractmethod
+    def copy_day(self, name: str, source_day: str, target_days: List[str], expected_etag: str = None) -> str:
+        ...
+
+    def relay_synced(self, zone_id: str) -> bool:
+        return any(relay["zone_id"] == zone_id and relay["synced"] for relay in self.relays())
+
+    def zones_using_config(self, name: str) -> List[str]:
+        return [zone_id for zone_id in self.list_zones() if self.load_state(zone_id).selected_config == name]
+
+
+class LocalControlPlane(ControlPlane):
+    def boot_id(self) -> str:
+        return BOOT_ID
+
+    def list_zones(self) -> List[str]:
+        return sr.list_zones()
+
+    def zone_exists(self, zone_id: str) -> bool:
+        return sr.zone_exists(zone_id)
+
+    def load_state(self, zone_id: str) -> State:
+        return sr.load_state_threadsafe(zone_id)
+
+    def state_version(self, zone_id: str) -> int:
+        return sr.get_state_version(zone_id)
+
+    def device_status_version(self, zone_id: str) -> int:
+        return device_repo.get_device_status_version(zone_id)
+
+    def connected_devices(self, zone_id: str) -> Dict:
+        return handlers.get_connected_devices(zone_id)
+
+    def last_reading(self, zone_id: str) -> Optional[datetime]:
+        return client.last_temp_times.get(zone_id)
+
+    def relays(self) -> List[Dict]:
+        return handlers.reconciler.snapshot()
+
+    def relay_synced(self, zone_id: str) -> bool:
+        return handlers.reconciler.relay(zone_id).synced
+
+    def command_stats(self) -> Dict:
+        return handlers.dispatcher.stats()
+
+    def commands_in_flight(self) -> List[Dict]:
+        return handlers.dispatcher.in_flight()
+
+    def ingest_stats(self) -> Dict:
+        return client.ingest_queue.stats()
+
+    def broker_connected(self) -> bool:
+        return client.transport.is_connected()
+
+    def warmed_up(self) -> bool:
+        return startup.warmed_up.is_set()
+
+    def startup_report(self) -> Dict:
+        return startup.report()
+
+    def select_config(self, name: str, current_time: Time, zone_id: str):
+        sr.change_selected_configuration(name, current_time, zone_id)
+        client.watch_interval_boundary(zone_id)
+
+    def update_hysteresis(self, value: float, zone_id: str):
+        sr.update_hysteresis(value, zone_id)
+
+    def create_zone(self, zone_id: str, config_name: str = None) -> State:
+        return sr.create_zone(zone_id, config_name)
+
+    def create_config(self, name: str):
+        cfg.create_config(name)
+
+    def delete_config(self, name: str):
+        in_use = name if self.zones_using_config(name) else None
+        cfg.delete_config(name, current_selected_config=in_use)
+
+    def save_config(self, name: str, config: Dict, expected_etag: str = None) -> str:
+        return self._rearm(name, cfg.save_config(name, config, expected_etag))
+
+    def update_day(self, name: str, day: str, intervals: List[Dict], expected_etag: str = None) -> str:
+        return self._rearm(name, cfg.update_day(name, day, intervals, expected_etag))
+
+    def update_interval(self, name: str, day: str, index: int, changes: Dict, expected_etag: str = None) -> str:
+        return self._rearm(name, cfg.update_interval(name, day, index, changes, expected_etag))
+
+    def copy_day(self, name: str, source_day: str, target_days: List[str], expected_etag: str = None) -> str:
+        return self._rearm(name, cfg.copy_day(name, source_day, target_days, expected_etag))
+
+    def _rearm(self, name: str, etag: str) -> str:
+        """The edited schedule may move the next interval boundary of every zone following it"""
+        for zone_id in self.zones_using_config(name):
+            client.watch_interval_boundary(zone_id)
+        return etag
+
+    def snapshot(self) -> Dict:
+        """Everything RemoteControlPlane serves, as JSON-ready data"""
+        zones = {}
+        for zone_id in self.list_zones():
+            # Versions first, so a version never claims changes the data read after it lacks
+            version = self.state_version(zone_id)
+            device_status_version = self.device_status_version(zone_id)
+            last_reading = self.last_reading(zone_id)
+            zones[zone_id] = {
+                "version": version,
+                "state": state_to_dict(self.load_state(zone_id)),
+                "device_status_version": device_status_version,
+                "devices": self.connected_devices(zone_id),
+                "last_reading": last_reading.isoformat() if last_reading is not None else None,
+            }
+        return {
+            "boot_id": self.boot_id(),
+            "zones": zones,
+            "relays": self.relays(),
+            "commands": self.command_stats(),
+            "in_flight": self.commands_in_flight(),
+            "ingest": self.ingest_stats(),
+            "broker_connected": self.broker_connected(),
+            "warmed_up": self.warmed_up(),
+            "startup": self.startup_report(),
+        }
+
+
+_EMPTY_SNAPSHOT = {
+    "boot_id": "", "zones": {}, "relays": [], "commands": {}, "in_flight": [], "ingest": {},
+    "broker_connected": False, "warmed_up": False, "startup": {},
+}
+
+
+class RemoteControlPlane(ControlPlane):
+    """
+    Reads never leave the process, they decode the shared snapshot at most once per change.
+    Commands are answered after the control process published the snapshot they produced,
+    so a worker reads its own writes.
+    """
+
+    def __init__(self, reader: SharedStateReader, commands: CommandClient):
+        self._reader = reader
+        self._commands = commands
+        self._states: Dict[str, tuple] = {}  # zone id -> (state dict it was parsed from, State)
+
+    def _snapshot(self) -> Dict:
+        return self._reader.read() or _EMPTY_SNAPSHOT
+
+    def _zone(self, zone_id: str) -> Dict:
+        zone = self._snapshot()["zones"].get(zone_id)
+        if zone is None:
+            raise FileNotFoundError(f"No stored state found for zone '{zone_id}'")
+        return zone
+
+    def boot_id(self) -> str:
+        return self._snapshot()["boot_id"]
+
+    def list_zones(self) -> List[str]:
+        return sorted(self._snapshot()["zones"])
+
+    def zone_exists(self, zone_id: str) -> bool:
+        return zone_id in self._snapshot()["zones"]
+
+    def load_state(self, zone_id: str) -> State:
+        data = self._zone(zone_id)["state"]
+        cached = self._states.get(zone_id)
+        if cached is None or cached[0] is not data:
+            cached = self._states[zone_id] = (data, state_from_dict(data))
+        return replace(cached[1])
+
+    def state_version(self, zone_id: str) -> int:
+        return self._zone(zone_id)["version"]
+
+    def device_status_version(self, zone_id: str) -> int:
+        return self._zone(zone_id)["device_status_version"]
+
+    def connected_devices(self, zone_id: str) -> Dict:
+        return self._zone(zone_id)["devices"]
+
+    def last_reading(self, zone_id: str) -> Optional[datetime]:
+        zone = self._snapshot()["zones"].get(zone_id)
+        if zone is None or zone["last_reading"] is None:
+            return None
+        return datetime.fromisoformat(zone["last_reading"])
+
+    def relays(self) -> List[Dict]:
+        return self._snapshot()["relays"]
+
+    def command_stats(self) -> Dict:
+        return self._snapshot()["commands"]
+
+    def commands_in_flight(self) -> List[Dict]:
+        return self._snapshot()["in_flight"]
+
+    def ingest_stats(self) -> Dict:
+        return self._snapshot()["ingest"]
+
+    def broker_connected(self) -> bool:
+        return self._snapshot()["broker_connected"]
+
+    def warmed_up(self) -> bool:
+        return self._snapshot()["warmed_up"]
+
+    def startup_report(self) -> Dict:
+        return self._snapshot()["startup"]
+
+    def select_config(self, name: str, current_time: Time, zone_id: str):
+        self._commands.call("select_config", name=name, current_time=current_time, zone_id=zone_id)
+
+    def update_hysteresis(self, value: float, zone_id: str):
+        self._commands.call("update_hysteresis", value=value, zone_id=zone_id)
+
+    def create_zone(self, zone_id: str, config_name: str = None) -> State:
+        return self._commands.call("create_zone", zone_id=zone_id, config_name=config_name)
+
+    def _edit_config(self, command: str, **kwargs):
+        try:
+            return self._commands.call(command, **kwargs)
+        finally:
+            cfg.refresh()  # read our own write, even when it failed halfway
+
+    def create_config(self, name: str):
+        self._edit_config("create_config", name=name)
+
+    def delete_config(self, name: str):
+        self._edit_config("delete_config", name=name)
+
+    def save_config(self, name: str, config: Dict, expected_etag: str = None) -> str:
+        return self._edit_config("save_config", name=name, config=config, expected_etag=expected_etag)
+
+    def update_day(self, name: str, day: str, intervals: List[Dict], expected_etag: str = None) -> str:
+        return self._edit_config("update_day", name=name, day=day, intervals=intervals, expected_etag=expected_etag)
+
+    def update_interval(self, name: str, day: str, index: int, changes: Dict, expected_etag: str = None) -> str:
+        return self._edit_config("update_interval", name=name, day=day, index=index, changes=changes,
+                                 expected_etag=expected_etag)
+
+    def copy_day(self, name: str, source_day: str, target_days: List[str], expected_etag: str = None) -> str:
+        return self._edit_config("copy_day", name=name, source_day=source_day, target_days=target_days,
+                                 expected_etag=expected_etag)
+
+
+def create_control_plane(role: str) -> ControlPlane:
+    if role == "api":
+        return RemoteControlPlane(
+            SharedStateReader(settings.SHARED_STATE_PATH),
+            CommandClient(settings.CONTROL_SOCKET_PATH, bytes.fromhex(settings.CONTROL_AUTHKEY))
+        )
+    if role in ("all", "control"):
+        return LocalControlPlane()
+    raise ValueError(f"Unknown process role '{role}', expected 'all', 'control' or 'api'")
+
+
+control = create_control_plane(settings.PROCESS_ROLE)
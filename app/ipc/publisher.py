@@ -0,0 +1,96 @@
+"""
+Control-process side of the split process layout: keeps the shared snapshot current for the API workers
+and runs the commands they send.
+"""
+import json
+import threading
+from typing import Callable, Dict, Optional
+from app import settings
+from app.ipc.channel import CommandServer
+from app.ipc.control_plane import LocalControlPlane
+from app.ipc.shared_state import SharedStateWriter
+from app.utils import metrics
+from app.utils.log import get_logger
+from app.utils.scheduler import Timer, scheduler
+
+log = get_logger(__name__)
+
+SNAPSHOT_BYTES = metrics.Histogram(
+    "boiler_shared_state_bytes", "Size of each published shared state snapshot",
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+
+
+class SnapshotPublisher:
+    """
+    Rebuilds the snapshot every interval and writes it only when it changed,
+    so readers decode it only when something actually happened.
+    """
+
+    def __init__(self, control: LocalControlPlane, writer: SharedStateWriter, interval: float):
+        self.control = control
+        self.writer = writer
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_payload: Optional[bytes] = None
+        self._timer: Optional[Timer] = None
+
+    def publish(self):
+        with self._lock:
+            payload = json.dumps(self.control.snapshot(), separators=(",", ":")).encode()
+            if payload == self._last_payload:
+                return
+            self.writer.publish(payload)
+            self._last_payload = payload
+        SNAPSHOT_BYTES.observe(len(payload))
+
+    def start(self):
+        self.publish()
+        self._timer = scheduler.call_every(self.interval, self.publish)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+def _commands(control: LocalControlPlane, publisher: SnapshotPublisher) -> Dict[str, Callable]:
+    def command(apply: Callable) -> Callable:
+        def run(**kwargs):
+            result = apply(**kwargs)
+            publisher.publish()
+            return result
+        return run
+
+    names = [
+        "select_config", "update_hysteresis", "create_zone",
+        "create_config", "delete_config", "save_config", "update_day", "update_interval", "copy_day",
+    ]
+    return {name: command(getattr(control, name)) for name in names}
+
+
+_publisher: Optional[SnapshotPublisher] = None
+_server: Optional[CommandServer] = None
+
+
+def start():
+    """Start publishing the shared snapshot and serving commands, before any API worker starts"""
+    global _publisher, _server
+    control = LocalControlPlane()
+    _publisher = SnapshotPublisher(
+        control, SharedStateWriter(settings.SHARED_STATE_PATH, settings.SHARED_STATE_SIZE),
+        settings.SHARED_STATE_PUBLISH_INTERVAL
+    )
+    _publisher.start()
+    _server = CommandServer(settings.CONTROL_SOCKET_PATH, bytes.fromhex(settings.CONTROL_AUTHKEY),
+                            _commands(control, _publisher))
+    _server.start()
+    log.info("Publishing shared state to %s, serving commands on %s", settings.SHARED_STATE_PATH,
+             settings.CONTROL_SOCKET_PATH)
+
+
+def stop():
+    if _server is not None:
+        _server.close()
+    if _publisher is not None:
+        _publisher.stop()
+        _publisher.writer.close()
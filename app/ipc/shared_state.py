@@ -0,0 +1,101 @@
+"""
+A versioned snapshot shared between processes through a memory-mapped file.
+
+One writer, any number of readers, no locks: the header holds a sequence number that is odd while
+a write is in progress. Readers copy the payload and retry if the sequence was odd or changed
+meanwhile (a seqlock). Readers never block the writer, a slow reader only retries.
+
+Layout: sequence (u64), payload length (u32), 4 bytes padding, then the payload.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Optional
+
+HEADER = struct.Struct("<QI4x")
+READ_ATTEMPTS = 100
+
+
+class SnapshotTooLargeError(Exception):
+    pass
+
+
+class SharedStateWriter:
+    def __init__(self, path: Path, size: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.capacity = size - HEADER.size
+        with open(path, "wb") as f:
+            f.truncate(size)
+        with open(path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), size)
+        self._sequence = 0
+
+    def publish(self, payload: bytes) -> int:
+        """Replace the snapshot, returns its sequence number"""
+        if len(payload) > self.capacity:
+            raise SnapshotTooLargeError(f"Snapshot of {len(payload)} bytes does not fit in {self.capacity}")
+
+        self._sequence += 1  # odd: readers retry until the write is complete
+        HEADER.pack_into(self._map, 0, self._sequence, 0)
+        self._map[HEADER.size:HEADER.size + len(payload)] = payload
+        self._sequence += 1
+        HEADER.pack_into(self._map, 0, self._sequence, len(payload))
+        return self._sequence
+
+    def close(self):
+        self._map.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SharedStateReader:
+    """Decodes the JSON snapshot only when its sequence number changed since the last read"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._cached = (0, None)  # (sequence, decoded snapshot), swapped as one so threads never see a mix
+
+    def _open(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return False  # not created yet, or still empty
+        return True
+
+    def read(self):
+        """
+        The latest complete snapshot, None before the writer published one.
+        The result is shared by every caller until the next change and must not be modified.
+        """
+        if self._map is None and not self._open():
+            return None
+
+        cached = self._cached
+        for attempt in range(READ_ATTEMPTS):
+            sequence, length = HEADER.unpack_from(self._map, 0)
+            if sequence == cached[0]:
+                return cached[1]
+            if sequence & 1:
+                time.sleep(0)
+                continue
+
+            payload = self._map[HEADER.size:HEADER.size + length]
+            if HEADER.unpack_from(self._map, 0)[0] != sequence:
+                continue  # overwritten while copying
+            try:
+                value = json.loads(payload)
+            except ValueError:
+                continue  # torn read the sequence check did not catch, try again
+            self._cached = (sequence, value)
+            return value
+
+        # The writer kept us out, the previous snapshot is at most one publish behind
+        return cached[1]
@@ -4,32 +4,64 @@ from app.models.time import Time
 from app.repositories.config_repo import *
 from app.repositories.state_repo import *
 from app.constants import DAYS_OF_WEEK
-from app.mqtt import client, mqtt_service
+from app.mqtt import client, handlers
+from app.utils.log import get_logger, setup_logging
+from app import settings, startup
+from app.ipc import publisher
+from app.repositories import journal_repo
+from app.utils.scheduler import scheduler
 from time import sleep
+import os
+import secrets
 import threading
 import uvicorn
 
+log = get_logger("app.main")
 
-def start_mqtt_client():
-    """Start MQTT client in the background"""
-    mqtt_service.init(client.client)
 
-    client.start_mqtt()
-    client.start_temperature_watchdog()
+def start_in_background():
+    """Warm up and start MQTT while the API is already serving"""
+    startup.run()
+    if startup.warmed_up.is_set():
+        print_state(load_state_threadsafe())
 
-    state = load_state_threadsafe()
-    print_state(state)
+
+def _split_processes():
+    """
+    Keep the control loop in this process and hand the API to worker processes, which learn
+    their role and the command channel's key from the environment they inherit
+    """
+    settings.PROCESS_ROLE = "control"
+    settings.CONTROL_AUTHKEY = secrets.token_hex(16)
+    os.environ["BOILER_PROCESS_ROLE"] = "api"
+    os.environ["BOILER_CONTROL_AUTHKEY"] = settings.CONTROL_AUTHKEY
+    publisher.start()
+    log.info("Control loop in process %d, API in %d worker processes", os.getpid(), settings.API_WORKERS)
 
 
 def main():
-    mqtt_thread = threading.Thread(target=start_mqtt_client, daemon=True)
-    mqtt_thread.start()
+    setup_logging()
+
+    if settings.API_WORKERS > 1:
+        _split_processes()
+
+    startup_thread = threading.Thread(target=start_in_background, name="startup", daemon=True)
+    startup_thread.start()
 
     try:
-        uvicorn.run("app.server:app", host="0.0.0.0", port=8000, reload=False, log_level="warning")
+        uvicorn.run("app.server:app", host="0.0.0.0", port=8000, reload=False, log_level="warning",
+                    workers=settings.API_WORKERS)
     except KeyboardInterrupt:
-        print("Shutting down...")
-        client.watchdog_stop_event.set()
+        log.info("Shutting down...")
+    finally:
+        client.ingest_queue.stop()
+        handlers.dispatcher.stop()
+        handlers.reconciler.stop()
+        client.transport.disconnect()
+        publisher.stop()
+        flush_state()
+        journal_repo.flush_rollups()
+        scheduler.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from array import array
+from bisect import bisect_right
+from typing import List, Optional
+from app.constants import DAYS_OF_WEEK
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+@dataclass
+class CompiledSchedule:
+    """
+    Configuration flattened into a lookup table with one slot per minute of the week.
+    Minute 0 is Monday 00:00, slots hold the interval index of that day or -1 if none is active.
+    """
+    slots: array
+    boundaries: List[int]  # sorted minutes of the week at which the active interval changes
+
+    def interval_at(self, minute_of_week: int) -> Optional[str]:
+        index = self.slots[minute_of_week]
+        if index < 0:
+            return None
+        return f"{DAYS_OF_WEEK[minute_of_week // MINUTES_PER_DAY]}:{index}"
+
+    def next_transition(self, minute_of_week: int) -> Optional[int]:
+        """Minute of the week of the first boundary after minute_of_week, wrapping into next week"""
+        if not self.boundaries:
+            return None
+        i = bisect_right(self.boundaries, minute_of_week)
+        return self.boundaries[i % len(self.boundaries)]
+
+
+def minute_of_week(weekday: int, minute_of_day: int) -> int:
+    return weekday * MINUTES_PER_DAY + minute_of_day
@@ -1,56 +1,129 @@
-import paho.mqtt.client as mqtt
+import app.repositories.state_repo as sr
+from app import settings
+from app.constants import DEFAULT_ZONE
 from app.mqtt import topics, handlers
 from app.mqtt import mock_temp_sensor
+from app.mqtt.ingest import IngestQueue
+from app.mqtt.transport import create_transport
+from app.utils import metrics
+from app.utils.log import get_logger
+from app.utils.scheduler import Timer, scheduler
 from datetime import datetime, timedelta
-from threading import Thread, Event
+from threading import Lock
+from typing import Dict
 import time
 
-client = mqtt.Client()
-last_temp_time = datetime.now()
-watchdog_stop_event = Event()
+log = get_logger(__name__)
+
+MQTT_MESSAGES = metrics.Counter("boiler_mqtt_messages_total", "MQTT messages received, by topic without the zone prefix", ["topic"])
+
+transport = create_transport(settings.MQTT_TRANSPORT, settings.MQTT_HOST, settings.MQTT_PORT)
+SENSOR_TIMEOUT = timedelta(minutes=1)  # a zone without readings for this long has a stale sensor
+
+last_temp_times: Dict[str, datetime] = {DEFAULT_ZONE: datetime.now()}  # zone id -> last temperature reading
+_sensor_timers: Dict[str, Timer] = {}  # zone id -> staleness deadline of its sensor
+_boundary_timers: Dict[str, Timer] = {}  # zone id -> start of its next interval
+_timers_lock = Lock()
+
+INTERVAL_BOUNDARY = "$interval_boundary"  # queued by the boundary timers, not an MQTT topic
+
+def handle_message(zone_id: str, suffix: str, device_id: str, payload: str):
+    """Runs on an ingest worker thread"""
+    if suffix == topics.SENSOR_SUFFIX:
+        temp = float(payload)
+        handlers.handle_temperature_ping(temp, zone_id)
+    elif suffix == topics.ACK_SUFFIX:
+        handlers.handle_boiler_ack(payload, zone_id)
+    elif suffix == topics.STATE_REQUEST_SUFFIX:
+        handlers.handle_state_sync_request(transport, zone_id)
+    elif suffix == topics.STATE_SYNC_ACK_SUFFIX:
+        handlers.handle_state_sync_ack(payload, zone_id)
+    elif suffix == topics.REPORTED_STATE_SUFFIX:
+        handlers.handle_reported_state(payload, zone_id)
+    elif suffix == topics.DEVICE_STATUS_SUFFIX:
+        handlers.handle_device_status(device_id, payload, zone_id)
+    elif suffix == INTERVAL_BOUNDARY:
+        handlers.handle_interval_boundary(zone_id)
+        watch_interval_boundary(zone_id)
+    handlers.handle_device_activity(suffix, zone_id)
+
+    if zone_id not in _boundary_timers:
+        watch_interval_boundary(zone_id)  # a zone created by this message
+
+
+ingest_queue = IngestQueue(handle_message, settings.INGEST_MAX_EVENTS, settings.INGEST_MAX_PRIORITY)
 
 def start_mqtt():
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.connect("localhost", 1883, 60)
-    client.loop_start()
+    ingest_queue.start(settings.INGEST_WORKERS)
+    handlers.reconciler.start()
+    transport.on_connect = on_connect
+    transport.on_message = on_message
+    transport.connect()
 
-    # mock_temp_sensor.init_mock_sensor(client)
+    # mock_temp_sensor.init_mock_sensor(transport)
     # mock_temp_sensor.start_mock_sensor()
 
-def on_connect(client, userdata, flags, rc):
-    print(f"[MQTT] Connected with result code {rc}")
-    client.subscribe(topics.SENSOR_TOPIC)
-    client.subscribe(topics.ACK_TOPIC)
-    client.subscribe(topics.DEVICE_STATUS_TOPIC_PATTERN)
-    client.subscribe(topics.STATE_REQUEST_TOPIC)
-    client.subscribe(topics.STATE_SYNC_ACK_TOPIC)
-    print(f"[MQTT] Subscribed to device status topic: {topics.DEVICE_STATUS_TOPIC_PATTERN}")
-    print(f"[MQTT] Subscribed to state sync topics")
-
-def on_message(client, userdata, msg):
-    global last_temp_time
-    topic = msg.topic
-    payload = msg.payload.decode().strip()
-
-    if topic == topics.SENSOR_TOPIC:
-        last_temp_time = datetime.now()
-        temp = float(payload)
-        handlers.handle_temperature_ping(temp)
-    elif topic == topics.ACK_TOPIC:
-        handlers.handle_boiler_ack(payload)
-    elif topic == topics.STATE_REQUEST_TOPIC:
-        handlers.handle_state_sync_request(client)
-    elif topic == topics.STATE_SYNC_ACK_TOPIC:
-        handlers.handle_state_sync_ack(payload)
-    elif topic.startswith("branko/devices/") and topic.endswith("/status"):
-        handlers.handle_device_status(topic, payload)
+def on_connect():
+    transport.subscribe(topics.SUBSCRIPTIONS)
+    log.info("Subscribed to %d topic patterns covering all zones", len(topics.SUBSCRIPTIONS))
+
+def on_message(topic: str, payload: bytes):
+    """Runs on the transport's network thread: decode and enqueue only, the handlers run on ingest workers"""
+    parsed = topics.parse_topic(topic)
+    if parsed is None:
+        return
+    zone_id, suffix, device_id = parsed
+    MQTT_MESSAGES.labels(suffix).inc()
+
+    if suffix == topics.SENSOR_SUFFIX:
+        last_temp_times[zone_id] = datetime.now()
+        if zone_id not in _sensor_timers:
+            _watch_sensor(zone_id)
+    ingest_queue.put(zone_id, suffix, device_id, payload.decode().strip())
+
+def _check_sensor(zone_id: str):
+    """
+    Readings do not move the deadline, that would cost a heap operation per message;
+    the timer finds the newer reading when it fires and re-arms for its deadline instead.
+    """
+    silent_for = datetime.now() - last_temp_times[zone_id]
+    if silent_for < SENSOR_TIMEOUT:
+        _sensor_timers[zone_id].reschedule((SENSOR_TIMEOUT - silent_for).total_seconds())
+        return
+    log.warning("Zone %s: no temperature received in the last %d seconds!", zone_id, silent_for.total_seconds())
+    _sensor_timers[zone_id].reschedule(SENSOR_TIMEOUT.total_seconds())
+
+
+def _watch_sensor(zone_id: str):
+    with _timers_lock:
+        if zone_id not in _sensor_timers:
+            _sensor_timers[zone_id] = scheduler.call_later(SENSOR_TIMEOUT.total_seconds(), _check_sensor, zone_id)
+
+
+def watch_interval_boundary(zone_id: str):
+    """
+    Arm, or move, the zone's timer for its next interval change. The boundary goes through the ingest
+    queue, so it is handled in order with the zone's readings.
+    """
+    if not sr.zone_exists(zone_id):
+        return
+    delay = handlers.seconds_to_next_interval(zone_id)
+    with _timers_lock:
+        timer = _boundary_timers.get(zone_id)
+        if timer is None:
+            timer = _boundary_timers[zone_id] = scheduler.timer(ingest_queue.put, zone_id, INTERVAL_BOUNDARY, None, "")
+        if delay is None:
+            timer.cancel()
+        else:
+            timer.reschedule(delay)
+
+
+def start_interval_boundaries():
+    for zone_id in sr.list_zones():
+        watch_interval_boundary(zone_id)
+
 
 def start_temperature_watchdog():
-    print("[WATCHDOG] Starting temperature watchdog...")
-    def watchdog():
-        while not watchdog_stop_event.is_set():
-            if datetime.now() - last_temp_time > timedelta(minutes=1):
-                print("[WATCHDOG] No temperature received in the last minute!")
-            watchdog_stop_event.wait(30)
-    Thread(target=watchdog, daemon=True).start()
+    log.info("Starting temperature watchdog")
+    for zone_id in list(last_temp_times):
+        _watch_sensor(zone_id)
@@ -0,0 +1,212 @@
+"""
+Single dispatcher for boiler relay commands.
+
+Every command gets a correlation id and sits in the in-flight table until its ACK arrives.
+Each relay has at most one command in flight: asking for the state that is already pending is
+a no-op, asking for the opposite state supersedes the pending command. Unacknowledged commands
+are re-sent with exponential backoff; every command in flight has a timer on the shared scheduler.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional
+from app.utils import metrics
+from app.utils.log import get_logger
+from app.utils.scheduler import Scheduler, Timer, scheduler as default_scheduler
+
+log = get_logger(__name__)
+
+ACK_TIMEOUT = 5.0  # seconds to wait for the first ACK
+BACKOFF_FACTOR = 2.0  # every retry waits this much longer than the previous attempt
+MAX_ATTEMPTS = 4  # sends before a command is given up
+RTT_SAMPLES = 256  # recent ACK round trips kept for the latency figures
+
+ACK_RTT = metrics.Histogram(
+    "boiler_command_ack_rtt_seconds", "Time from sending a relay command to its acknowledgement",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+)
+
+
+@dataclass
+class Command:
+    correlation_id: str
+    zone_id: str
+    target_state: bool
+    attempts: int
+    created_at: float
+    sent_at: float
+    deadline: float
+    timer: Optional[Timer] = None
+
+
+class CommandDispatcher:
+    def __init__(self, publish: Callable[[str, bool, str], None], on_ack: Callable[[str, bool], None],
+                 scheduler: Scheduler = default_scheduler):
+        """
+        publish(zone_id, target_state, correlation_id) sends a command,
+        on_ack(zone_id, target_state) applies an acknowledged one.
+        """
+        self._publish = publish
+        self._on_ack = on_ack
+        self._scheduler = scheduler
+        self._in_flight: Dict[str, Command] = {}  # correlation id -> command
+        self._by_zone: Dict[str, str] = {}  # zone id -> correlation id of its in-flight command
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._id_prefix = f"{int(time.time()) & 0xffffff:x}"
+
+        self._rtts: Deque[float] = deque(maxlen=RTT_SAMPLES)
+        self.sent = 0
+        self.deduplicated = 0
+        self.superseded = 0
+        self.retried = 0
+        self.acknowledged = 0
+        self.failed = 0
+        self.unmatched_acks = 0
+
+    def request(self, zone_id: str, target_state: bool) -> str:
+        """Ask a zone's relay for a boiler state, returns the correlation id of the command in flight"""
+        now = time.monotonic()
+        with self._lock:
+            pending_id = self._by_zone.get(zone_id)
+            if pending_id is not None:
+                pending = self._in_flight[pending_id]
+                if pending.target_state == target_state:
+                    self.deduplicated += 1
+                    return pending_id
+                del self._in_flight[pending_id]
+                pending.timer.cancel()
+                self.superseded += 1
+
+            command = Command(
+                correlation_id=f"{self._id_prefix}-{next(self._ids)}",
+                zone_id=zone_id,
+                target_state=target_state,
+                attempts=1,
+                created_at=now,
+                sent_at=now,
+                deadline=now + ACK_TIMEOUT
+            )
+            command.timer = self._scheduler.call_at(command.deadline, self._expire, command.correlation_id)
+            self._in_flight[command.correlation_id] = command
+            self._by_zone[zone_id] = command.correlation_id
+            self.sent += 1
+
+        self._publish(zone_id, target_state, command.correlation_id)
+        return command.correlation_id
+
+    def acknowledge(self, zone_id: str, correlation_id: Optional[str] = None) -> bool:
+        """
+        Match an ACK to the zone's in-flight command and apply it.
+        Relays that do not echo correlation ids send a bare ACK, which matches whatever is in flight.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pending_id = self._by_zone.get(zone_id)
+            if pending_id is None or (correlation_id is not None and correlation_id != pending_id):
+                self.unmatched_acks += 1
+                return False
+            command = self._in_flight.pop(pending_id)
+            del self._by_zone[zone_id]
+            command.timer.cancel()
+            self.acknowledged += 1
+            self._rtts.append(now - command.sent_at)
+
+        ACK_RTT.observe(now - command.sent_at)
+        self._on_ack(zone_id, command.target_state)
+        return True
+
+    def settle(self, zone_id: str, reported_state: bool) -> bool:
+        """
+        The relay reported a state without an ACK, e.g. after reconnecting.
+        Completes the zone's in-flight command if it asked for that state.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pending_id = self._by_zone.get(zone_id)
+            if pending_id is None or self._in_flight[pending_id].target_state != reported_state:
+                return False
+            command = self._in_flight.pop(pending_id)
+            del self._by_zone[zone_id]
+            command.timer.cancel()
+            self.acknowledged += 1
+            self._rtts.append(now - command.sent_at)
+        ACK_RTT.observe(now - command.sent_at)
+        return True
+
+    def _expire(self, correlation_id: str):
+        """A command's ACK deadline passed: re-send it, or give up after MAX_ATTEMPTS"""
+        now = time.monotonic()
+        with self._lock:
+            command = self._in_flight.get(correlation_id)
+            if command is None:
+                return  # acknowledged or superseded while the timer fired
+            if command.attempts >= MAX_ATTEMPTS:
+                del self._in_flight[correlation_id]
+                del self._by_zone[command.zone_id]
+                self.failed += 1
+                log.warning("Zone %s: no ACK for %s after %d attempts, giving up",
+                            command.zone_id, correlation_id, command.attempts)
+                return
+            command.attempts += 1
+            command.sent_at = now
+            command.deadline = now + ACK_TIMEOUT * BACKOFF_FACTOR ** (command.attempts - 1)
+            self._scheduler.reschedule(command.timer, command.deadline)
+            self.retried += 1
+
+        log.info("Zone %s: retrying %s (attempt %d)", command.zone_id, correlation_id, command.attempts)
+        try:
+            self._publish(command.zone_id, command.target_state, correlation_id)
+        except Exception as e:
+            log.error("Zone %s: error publishing command: %s", command.zone_id, e)
+
+    def stop(self):
+        """Drop the retry timers, commands stay in flight until acknowledged"""
+        with self._lock:
+            for command in self._in_flight.values():
+                command.timer.cancel()
+
+    def in_flight(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "correlation_id": command.correlation_id,
+                    "zone_id": command.zone_id,
+                    "target_state": "ON" if command.target_state else "OFF",
+                    "attempts": command.attempts,
+                    "age_seconds": round(now - command.created_at, 3)
+                }
+                for command in self._in_flight.values()
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rtts = sorted(self._rtts)
+            last_rtt = self._rtts[-1] if self._rtts else None
+            in_flight = len(self._in_flight)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not rtts:
+                return None
+            return round(rtts[min(int(len(rtts) * fraction), len(rtts) - 1)], 4)
+
+        return {
+            "in_flight": in_flight,
+            "sent": self.sent,
+            "deduplicated": self.deduplicated,
+            "superseded": self.superseded,
+            "retried": self.retried,
+            "acknowledged": self.acknowledged,
+            "failed": self.failed,
+            "unmatched_acks": self.unmatched_acks,
+            "ack_rtt_seconds": {
+                "samples": len(rtts),
+                "last": round(last_rtt, 4) if last_rtt is not None else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(rtts[-1], 4) if rtts else None
+            }
+        }
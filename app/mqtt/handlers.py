@@ -1,105 +1,166 @@
-import time
-from threading import Event
+import app.repositories.config_repo as cfg
 import app.repositories.state_repo as sr
 import app.repositories.device_status_repo as device_repo
+from app.constants import DEFAULT_ZONE
 from app.mqtt import mqtt_service, topics
-import threading
+from app.mqtt.dispatcher import CommandDispatcher
+from app.mqtt.reconciler import Reconciler
+from app.mqtt.transport import Transport
+from app.utils.log import get_logger
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
 import json
 
-ACK_TIMEOUT = 5
-ack_event = Event()
+log = get_logger(__name__)
 
-# Relay sync state
-relay_synced = False
+INTERVAL_MAX_READING_AGE = timedelta(minutes=1)  # at an interval boundary, older readings wait for the next one
 
-def handle_temperature_ping(temp: float):
-    print(f"[MQTT] Temperature ping: {temp}")
-    should_toggle = sr.temp_heartbeat(temp)
-    if should_toggle:
-        threading.Thread(target=toggle_with_ack, daemon=True).start()
-    print("__________________________________________________________________________")
+# Messages only a zone's sensor or relay sends, each one proves that device is alive
+DEVICE_OF_SUFFIX = {
+    topics.SENSOR_SUFFIX: "sensor",
+    topics.ACK_SUFFIX: "relay",
+    topics.STATE_REQUEST_SUFFIX: "relay",
+    topics.STATE_SYNC_ACK_SUFFIX: "relay",
+    topics.REPORTED_STATE_SUFFIX: "relay",
+}
 
-def handle_boiler_ack(payload: str):
-    if payload.strip() == "ACK":
-        print(f"[HANDLER] Received ACK")
-        ack_event.set()
 
+def _publish_command(zone_id: str, target_state: bool, correlation_id: str):
+    mqtt_service.publish_boiler_command("ON" if target_state else "OFF", zone_id, correlation_id)
 
-def wait_for_ack_and_toggle():
-    ack_event.clear()
-    start = time.time()
-    print(f"[HANDLER] Waiting for ACK")
 
-    if ack_event.wait(timeout=5):
-        print(f"[HANDLER] ACK received")
-        sr.toggle_boiler()
-    else:
-        print(f"[HANDLER] No ACK received")
+def _apply_reported(zone_id: str, boiler_state: bool):
+    """The relay confirmed a boiler state, by ACK, state report or state sync"""
+    reconciler.report(zone_id, boiler_state)
+    sr.set_boiler_state(boiler_state, zone_id)
+
+
+dispatcher = CommandDispatcher(_publish_command, _apply_reported)
+reconciler = Reconciler(
+    lambda zone_id, boiler_state: mqtt_service.publish_desired_state(boiler_state, zone_id),
+    dispatcher.request
+)
 
-def toggle_with_ack():
-    global relay_synced
 
-    # Block if relay is not synced yet
-    if not relay_synced:
-        print("[HANDLER] Blocked: Relay not synced yet, skipping command")
+def ensure_zone(zone_id: str):
+    """Zones are created the first time one of their devices talks to us"""
+    if not sr.zone_exists(zone_id):
+        sr.create_zone(zone_id)
+
+
+def handle_temperature_ping(temp: float, zone_id: str = DEFAULT_ZONE):
+    log.debug("Zone %s: temperature ping: %s", zone_id, temp)
+    ensure_zone(zone_id)
+    should_toggle = sr.temp_heartbeat(temp, zone_id)
+    if should_toggle:
+        request_boiler_state(not sr.load_state_threadsafe(zone_id).boiler_state, zone_id)
+
+def seconds_to_next_interval(zone_id: str = DEFAULT_ZONE) -> Optional[float]:
+    state = sr.load_state_threadsafe(zone_id)
+    if state.selected_config is None:
+        return None
+    now = datetime.now()
+    transitions = cfg.upcoming_transitions(cfg.load_config(state.selected_config), now, 1)
+    if not transitions:
+        return None
+    return max((transitions[0][0] - now).total_seconds(), 0.0)
+
+def handle_interval_boundary(zone_id: str = DEFAULT_ZONE):
+    """An interval starts: switch to its thresholds now rather than at the zone's next reading"""
+    now = datetime.now()
+    state = sr.refresh_active_interval(zone_id, now)
+    if state.active_interval is None or now - state.current_timestamp > INTERVAL_MAX_READING_AGE:
+        return
+    config = cfg.load_config(state.selected_config)
+    if sr.should_toggle_boiler(state.current_temp, state.boiler_state, state.active_interval, config):
+        log.info("Zone %s: interval %s started, boiler goes %s", zone_id, state.active_interval,
+                 sr.boiler_state_str(not state.boiler_state))
+        request_boiler_state(not state.boiler_state, zone_id)
+
+def handle_boiler_ack(payload: str, zone_id: str = DEFAULT_ZONE):
+    """Payload is "ACK", or "ACK:<correlation id>" from relays that echo the id"""
+    ack, _, correlation_id = payload.strip().partition(":")
+    if ack != "ACK":
         return
+    if dispatcher.acknowledge(zone_id, correlation_id or None):
+        log.debug("Zone %s: ACK received", zone_id)
+    else:
+        log.info("Zone %s: ignoring ACK that matches no command in flight", zone_id)
 
-    # Determine target state (toggle current state)
-    current_state = sr.load_state_threadsafe()
-    target_state = "OFF" if current_state.boiler_state else "ON"
+def request_boiler_state(target_state: bool, zone_id: str = DEFAULT_ZONE):
+    """
+    Record the desired state; it is published retained right away and commanded once the relay is synced.
+    Nothing is dropped while the relay is offline, it converges when it reconnects.
+    """
+    if not reconciler.relay(zone_id).synced:
+        log.info("Zone %s: relay not synced yet, desired state kept until it reconnects", zone_id)
+    reconciler.set_desired(zone_id, target_state)
+
+def handle_reported_state(payload: str, zone_id: str = DEFAULT_ZONE):
+    """Relays publish "ON"/"OFF" after switching and after applying the retained desired state"""
+    payload = payload.strip()
+    if payload not in ("ON", "OFF"):
+        log.warning("Zone %s: unexpected reported state: %s", zone_id, payload)
+        return
 
-    # Publish ON or OFF command
-    mqtt_service.publish_boiler_command(target_state)
-    wait_for_ack_and_toggle()
+    ensure_zone(zone_id)
+    boiler_state = payload == "ON"
+    # A relay that reports its state is online and listening, no separate sync round trip needed
+    reconciler.set_synced(zone_id, True)
+    dispatcher.settle(zone_id, boiler_state)
+    _apply_reported(zone_id, boiler_state)
+    reconciler.reconcile(zone_id)
 
-def handle_device_status(topic: str, payload: str):
+def handle_device_status(device_id: str, payload: str, zone_id: str = DEFAULT_ZONE):
     """
     Handle device connection status messages
-    Topic format: branko/devices/{device_id}/status
+    Topic format: branko/devices/{device_id}/status or branko/zones/{zone_id}/devices/{device_id}/status
     Payload format: {"status": "online"/"offline", "device_type": "relay"/"sensor", "ip_address": "192.168.1.x"}
     """
-    global relay_synced
-
     try:
         data = json.loads(payload)
         status = data.get("status")
         device_type = data.get("device_type")
         ip_address = data.get("ip_address")
 
-        device_id = topic.split("/")[2]
+        ensure_zone(zone_id)
 
         if status == "online":
-            print(f"[DEVICE STATUS] {device_id} ({device_type}) connected from {ip_address}")
-            device_repo.update_device_status(device_type, "online", ip_address, device_id)
+            log.info("Zone %s: %s (%s) connected from %s", zone_id, device_id, device_type, ip_address)
+            device_repo.update_device_status(device_type, "online", ip_address, device_id, zone_id)
         elif status == "offline":
-            print(f"[DEVICE STATUS] {device_id} disconnected")
+            log.info("Zone %s: %s disconnected", zone_id, device_id)
+
+            # Last wills carry no device type, the registry knows it from the device's online message
+            device_type = device_type or device_repo.device_type_of(device_id, zone_id)
 
             # If relay goes offline, block commands until it re-syncs
             if device_type == "relay" or device_id == "relay":
-                relay_synced = False
-                print("[STATE SYNC] Relay disconnected - Relay commands BLOCKED until re-sync")
+                reconciler.set_synced(zone_id, False)
+                log.info("Zone %s: relay disconnected - commands held until re-sync", zone_id)
 
             if device_type:
-                device_repo.update_device_status(device_type, "offline")
-            else:
-                current_status = device_repo.load_device_status_threadsafe()
-                if current_status.relay.device_id == device_id:
-                    device_repo.update_device_status("relay", "offline")
-                elif current_status.sensor.device_id == device_id:
-                    device_repo.update_device_status("sensor", "offline")
-
-        # Print current status
-        current_status = device_repo.load_device_status_threadsafe()
-        print(f"[DEVICE STATUS] Current devices: relay={current_status.relay.status}, sensor={current_status.sensor.status}")
+                device_repo.update_device_status(device_type, "offline", zone_id=zone_id)
+
+        if log.isEnabledFor(logging.DEBUG):
+            current_status = device_repo.load_device_status_threadsafe(zone_id)
+            log.debug("Zone %s: relay=%s, sensor=%s", zone_id, current_status.relay.status, current_status.sensor.status)
 
     except json.JSONDecodeError:
-        print(f"[DEVICE STATUS] Invalid JSON payload: {payload}")
+        log.warning("Invalid device status payload: %s", payload)
     except Exception as e:
-        print(f"[DEVICE STATUS] Error handling device status: {e}")
+        log.exception("Error handling device status: %s", e)
 
-def get_connected_devices():
-    """Return the current status of connected devices"""
-    device_status = device_repo.load_device_status_threadsafe()
+def handle_device_activity(suffix: str, zone_id: str = DEFAULT_ZONE):
+    """Refresh the last-seen time of the device that sent a message"""
+    device_type = DEVICE_OF_SUFFIX.get(suffix)
+    if device_type is not None and sr.zone_exists(zone_id):
+        device_repo.mark_seen(device_type, zone_id)
+
+def get_connected_devices(zone_id: str = DEFAULT_ZONE):
+    """Return the current status of a zone's connected devices"""
+    device_status = device_repo.load_device_status_threadsafe(zone_id)
     return {
         "relay": {
             "status": device_status.relay.status,
@@ -113,28 +174,37 @@ def get_connected_devices():
         }
     }
 
-def handle_state_sync_request(client):
+def handle_state_sync_request(transport: Transport, zone_id: str = DEFAULT_ZONE):
     """
     Handle state sync request from ESP32 on boot.
-    Sends current boiler state to ESP32.
+    Sends the desired boiler state to ESP32, so decisions made while it was offline are applied.
     """
-    print("[STATE SYNC] Received state sync request from ESP32")
+    log.info("Zone %s: received state sync request from ESP32", zone_id)
 
-    current_state = sr.load_state_threadsafe()
-    state_str = "ON" if current_state.boiler_state else "OFF"
+    ensure_zone(zone_id)
+    relay = reconciler.relay(zone_id)
+    boiler_state = relay.desired
+    if boiler_state is None:
+        boiler_state = sr.load_state_threadsafe(zone_id).boiler_state
+    relay.sync_sent = boiler_state
+    state_str = "ON" if boiler_state else "OFF"
 
-    # Publish current state to ESP32
-    client.publish(topics.STATE_RESPONSE_TOPIC, state_str, qos=1)
-    print(f"[STATE SYNC] Sent current state to ESP32: {state_str}")
+    # Publish desired state to ESP32
+    transport.publish(topics.zone_topic(zone_id, topics.STATE_RESPONSE_SUFFIX), state_str, qos=1)
+    log.info("Zone %s: sent desired state to ESP32: %s", zone_id, state_str)
 
-def handle_state_sync_ack(payload):
+def handle_state_sync_ack(payload, zone_id: str = DEFAULT_ZONE):
     """
     Handle ACK from ESP32 after state sync is complete.
     """
-    global relay_synced
-
     if payload.strip() == "ACK":
-        relay_synced = True
-        print("[STATE SYNC] ESP32 confirmed state sync successful - Relay commands UNBLOCKED")
+        relay = reconciler.relay(zone_id)
+        reconciler.set_synced(zone_id, True)
+        log.info("Zone %s: ESP32 confirmed state sync successful - relay commands unblocked", zone_id)
+        if relay.sync_sent is not None:
+            dispatcher.settle(zone_id, relay.sync_sent)
+            _apply_reported(zone_id, relay.sync_sent)
+        # The desired state may have changed since the sync response went out
+        reconciler.reconcile(zone_id)
     else:
-        print(f"[STATE SYNC] Unexpected ACK payload: {payload}")
\ No newline at end of file
+        log.warning("Zone %s: unexpected state sync ACK payload: %s", zone_id, payload)
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+Bounded work queue between paho's network thread and the message handlers.
+
+on_message only decodes and enqueues; worker threads run the handlers, so slow disks or
+config parsing never stall keepalives or ACK delivery. Three lanes, served in this order:
+- priority: ACKs, state reports and state sync messages, never coalesced
+- events: device status messages
+- readings: at most one pending reading per zone, a newer reading replaces the pending one
+When the priority or events lane is full its oldest message is dropped and counted.
+Apart from priority messages, a zone is never processed by two workers at once, so its
+messages keep their order. Priority messages are cheap and skip that wait.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from app.mqtt import topics
+from app.utils import metrics
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+PRIORITY_SUFFIXES = {
+    topics.ACK_SUFFIX,
+    topics.STATE_REQUEST_SUFFIX,
+    topics.STATE_SYNC_ACK_SUFFIX,
+    topics.REPORTED_STATE_SUFFIX,
+}
+COALESCED_SUFFIXES = {topics.SENSOR_SUFFIX}
+
+QUEUE_LAG = metrics.Histogram("boiler_ingest_lag_seconds", "Time MQTT messages wait before a worker handles them", ["lane"])
+_priority_lag = QUEUE_LAG.labels("priority")
+_events_lag = QUEUE_LAG.labels("events")
+_readings_lag = QUEUE_LAG.labels("readings")
+
+# (zone id, topic suffix, device id, payload, enqueued at)
+Message = Tuple[str, str, Optional[str], str, float]
+Handler = Callable[[str, str, Optional[str], str], None]
+
+
+class IngestQueue:
+    def __init__(self, handler: Handler, max_events: int, max_priority: int):
+        self._handler = handler
+        self._max_events = max_events
+        self._max_priority = max_priority
+        self._priority: Deque[Message] = deque()
+        self._events: Deque[Message] = deque()
+        self._readings: "OrderedDict[str, Message]" = OrderedDict()
+        self._busy_zones: Set[str] = set()
+        self._condition = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._stopping = False
+
+        self.enqueued = 0
+        self.processed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._total_lag = 0.0
+
+    def put(self, zone_id: str, suffix: str, device_id: Optional[str], payload: str):
+        """Called on the network thread, must stay cheap"""
+        message = (zone_id, suffix, device_id, payload, time.monotonic())
+        with self._condition:
+            self.enqueued += 1
+            if suffix in COALESCED_SUFFIXES:
+                pending = self._readings.get(zone_id)
+                if pending is not None:
+                    # Latest reading wins, but the zone keeps its place and original wait time
+                    self._readings[zone_id] = message[:4] + (pending[4],)
+                    self.coalesced += 1
+                    return
+                self._readings[zone_id] = message
+            elif suffix in PRIORITY_SUFFIXES:
+                if len(self._priority) >= self._max_priority:
+                    self._priority.popleft()
+                    self.dropped += 1
+                self._priority.append(message)
+            else:
+                if len(self._events) >= self._max_events:
+                    self._events.popleft()
+                    self.dropped += 1
+                self._events.append(message)
+            self._condition.notify()
+
+    def _take_from(self, lane: Deque[Message]) -> Optional[Message]:
+        for index, message in enumerate(lane):
+            if message[0] not in self._busy_zones:
+                del lane[index]
+                return message
+        return None
+
+    def _take(self) -> Optional[Message]:
+        """Next priority message, or next message whose zone is not being processed. Caller must hold _condition."""
+        if self._priority:
+            return self._priority.popleft()
+        message = self._take_from(self._events)
+        if message is not None:
+            return message
+        for zone_id in self._readings:
+            if zone_id not in self._busy_zones:
+                return self._readings.pop(zone_id)
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                message = self._take()
+                while message is None:
+                    if self._stopping:
+                        return
+                    self._condition.wait()
+                    message = self._take()
+                zone_id = message[0]
+                exclusive = message[1] not in PRIORITY_SUFFIXES
+                if exclusive:
+                    self._busy_zones.add(zone_id)
+
+                lag = time.monotonic() - message[4]
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                self._total_lag += lag
+
+            suffix = message[1]
+            if suffix in COALESCED_SUFFIXES:
+                _readings_lag.observe(lag)
+            elif suffix in PRIORITY_SUFFIXES:
+                _priority_lag.observe(lag)
+            else:
+                _events_lag.observe(lag)
+
+            try:
+                self._handler(*message[:4])
+            except Exception as e:
+                self.errors += 1
+                log.exception("Zone %s: error handling %s message: %s", zone_id, message[1], e)
+            finally:
+                with self._condition:
+                    self.processed += 1
+                    if exclusive:
+                        self._busy_zones.discard(zone_id)
+                        # Messages of this zone may have been skipped while it was busy
+                        self._condition.notify_all()
+
+    def start(self, workers: int):
+        for index in range(workers):
+            worker = threading.Thread(target=self._work, name=f"mqtt-ingest-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        log.info("Started %d worker(s)", workers)
+
+    def stop(self, timeout: float = 5.0):
+        """Let the workers drain the queue, then stop them"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers.clear()
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                "depth": {
+                    "priority": len(self._priority),
+                    "events": len(self._events),
+                    "readings": len(self._readings),
+                },
+                "busy_zones": len(self._busy_zones),
+                "workers": len(self._workers),
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "lag_seconds": {
+                    "last": round(self.last_lag, 6),
+                    "max": round(self.max_lag, 6),
+                    "avg": round(self._total_lag / self.processed, 6) if self.processed else 0.0,
+                },
+            }
@@ -0,0 +1,142 @@
+"""
+In-process stand-in for an MQTT broker, for benchmarks and tests that should not need mosquitto.
+
+Every transport has its own delivery thread, like paho's network thread, so callbacks may publish
+from inside on_message. Supports the + and # wildcards and retained messages; QoS levels are
+accepted and ignored, delivery is always in order and lossless.
+"""
+import itertools
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.mqtt.transport import Payload, Transport
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+_CONNECTED = ("$connected", b"")  # queued to run on_connect on the delivery thread
+_STOP = ("$stop", b"")
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for index, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if index >= len(topic_parts) or (part != "+" and part != topic_parts[index]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: List[Tuple[str, "InProcessTransport"]] = []
+        self._retained: Dict[str, bytes] = {}
+        # topic -> transports subscribed to it, rebuilt lazily after subscriptions change
+        self._routes: Dict[str, List["InProcessTransport"]] = {}
+
+    def subscribe(self, transport: "InProcessTransport", topic_filter: str):
+        with self._lock:
+            if (topic_filter, transport) not in self._subscriptions:
+                self._subscriptions.append((topic_filter, transport))
+            self._routes.clear()
+            retained = [(topic, payload) for topic, payload in self._retained.items() if topic_matches(topic_filter, topic)]
+        for message in retained:
+            transport._deliver(message)
+
+    def unsubscribe_all(self, transport: "InProcessTransport"):
+        with self._lock:
+            self._subscriptions = [
+                (topic_filter, subscriber) for topic_filter, subscriber in self._subscriptions if subscriber is not transport
+            ]
+            self._routes.clear()
+
+    def publish(self, topic: str, payload: bytes, retain: bool = False):
+        message = (topic, payload)
+        with self._lock:
+            if retain:
+                if payload:
+                    self._retained[topic] = payload
+                else:
+                    self._retained.pop(topic, None)  # an empty retained payload clears the topic
+            subscribers = self._routes.get(topic)
+            if subscribers is None:
+                subscribers = []
+                for topic_filter, transport in self._subscriptions:
+                    if transport not in subscribers and topic_matches(topic_filter, topic):
+                        subscribers.append(transport)
+                self._routes[topic] = subscribers
+        for transport in subscribers:
+            transport._deliver(message)
+
+
+_default_broker: Optional[InProcessBroker] = None
+_default_broker_lock = threading.Lock()
+
+
+def default_broker() -> InProcessBroker:
+    """The broker shared by every transport created with the "inprocess" setting"""
+    global _default_broker
+    with _default_broker_lock:
+        if _default_broker is None:
+            _default_broker = InProcessBroker()
+        return _default_broker
+
+
+class InProcessTransport(Transport):
+    _ids = itertools.count(1)
+
+    def __init__(self, broker: InProcessBroker, client_id: str = ""):
+        super().__init__()
+        self.broker = broker
+        self.client_id = client_id or f"inprocess-{next(self._ids)}"
+        self._inbox: "queue.SimpleQueue[Tuple[str, bytes]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._connected = False
+
+    def connect(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=self.client_id, daemon=True)
+            self._thread.start()
+        self._connected = True
+        self._inbox.put(_CONNECTED)
+
+    def disconnect(self):
+        self._connected = False
+        self.broker.unsubscribe_all(self)
+        if self._thread is not None:
+            self._inbox.put(_STOP)
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def subscribe(self, topic_filters: Iterable[str], qos: int = 0):
+        for topic_filter in topic_filters:
+            self.broker.subscribe(self, topic_filter)
+
+    def publish(self, topic: str, payload: Payload, qos: int = 0, retain: bool = False) -> bool:
+        if not self._connected:
+            return False
+        self.broker.publish(topic, payload.encode() if isinstance(payload, str) else payload, retain)
+        return True
+
+    def _deliver(self, message: Tuple[str, bytes]):
+        self._inbox.put(message)
+
+    def _loop(self):
+        while True:
+            message = self._inbox.get()
+            if message is _STOP:
+                return
+            try:
+                if message is _CONNECTED:
+                    if self.on_connect:
+                        self.on_connect()
+                elif self.on_message and self._connected:
+                    self.on_message(*message)
+            except Exception as e:
+                log.exception("%s: error in callback: %s", self.client_id, e)
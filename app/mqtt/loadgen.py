@@ -0,0 +1,354 @@
+"""
+MQTT load generator and end-to-end latency benchmark.
+
+Runs the controller in this process against simulated sensors and relays, on a scratch copy of
+the storage directory, either over the local broker or the in-process stand-in:
+    python -m app.mqtt.loadgen --zones 20 --rate 200 --ack-delay 0.05 --duration 30
+    python -m app.mqtt.loadgen --transport paho --host localhost --zones 5 --rate 50
+    python -m app.mqtt.loadgen --ramp
+
+Every sensor alternates between a cold and a hot reading every --flip-every readings, so each
+flip makes the controller switch that zone's boiler. Measured per flip:
+- reading -> decision: first reading of the flip published, until its relay receives the command
+- decision -> persisted: command received, ACK sent after --ack-delay, until the state is written
+- ACK -> persisted: ACK published, until the state is written
+A rate is sustainable when the controller handles every reading it is offered, without
+coalescing or dropping any. --ramp doubles the rate until that no longer holds.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.constants import DEFAULT_ZONE
+from app.mqtt import client, handlers, mqtt_service, topics
+from app.utils.scheduler import Scheduler
+from app.mqtt.inprocess import InProcessBroker, InProcessTransport
+from app.mqtt.transport import PahoTransport, Transport
+import app.repositories.state_repo as sr
+from app import settings
+from app.settings import STORAGE_DIR
+from app.utils.log import setup_logging
+
+COLD_TEMP = 5.0  # below any ON threshold, the boiler is switched on
+HOT_TEMP = 40.0  # above any OFF threshold, the boiler is switched off
+SYNC_TIMEOUT = 10.0  # seconds to wait for every simulated relay to be synced
+DRAIN_TIMEOUT = 5.0  # seconds to wait for the ingest queue to empty after a step
+
+
+def _summary(samples: List[float]) -> Dict:
+    """Count and percentiles in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        return round(samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+class LatencyRecorder:
+    """Follows every flip of every zone from the sensor reading to the persisted boiler state"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flips: Dict[str, Tuple[bool, float]] = {}  # zone -> (target state, first reading published)
+        self._commands: Dict[str, Tuple[bool, float]] = {}  # zone -> (target state, command received)
+        self._acks: Dict[str, Tuple[bool, float]] = {}  # zone -> (target state, ACK published)
+        self.decision: List[float] = []
+        self.persisted: List[float] = []
+        self.ack_persisted: List[float] = []
+
+    def reset(self):
+        """Forget the samples, but keep following flips already under way"""
+        with self._lock:
+            self.decision = []
+            self.persisted = []
+            self.ack_persisted = []
+
+    def flipped(self, zone_id: str, target_state: bool, now: float):
+        with self._lock:
+            self._flips[zone_id] = (target_state, now)
+
+    def command_received(self, zone_id: str, target_state: bool, now: float):
+        with self._lock:
+            flip = self._flips.get(zone_id)
+            if flip is not None and flip[0] == target_state:
+                del self._flips[zone_id]
+                self.decision.append(now - flip[1])
+            self._commands[zone_id] = (target_state, now)
+
+    def ack_sent(self, zone_id: str, target_state: bool, now: float):
+        with self._lock:
+            self._acks[zone_id] = (target_state, now)
+
+    def state_persisted(self, zone_id: str, target_state: bool, now: float):
+        with self._lock:
+            command = self._commands.get(zone_id)
+            if command is not None and command[0] == target_state:
+                del self._commands[zone_id]
+                self.persisted.append(now - command[1])
+            ack = self._acks.get(zone_id)
+            if ack is not None and ack[0] == target_state:
+                del self._acks[zone_id]
+                self.ack_persisted.append(now - ack[1])
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "reading_to_decision": _summary(self.decision),
+                "decision_to_persisted": _summary(self.persisted),
+                "ack_to_persisted": _summary(self.ack_persisted),
+            }
+
+
+class SimulatedRelays:
+    """
+    Relays of all simulated zones behind one transport.
+    They report OFF to get synced, then acknowledge every command after ack_delay seconds.
+    """
+
+    def __init__(self, transport: Transport, zones: List[str], ack_delay: float, recorder: LatencyRecorder):
+        self._transport = transport
+        self._zones = zones
+        self._ack_delay = ack_delay
+        self._recorder = recorder
+        self._scheduler = Scheduler("loadgen-relays")  # its own thread, so ACKs never queue behind the controller's timers
+
+    def start(self):
+        self._transport.on_message = self._on_message
+        self._transport.subscribe([topics.zone_topic(zone_id, topics.BOILER_SUFFIX) for zone_id in self._zones], qos=1)
+        for zone_id in self._zones:
+            for device_id, device_type in (("relay", "relay"), ("temp_sensor", "sensor")):
+                status = {"status": "online", "device_type": device_type, "ip_address": "127.0.0.1"}
+                self._transport.publish(f"{topics.ZONES_ROOT}/{zone_id}/devices/{device_id}/status", json.dumps(status))
+            self._transport.publish(topics.zone_topic(zone_id, topics.REPORTED_STATE_SUFFIX), "OFF", qos=1)
+
+    def stop(self):
+        self._scheduler.stop()
+
+    def _on_message(self, topic: str, payload: bytes):
+        now = time.perf_counter()
+        parsed = topics.parse_topic(topic)
+        if parsed is None:
+            return
+        zone_id = parsed[0]
+        command, _, correlation_id = payload.decode().partition(":")
+        target_state = command == "ON"
+        self._recorder.command_received(zone_id, target_state, now)
+
+        ack = f"ACK:{correlation_id}" if correlation_id else "ACK"
+        self._scheduler.call_later(self._ack_delay, self._send_ack, zone_id, target_state, ack)
+
+    def _send_ack(self, zone_id: str, target_state: bool, ack: str):
+        self._recorder.ack_sent(zone_id, target_state, time.perf_counter())
+        self._transport.publish(topics.zone_topic(zone_id, topics.ACK_SUFFIX), ack, qos=1)
+
+
+def _publish_readings(transport: Transport, zones: List[str], rate: float, duration: float, flip_every: int,
+                      counts: Dict[str, int], recorder: LatencyRecorder) -> int:
+    """Publish readings round-robin over the zones at `rate` per second in total, returns how many were sent"""
+    interval = 1.0 / rate
+    sensor_topics = {zone_id: topics.zone_topic(zone_id, topics.SENSOR_SUFFIX) for zone_id in zones}
+    started = time.perf_counter()
+    next_at = started
+    sent = 0
+    while True:
+        now = time.perf_counter()
+        if now - started >= duration:
+            return sent
+        if next_at > now + 0.001:
+            time.sleep(next_at - now)
+            continue
+
+        zone_id = zones[sent % len(zones)]
+        count = counts[zone_id]
+        counts[zone_id] = count + 1
+        cold = (count // flip_every) % 2 == 0
+        if count % flip_every == 0:
+            recorder.flipped(zone_id, cold, now)
+        transport.publish(sensor_topics[zone_id], f"{COLD_TEMP if cold else HOT_TEMP:.1f}")
+        sent += 1
+        next_at += interval
+
+
+def _wait_until(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def _queue_empty() -> bool:
+    depth = client.ingest_queue.stats()["depth"]
+    return not any(depth.values())
+
+
+def _scratch_storage() -> Path:
+    """A temporary working directory holding a copy of the configurations, so real state is never touched"""
+    scratch = Path(tempfile.mkdtemp(prefix="boiler-loadgen-"))
+    (scratch / STORAGE_DIR).mkdir(parents=True)
+    configs = STORAGE_DIR / "configurations.json"
+    if configs.exists():
+        shutil.copy(configs, scratch / configs)
+    return scratch
+
+
+def _start_controller(transport: Transport, recorder: LatencyRecorder):
+    client.transport = transport
+    mqtt_service.init(transport)
+
+    set_boiler_state = sr.set_boiler_state
+
+    def timed_set_boiler_state(boiler_state: bool, zone_id: str = DEFAULT_ZONE) -> bool:
+        changed = set_boiler_state(boiler_state, zone_id)
+        if changed:
+            recorder.state_persisted(zone_id, boiler_state, time.perf_counter())
+        return changed
+
+    # Boiler changes are written through, so returning from set_boiler_state means persisted
+    sr.set_boiler_state = timed_set_boiler_state
+
+    # Subscribing happens on the transport's thread, the simulated devices must not publish before it
+    on_connect = client.on_connect
+    subscribed = threading.Event()
+
+    def on_connect_then_signal():
+        on_connect()
+        subscribed.set()
+
+    client.on_connect = on_connect_then_signal
+    client.start_mqtt()
+    subscribed.wait(SYNC_TIMEOUT)
+
+
+def _transport(args, broker: Optional[InProcessBroker], client_id: str) -> Transport:
+    if args.transport == "inprocess":
+        return InProcessTransport(broker, client_id)
+    return PahoTransport(args.host, args.port, client_id=client_id)
+
+
+def run_step(devices: Transport, zones: List[str], rate: float, duration: float, flip_every: int,
+             counts: Dict[str, int], recorder: LatencyRecorder) -> Dict:
+    before = client.ingest_queue.stats()
+    started = time.perf_counter()
+    sent = _publish_readings(devices, zones, rate, duration, flip_every, counts, recorder)
+    elapsed = time.perf_counter() - started
+    drained = _wait_until(_queue_empty, DRAIN_TIMEOUT)
+    after = client.ingest_queue.stats()
+
+    coalesced = after["coalesced"] - before["coalesced"]
+    dropped = after["dropped"] - before["dropped"]
+    return {
+        "target_rate": rate,
+        "offered_rate": round(sent / elapsed, 1),
+        "handled_rate": round((sent - coalesced - dropped) / elapsed, 1),
+        "readings": sent,
+        "coalesced": coalesced,
+        "dropped": dropped,
+        "max_ingest_lag_ms": round(after["lag_seconds"]["max"] * 1000, 3),
+        "sustainable": drained and coalesced == 0 and dropped == 0,
+        "latency": recorder.report(),
+    }
+
+
+def _print_step(step: Dict):
+    print(f"rate {step['target_rate']:>8.0f}/s  offered {step['offered_rate']:>8.1f}/s  "
+          f"handled {step['handled_rate']:>8.1f}/s  coalesced {step['coalesced']:>6}  dropped {step['dropped']:>4}  "
+          f"{'ok' if step['sustainable'] else 'FALLING BEHIND'}")
+    for name, summary in step["latency"].items():
+        if summary["count"]:
+            print(f"    {name:<22} n={summary['count']:<6} p50 {summary['p50_ms']:>8.2f} ms  "
+                  f"p95 {summary['p95_ms']:>8.2f} ms  p99 {summary['p99_ms']:>8.2f} ms  max {summary['max_ms']:>8.2f} ms")
+        else:
+            print(f"    {name:<22} no samples")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated sensors and relays against an in-process controller")
+    parser.add_argument("--transport", choices=["inprocess", "paho"], default="inprocess",
+                        help="in-process broker stand-in, or a real broker at --host:--port")
+    parser.add_argument("--host", default=settings.MQTT_HOST)
+    parser.add_argument("--port", type=int, default=settings.MQTT_PORT)
+    parser.add_argument("--zones", type=int, default=10, help="simulated zones, one sensor and one relay each")
+    parser.add_argument("--rate", type=float, default=100.0, help="readings per second over all sensors")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run, or per step with --ramp")
+    parser.add_argument("--ack-delay", type=float, default=0.05, help="seconds a relay takes to acknowledge")
+    parser.add_argument("--flip-every", type=int, default=10, help="readings per sensor between cold and hot")
+    parser.add_argument("--ramp", action="store_true", help="double the rate until the controller falls behind")
+    parser.add_argument("--max-rate", type=float, default=100000.0, help="highest rate tried with --ramp")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    setup_logging(level=os.environ.get("BOILER_LOG_LEVEL", "WARNING"))
+    workdir = os.getcwd()
+    scratch = _scratch_storage()
+    os.chdir(scratch)
+
+    broker = InProcessBroker() if args.transport == "inprocess" else None
+    recorder = LatencyRecorder()
+    zones = [f"load-{index}" for index in range(args.zones)]
+    counts = {zone_id: 0 for zone_id in zones}
+
+    _start_controller(_transport(args, broker, "loadgen-controller"), recorder)
+    devices = _transport(args, broker, "loadgen-devices")
+    devices.connect()
+    relays = SimulatedRelays(devices, zones, args.ack_delay, recorder)
+    relays.start()
+    if not _wait_until(lambda: all(handlers.reconciler.relay(zone_id).synced for zone_id in zones), SYNC_TIMEOUT):
+        print("Not every simulated relay got synced, is the controller receiving messages?")
+
+    steps = []
+    rate = args.rate
+    try:
+        while True:
+            recorder.reset()
+            step = run_step(devices, zones, rate, args.duration, args.flip_every, counts, recorder)
+            steps.append(step)
+            if not args.json:
+                _print_step(step)
+            generator_bound = step["offered_rate"] < step["target_rate"] * 0.95
+            if not args.ramp or not step["sustainable"] or generator_bound or rate * 2 > args.max_rate:
+                if generator_bound and not args.json:
+                    print("The generator could not offer the target rate, the limit is on this side")
+                break
+            rate *= 2
+    finally:
+        relays.stop()
+        client.ingest_queue.stop()
+        handlers.dispatcher.stop()
+        handlers.reconciler.stop()
+        sr.flush_state()
+        os.chdir(workdir)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    sustainable = [step["handled_rate"] for step in steps if step["sustainable"]]
+    result = {
+        "transport": args.transport,
+        "zones": args.zones,
+        "ack_delay": args.ack_delay,
+        "steps": steps,
+        "max_sustainable_readings_per_second": max(sustainable) if sustainable else None,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"max sustainable: {result['max_sustainable_readings_per_second']} readings/s")
+
+
+if __name__ == "__main__":
+    main()
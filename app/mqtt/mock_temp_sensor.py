@@ -2,10 +2,9 @@
 Mock Temperature Sensor
 Simulates an ESP32 temperature sensor publishing to MQTT.
 """
-import time
 import random
-from threading import Thread, Event
 from datetime import datetime
+from app.utils.scheduler import scheduler
 
 MOCK_SENSOR_TOPIC = "branko/sensor/temperature"
 PUBLISH_INTERVAL = 5  # seconds
@@ -20,10 +19,9 @@ class MockTemperatureSensor:
     This simulates the real sensor behavior where 3 same readings = confirmed temperature.
     """
 
-    def __init__(self, mqtt_client):
-        self.mqtt_client = mqtt_client
-        self.stop_event = Event()
-        self.thread = None
+    def __init__(self, transport):
+        self.transport = transport
+        self.timer = None
         self.current_temp = 20.0
         self.target_temp = 20.0
         self.consecutive_count = 0
@@ -35,9 +33,7 @@ class MockTemperatureSensor:
             return
 
         self.is_running = True
-        self.stop_event.clear()
-        self.thread = Thread(target=self._publishing_loop, daemon=True)
-        self.thread.start()
+        self.timer = scheduler.call_every(PUBLISH_INTERVAL, self._publish_next, first_delay=2)
         print(f"[MOCK SENSOR] Started - Publishing to {MOCK_SENSOR_TOPIC} every {PUBLISH_INTERVAL}s")
         print(f"[MOCK SENSOR] Temperature range: {TEMP_MIN}-{TEMP_MAX}°C")
         print("[MOCK SENSOR] Note: 3 consecutive same readings = temperature actually changed")
@@ -47,9 +43,8 @@ class MockTemperatureSensor:
             return
 
         print("[MOCK SENSOR] Stopping...")
-        self.stop_event.set()
-        if self.thread:
-            self.thread.join(timeout=2)
+        if self.timer:
+            self.timer.cancel()
         self.is_running = False
         print("[MOCK SENSOR] Stopped")
 
@@ -71,24 +66,17 @@ class MockTemperatureSensor:
     def _publish_temperature(self, temp):
         try:
             payload = f"{temp:.1f}"
-            result = self.mqtt_client.publish(MOCK_SENSOR_TOPIC, payload, qos=0, retain=False)
-
-            if result.rc == 0:
+            if self.transport.publish(MOCK_SENSOR_TOPIC, payload, qos=0, retain=False):
                 timestamp = datetime.now().strftime("%H:%M:%S")
                 print(f"[MOCK SENSOR] [{timestamp}] Published: {payload}°C (count: {self.consecutive_count}/3)")
             else:
-                print(f"[MOCK SENSOR] Failed to publish temperature, rc={result.rc}")
+                print("[MOCK SENSOR] Failed to publish temperature")
         except Exception as e:
             print(f"[MOCK SENSOR] Error publishing temperature: {e}")
 
-    def _publishing_loop(self):
-        time.sleep(2)
-
-        while not self.stop_event.is_set():
-            temp = self._get_next_temperature()
-            self._publish_temperature(temp)
-
-            self.stop_event.wait(PUBLISH_INTERVAL)
+    def _publish_next(self):
+        temp = self._get_next_temperature()
+        self._publish_temperature(temp)
 
     def get_status(self):
         return {
@@ -102,10 +90,10 @@ class MockTemperatureSensor:
 
 _mock_sensor_instance = None
 
-def init_mock_sensor(mqtt_client):
+def init_mock_sensor(transport):
     global _mock_sensor_instance
     if _mock_sensor_instance is None:
-        _mock_sensor_instance = MockTemperatureSensor(mqtt_client)
+        _mock_sensor_instance = MockTemperatureSensor(transport)
     return _mock_sensor_instance
 
 def start_mock_sensor():
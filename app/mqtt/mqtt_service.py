@@ -1,27 +1,51 @@
+from app import settings
+from app.constants import DEFAULT_ZONE
 from app.mqtt import topics
+from app.mqtt.transport import Transport
+from typing import Optional
+from app.utils.log import get_logger
 
-_mqtt_client = None  # private module-level variable
+log = get_logger(__name__)
 
-def init(client_instance):
-    global _mqtt_client
-    _mqtt_client = client_instance
+_transport: Optional[Transport] = None  # private module-level variable
 
-def publish_boiler_command(command: str):
+def init(transport: Transport):
+    global _transport
+    _transport = transport
+
+def publish_boiler_command(command: str, zone_id: str = DEFAULT_ZONE, correlation_id: str = None):
     """
-    Publish ON or OFF command to boiler.
+    Publish ON or OFF command to a zone's boiler relay.
     Args:
         command: "ON" or "OFF"
+        zone_id: zone whose relay should switch
+        correlation_id: appended as "ON:<id>" when settings.COMMAND_CORRELATION_IDS is enabled
     """
-    if not _mqtt_client:
-        raise RuntimeError("MQTT client not initialized in mqtt_service.")
+    if not _transport:
+        raise RuntimeError("MQTT transport not initialized in mqtt_service.")
     if command not in ["ON", "OFF"]:
         raise ValueError(f"Invalid command: {command}. Must be 'ON' or 'OFF'")
-    _mqtt_client.publish(topics.BOILER_TOPIC, payload=command)
-    print(f"[MQTT SERVICE] Published {command} to BOILER_TOPIC")
+    topic = topics.zone_topic(zone_id, topics.BOILER_SUFFIX)
+    payload = f"{command}:{correlation_id}" if correlation_id and settings.COMMAND_CORRELATION_IDS else command
+    _transport.publish(topic, payload)
+    log.debug("Published %s to %s", payload, topic)
+
+
+def publish_desired_state(boiler_state: bool, zone_id: str = DEFAULT_ZONE):
+    """
+    Publish the desired boiler state of a zone as a retained QoS-1 message,
+    so a relay receives the latest decision as soon as it (re)subscribes.
+    """
+    if not _transport:
+        raise RuntimeError("MQTT transport not initialized in mqtt_service.")
+    topic = topics.zone_topic(zone_id, topics.DESIRED_STATE_SUFFIX)
+    payload = "ON" if boiler_state else "OFF"
+    _transport.publish(topic, payload, qos=1, retain=True)
+    log.debug("Published retained desired state %s to %s", payload, topic)
 
 
 def publish_message(topic: str, payload: str):
-    if not _mqtt_client:
-        raise RuntimeError("MQTT client not initialized in mqtt_service.")
-    _mqtt_client.publish(topic, payload)
-    print(f"[MQTT SERVICE] Published {payload} to {topic} topic") 
\ No newline at end of file
+    if not _transport:
+        raise RuntimeError("MQTT transport not initialized in mqtt_service.")
+    _transport.publish(topic, payload)
+    log.debug("Published %s to %s", payload, topic) 
\ No newline at end of file
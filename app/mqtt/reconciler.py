@@ -0,0 +1,110 @@
+"""
+Desired-state reconciliation for the boiler relays.
+
+The thermostat decides a desired boiler state per zone, which is published as a retained
+QoS-1 message, so a relay that reconnects receives the latest decision from the broker in
+one message. The reported state is what the relay last confirmed (ACK, state report or sync).
+Whenever the two diverge and the relay is reachable, the command is sent again; decisions
+made while a relay is offline are kept, never dropped.
+"""
+import threading
+from typing import Callable, Dict, Optional
+from app.utils.log import get_logger
+from app.utils.scheduler import Scheduler, Timer, scheduler as default_scheduler
+
+log = get_logger(__name__)
+
+RECONCILE_INTERVAL = 30.0  # seconds between sweeps over all zones
+
+
+class RelayState:
+    def __init__(self):
+        self.desired: Optional[bool] = None
+        self.reported: Optional[bool] = None
+        self.synced = False  # relay is online and confirmed a state sync, commands can be sent
+        self.sync_sent: Optional[bool] = None  # state sent in answer to the relay's last sync request
+
+
+class Reconciler:
+    def __init__(self, publish_desired: Callable[[str, bool], None], send_command: Callable[[str, bool], None],
+                 scheduler: Scheduler = default_scheduler):
+        """
+        publish_desired(zone_id, state) publishes the retained desired state,
+        send_command(zone_id, state) sends a command to the relay and waits for its ACK.
+        """
+        self._publish_desired = publish_desired
+        self._send_command = send_command
+        self._relays: Dict[str, RelayState] = {}
+        self._lock = threading.Lock()
+        self._scheduler = scheduler
+        self._sweep_timer: Optional[Timer] = None
+
+    def relay(self, zone_id: str) -> RelayState:
+        relay = self._relays.get(zone_id)
+        if relay is None:
+            with self._lock:
+                relay = self._relays.setdefault(zone_id, RelayState())
+        return relay
+
+    def set_desired(self, zone_id: str, state: bool):
+        relay = self.relay(zone_id)
+        with self._lock:
+            changed = relay.desired != state
+            relay.desired = state
+        if not changed:
+            self.reconcile(zone_id, publish=False)
+            return
+
+        self._publish_desired(zone_id, state)
+        if relay.synced:
+            # Sent even if the relay already reports this state, so it supersedes any command in flight
+            self._send_command(zone_id, state)
+
+    def report(self, zone_id: str, state: bool):
+        self.relay(zone_id).reported = state
+
+    def set_synced(self, zone_id: str, synced: bool):
+        self.relay(zone_id).synced = synced
+
+    def reconcile(self, zone_id: str, publish: bool = True) -> bool:
+        """Resend the desired state if the relay reports something else, returns True if it did"""
+        relay = self.relay(zone_id)
+        with self._lock:
+            desired = relay.desired
+            diverged = desired is not None and desired != relay.reported and relay.synced
+        if not diverged:
+            return False
+
+        if publish:
+            self._publish_desired(zone_id, desired)
+        self._send_command(zone_id, desired)
+        return True
+
+    def reconcile_all(self) -> int:
+        resent = 0
+        for zone_id in list(self._relays):
+            try:
+                resent += self.reconcile(zone_id)
+            except Exception as e:
+                log.error("Zone %s: error reconciling relay state: %s", zone_id, e)
+        return resent
+
+    def _sweep(self):
+        resent = self.reconcile_all()
+        if resent:
+            log.info("Resent desired state to %d relay(s)", resent)
+
+    def start(self):
+        if self._sweep_timer is None:
+            self._sweep_timer = self._scheduler.call_every(RECONCILE_INTERVAL, self._sweep)
+
+    def stop(self):
+        if self._sweep_timer is not None:
+            self._sweep_timer.cancel()
+            self._sweep_timer = None
+
+    def snapshot(self) -> list:
+        return [
+            {"zone_id": zone_id, "desired": relay.desired, "reported": relay.reported, "synced": relay.synced}
+            for zone_id, relay in list(self._relays.items())
+        ]
@@ -1,3 +1,7 @@
+import re
+from typing import Optional, Tuple
+from app.constants import DEFAULT_ZONE, ZONE_ID_PATTERN
+
 SENSOR_TOPIC = "branko/sensor/temperature"
 
 BOILER_TOPIC = "branko/boiler/control"
@@ -10,4 +14,67 @@ STATE_SYNC_ACK_TOPIC = "branko/boiler/state/sync_ack"
 
 DEVICE_STATUS_TOPIC_PATTERN = "branko/devices/+/status"  # + is wildcard
 RELAY_STATUS_TOPIC = "branko/devices/relay/status"
-SENSOR_STATUS_TOPIC = "branko/devices/temp_sensor/status"
\ No newline at end of file
+SENSOR_STATUS_TOPIC = "branko/devices/temp_sensor/status"
+
+# Zones other than the default one live under branko/zones/{zone_id}/, followed by the same suffixes
+TOPIC_ROOT = "branko"
+ZONES_ROOT = "branko/zones"
+
+SENSOR_SUFFIX = "sensor/temperature"
+BOILER_SUFFIX = "boiler/control"
+ACK_SUFFIX = "boiler/ack"
+STATE_REQUEST_SUFFIX = "boiler/state/request"
+STATE_RESPONSE_SUFFIX = "boiler/state/response"
+STATE_SYNC_ACK_SUFFIX = "boiler/state/sync_ack"
+DESIRED_STATE_SUFFIX = "boiler/desired"  # retained, published by us
+REPORTED_STATE_SUFFIX = "boiler/reported"  # published by relays after switching or reconnecting
+DEVICE_STATUS_SUFFIX = "devices/status"  # parse_topic reports devices/{device_id}/status under this suffix
+
+# One wildcard subscription per message type covers every zone
+SUBSCRIPTIONS = [
+    SENSOR_TOPIC,
+    ACK_TOPIC,
+    STATE_REQUEST_TOPIC,
+    STATE_SYNC_ACK_TOPIC,
+    f"{TOPIC_ROOT}/{REPORTED_STATE_SUFFIX}",
+    DEVICE_STATUS_TOPIC_PATTERN,
+    f"{ZONES_ROOT}/+/{SENSOR_SUFFIX}",
+    f"{ZONES_ROOT}/+/{ACK_SUFFIX}",
+    f"{ZONES_ROOT}/+/{STATE_REQUEST_SUFFIX}",
+    f"{ZONES_ROOT}/+/{STATE_SYNC_ACK_SUFFIX}",
+    f"{ZONES_ROOT}/+/{REPORTED_STATE_SUFFIX}",
+    f"{ZONES_ROOT}/+/devices/+/status",
+]
+
+_zone_id_re = re.compile(ZONE_ID_PATTERN)
+
+
+def is_valid_zone_id(zone_id: str) -> bool:
+    return bool(_zone_id_re.match(zone_id))
+
+
+def zone_topic(zone_id: str, suffix: str) -> str:
+    if zone_id == DEFAULT_ZONE:
+        return f"{TOPIC_ROOT}/{suffix}"
+    return f"{ZONES_ROOT}/{zone_id}/{suffix}"
+
+
+def parse_topic(topic: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    Split a topic into (zone id, suffix, device id), or None if it is not one of ours.
+    The device id is only set for device status topics.
+    """
+    parts = topic.split("/")
+    if len(parts) < 3 or parts[0] != TOPIC_ROOT:
+        return None
+
+    if parts[1] == "zones":
+        if len(parts) < 5 or not is_valid_zone_id(parts[2]):
+            return None
+        zone_id, rest = parts[2], parts[3:]
+    else:
+        zone_id, rest = DEFAULT_ZONE, parts[1:]
+
+    if len(rest) == 3 and rest[0] == "devices" and rest[2] == "status":
+        return zone_id, DEVICE_STATUS_SUFFIX, rest[1]
+    return zone_id, "/".join(rest), None
@@ -0,0 +1,111 @@
+"""
+How the app talks to MQTT: connect, subscribe, publish, and two callbacks.
+Topics are plain strings and payloads bytes, whichever implementation is behind it:
+- paho: a real broker over the network
+- inprocess: the in-process broker of app.mqtt.inprocess, for benchmarks and tests without a network
+"""
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Optional, Union
+import paho.mqtt.client as mqtt
+from app import settings
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+Payload = Union[str, bytes]
+
+
+class Transport(ABC):
+    def __init__(self):
+        self.on_connect: Optional[Callable[[], None]] = None  # called after every (re)connect, subscribe here
+        self.on_message: Optional[Callable[[str, bytes], None]] = None  # (topic, payload) on the transport's thread
+
+    @abstractmethod
+    def connect(self):
+        """Start connecting and delivering messages on a background thread, without waiting for the broker"""
+        ...
+
+    @abstractmethod
+    def disconnect(self):
+        ...
+
+    @abstractmethod
+    def is_connected(self) -> bool:
+        ...
+
+    @abstractmethod
+    def subscribe(self, topic_filters: Iterable[str], qos: int = 0):
+        """Topic filters may use the + and # wildcards"""
+        ...
+
+    @abstractmethod
+    def publish(self, topic: str, payload: Payload, qos: int = 0, retain: bool = False) -> bool:
+        """Returns False if the message could not be queued for sending"""
+        ...
+
+
+class PahoTransport(Transport):
+    def __init__(self, host: str, port: int, keepalive: int = 60, client_id: str = "",
+                 reconnect_min_delay: int = 1, reconnect_max_delay: int = 60):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        self._client.reconnect_delay_set(reconnect_min_delay, reconnect_max_delay)
+        self._client.on_connect = self._handle_connect
+        self._client.on_disconnect = self._handle_disconnect
+        self._client.on_connect_fail = self._handle_connect_fail
+        self._client.on_message = self._handle_message
+
+    def connect(self):
+        """
+        Returns at once. paho's network thread keeps retrying, the first connection included,
+        with a delay doubling from reconnect_min_delay up to reconnect_max_delay.
+        """
+        self._client.connect_async(self.host, self.port, self.keepalive)
+        self._client.loop_start()
+
+    def disconnect(self):
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def is_connected(self) -> bool:
+        return self._client.is_connected()
+
+    def subscribe(self, topic_filters: Iterable[str], qos: int = 0):
+        self._client.subscribe([(topic_filter, qos) for topic_filter in topic_filters])
+
+    def publish(self, topic: str, payload: Payload, qos: int = 0, retain: bool = False) -> bool:
+        return self._client.publish(topic, payload, qos=qos, retain=retain).rc == mqtt.MQTT_ERR_SUCCESS
+
+    def _handle_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            log.warning("Connection to %s:%s refused: %s", self.host, self.port, reason_code)
+            return
+        log.info("Connected to %s:%s", self.host, self.port)
+        if self.on_connect:
+            self.on_connect()
+
+    def _handle_connect_fail(self, client, userdata):
+        log.warning("Broker at %s:%s unreachable, retrying", self.host, self.port)
+
+    def _handle_disconnect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            log.warning("Disconnected from %s:%s: %s, reconnecting", self.host, self.port, reason_code)
+
+    def _handle_message(self, client, userdata, msg):
+        if self.on_message:
+            self.on_message(msg.topic, msg.payload)
+
+
+def create_transport(name: str, host: str = "localhost", port: int = 1883, client_id: str = "") -> Transport:
+    if name == "paho":
+        return PahoTransport(host, port, client_id=client_id, reconnect_min_delay=settings.MQTT_RECONNECT_MIN_DELAY,
+                             reconnect_max_delay=settings.MQTT_RECONNECT_MAX_DELAY)
+
+    if name == "inprocess":
+        from app.mqtt.inprocess import InProcessTransport, default_broker
+        return InProcessTransport(default_broker(), client_id)
+
+    raise ValueError(f"Unknown MQTT transport '{name}', expected 'paho' or 'inprocess'")
@@ -0,0 +1,248 @@
+"""
+Replay of historical temperature readings through the boiler decision logic.
+
+Shows how a configuration would have switched the boiler over a stretch of recorded readings, and
+doubles as a regression benchmark of the decision path:
+    python -m app.replay --config Default --from 2025-10-01 --to 2025-11-01
+    python -m app.replay --config Default --config Eco --readings-dir temp_readings --timeline
+
+Readings come from the zone's stored history, or straight from the old YYYY_MM_DD.txt logs with
+--readings-dir. They run through state_repo.evaluate_reading, the same decision the live loop makes
+for every reading, on a virtual clock: time jumps from one event to the next, and schedule boundaries
+between two readings are events too, as the live interval-boundary timers are. A temperature holds until
+the next reading, since the stored history only records changes. Commands are taken as acknowledged at
+once, and nothing is stored: replays never touch the live state.
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import app.repositories.config_repo as cfg
+import app.repositories.history_repo as history
+import app.repositories.state_repo as sr
+from app.constants import DEFAULT_ZONE
+from app.models.configuration import Configuration
+from app.models.schedule import MINUTES_PER_WEEK, minute_of_week
+
+@dataclass
+class Toggle:
+    at: datetime
+    boiler_state: bool
+    temp: float
+    interval: str
+    cause: str  # "reading" or "boundary"
+
+
+@dataclass
+class ReplayResult:
+    config_name: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+    readings: int = 0
+    boundaries: int = 0
+    skipped: int = 0  # readings and boundaries with no active interval, the live loop decides nothing then
+    toggles: List[Toggle] = field(default_factory=list)
+    on_seconds: float = 0.0
+    on_seconds_by_day: Dict[str, float] = field(default_factory=dict)
+    wall_seconds: float = 0.0
+
+    @property
+    def events(self) -> int:
+        return self.readings + self.boundaries
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def speedup(self) -> float:
+        """Replayed time per second of wall time"""
+        if not self.wall_seconds or self.start is None:
+            return 0.0
+        return (self.end - self.start).total_seconds() / self.wall_seconds
+
+    def to_dict(self, timeline: bool = True) -> Dict:
+        result = {
+            "config": self.config_name,
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+            "readings": self.readings,
+            "boundaries": self.boundaries,
+            "skipped": self.skipped,
+            "toggle_count": len(self.toggles),
+            "on_hours": round(self.on_seconds / 3600, 3),
+            "on_hours_by_day": {day: round(seconds / 3600, 3) for day, seconds in self.on_seconds_by_day.items()},
+            "wall_seconds": round(self.wall_seconds, 6),
+            "events_per_second": round(self.events_per_second),
+            "speedup": round(self.speedup),
+        }
+        if timeline:
+            result["toggles"] = [
+                {"at": toggle.at.isoformat(), "boiler": sr.boiler_state_str(toggle.boiler_state), "temp": toggle.temp,
+                 "interval": toggle.interval, "cause": toggle.cause}
+                for toggle in self.toggles
+            ]
+        return result
+
+
+def next_boundary(config: Configuration, moment: datetime) -> Optional[datetime]:
+    """Start of the first interval change after moment"""
+    schedule = cfg.get_schedule(config)
+    current = minute_of_week(moment.weekday(), moment.hour * 60 + moment.minute)
+    upcoming = schedule.next_transition(current)
+    if upcoming is None:
+        return None
+    minutes = (upcoming - current) % MINUTES_PER_WEEK or MINUTES_PER_WEEK
+    return moment.replace(second=0, microsecond=0) + timedelta(minutes=minutes)
+
+
+def _add_on_time(result: ReplayResult, on_since: datetime, until: datetime):
+    result.on_seconds += (until - on_since).total_seconds()
+    while on_since < until:
+        midnight = datetime.combine(on_since.date() + timedelta(days=1), datetime.min.time())
+        part_end = min(midnight, until)
+        day = on_since.date().isoformat()
+        result.on_seconds_by_day[day] = result.on_seconds_by_day.get(day, 0.0) + (part_end - on_since).total_seconds()
+        on_since = part_end
+
+
+class _Replay:
+    """State of one replay; now is the virtual clock, it jumps from one event to the next"""
+
+    def __init__(self, config: Configuration, boiler_state: bool):
+        self.config = config
+        self.schedule = cfg.get_schedule(config)
+        self.boiler_state = boiler_state
+        self.result = ReplayResult(config.name, None, None)
+        self.now: Optional[datetime] = None
+        self.temp: Optional[float] = None  # the last reading, held until the next one
+        self.on_since: Optional[datetime] = None
+
+    def start(self, now: datetime):
+        self.result.start = now
+        if self.boiler_state:
+            self.on_since = now
+
+    def decide(self, now: datetime, cause: str):
+        self.now = now
+        if self.schedule.interval_at(minute_of_week(now.weekday(), now.hour * 60 + now.minute)) is None:
+            self.result.skipped += 1
+            return
+
+        active_interval, toggle = sr.evaluate_reading(self.temp, self.boiler_state, self.config, now)
+        if not toggle:
+            return
+        self.boiler_state = not self.boiler_state
+        if self.boiler_state:
+            self.on_since = now
+        else:
+            _add_on_time(self.result, self.on_since, now)
+            self.on_since = None
+        self.result.toggles.append(Toggle(now, self.boiler_state, self.temp, active_interval, cause))
+
+    def finish(self, end: Optional[datetime]) -> ReplayResult:
+        result = self.result
+        result.end = end or self.now
+        if self.on_since is not None and result.end is not None:
+            _add_on_time(result, self.on_since, result.end)
+        return result
+
+
+def replay(config: Configuration, readings: Iterable[Tuple[datetime, float]], boiler_state: bool = False,
+           end: datetime = None) -> ReplayResult:
+    """
+    Run time-ordered (time, rounded temperature) readings through the decision logic, starting with the
+    boiler in boiler_state. Boiler runtime is counted up to end, or the last reading.
+    """
+    run = _Replay(config, boiler_state)
+    boundary: Optional[datetime] = None
+
+    started = time.perf_counter()
+    for moment, temp in readings:
+        if run.temp is None:
+            run.start(moment)
+            boundary = next_boundary(config, moment)
+
+        # A boundary at the same second as a reading fires first, as the live timer would
+        while boundary is not None and boundary <= moment:
+            run.result.boundaries += 1
+            run.decide(boundary, "boundary")
+            boundary = next_boundary(config, boundary)
+
+        run.result.readings += 1
+        run.temp = temp
+        run.decide(moment, "reading")
+
+    while end is not None and boundary is not None and boundary < end:
+        run.result.boundaries += 1
+        run.decide(boundary, "boundary")
+        boundary = next_boundary(config, boundary)
+    run.result.wall_seconds = time.perf_counter() - started
+
+    return run.finish(end)
+
+
+def load_readings(zone_id: str = DEFAULT_ZONE, start: datetime = None, end: datetime = None,
+                  readings_dir: Path = None) -> List[Tuple[datetime, float]]:
+    """(time, rounded temperature) from the zone's history, or from the text logs in readings_dir"""
+    if readings_dir is not None:
+        # The logs hold the sensor's own values, rounded as the live loop rounds each reading
+        return [(moment, sr.round_temperature(temp))
+                for moment, temp in history.iter_text_readings(readings_dir, start, end)]
+    start = start or datetime.fromtimestamp(0)
+    end = end or datetime.now()
+    return [(moment, temp) for moment, temp, _ in history.iter_readings(start, end, zone_id)]
+
+
+def _print_result(result: ReplayResult, timeline: bool):
+    span = (result.end - result.start).total_seconds() / 86400 if result.start else 0.0
+    print(f"{result.config_name}: {result.readings} readings, {result.boundaries} boundaries, "
+          f"{len(result.toggles)} toggles, boiler on {result.on_seconds / 3600:.2f} h over {span:.2f} days")
+    for day, seconds in result.on_seconds_by_day.items():
+        print(f"    {day}  {seconds / 3600:6.2f} h")
+    if timeline:
+        for toggle in result.toggles:
+            print(f"    {toggle.at}  {sr.boiler_state_str(toggle.boiler_state):3}  {toggle.temp:5.1f}°C  "
+                  f"{toggle.interval}  ({toggle.cause})")
+    print(f"    {result.events_per_second:,.0f} events/s, {result.speedup:,.0f}x real time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded temperatures through the boiler decision logic")
+    parser.add_argument("--config", action="append", help="configuration to replay, repeat to compare several "
+                                                          "(default: the one the zone follows)")
+    parser.add_argument("--zone", default=DEFAULT_ZONE, help="zone whose history is replayed")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, help="first moment replayed")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, help="end of the replay, exclusive")
+    parser.add_argument("--readings-dir", type=Path, help="replay the YYYY_MM_DD.txt logs in this directory instead")
+    parser.add_argument("--boiler-on", action="store_true", help="start with the boiler on")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many times and keep the fastest run")
+    parser.add_argument("--timeline", action="store_true", help="print every toggle")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    names = args.config or [sr.load_state_threadsafe(args.zone).selected_config]
+    readings = load_readings(args.zone, args.start, args.end, args.readings_dir)
+    if not readings:
+        print("No readings in range", file=sys.stderr)
+        sys.exit(1)
+
+    results = []
+    for name in names:
+        config = cfg.load_config(name)
+        runs = [replay(config, readings, args.boiler_on, args.end) for _ in range(max(args.repeat, 1))]
+        results.append(min(runs, key=lambda run: run.wall_seconds))
+
+    if args.json:
+        print(json.dumps([result.to_dict(args.timeline) for result in results], indent=2))
+    else:
+        for result in results:
+            _print_result(result, args.timeline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.utils import metrics
+
+# Document labels of the storage metrics
+DOCUMENT_STATE = "state"
+DOCUMENT_DEVICE_STATUS = "device_status"
+DOCUMENT_CONFIGS = "configurations"
+
+STORAGE_SECONDS = metrics.Histogram(
+    "boiler_storage_seconds", "Storage backend load and save latency", ["backend", "document", "op"]
+)
+STORAGE_BYTES = metrics.Counter(
+    "boiler_storage_bytes_total", "Bytes read and written by storage backend loads and saves", ["backend", "document", "op"]
+)
+
+
+class StorageBackend(ABC):
+    """
+    Where the repositories keep their data.
+    Everything crosses this boundary as plain JSON-style dicts, the repositories own the models.
+    History readings are raw (epoch seconds, temperature * 10, boiler code) tuples.
+    State, device status and history are kept per zone, configurations are shared by all zones.
+    """
+
+    name = ""  # backend label of the storage metrics
+
+    def _observe(self, document: str, op: str, started: float, size: int):
+        """Record a load or save that began at time.perf_counter() value `started` and moved `size` bytes"""
+        STORAGE_SECONDS.labels(self.name, document, op).observe(time.perf_counter() - started)
+        STORAGE_BYTES.labels(self.name, document, op).inc(size)
+
+    @abstractmethod
+    def list_zones(self) -> List[str]:
+        """Zones that have a stored state"""
+        ...
+
+    @abstractmethod
+    def load_state(self, zone_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def save_state(self, zone_id: str, state: Dict):
+        ...
+
+    @abstractmethod
+    def load_configs(self) -> Dict:
+        ...
+
+    @abstractmethod
+    def save_configs(self, configs: Dict):
+        ...
+
+    @abstractmethod
+    def save_config(self, name: str, config: Dict):
+        ...
+
+    @abstractmethod
+    def delete_config(self, name: str):
+        ...
+
+    @abstractmethod
+    def configs_signature(self):
+        """Token that changes whenever the configurations change, including from other processes"""
+        ...
+
+    @abstractmethod
+    def load_device_status(self, zone_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def save_device_status(self, zone_id: str, status: Dict):
+        ...
+
+    @abstractmethod
+    def append_reading(self, zone_id: str, timestamp: int, temp_tenths: int, boiler: int, allow_equal: bool = True) -> bool:
+        """Store one reading, returns False if it is older than the newest stored one"""
+        ...
+
+    @abstractmethod
+    def iter_readings(self, zone_id: str, start_ts: int, end_ts: int) -> Iterator[Tuple[int, int, int]]:
+        """Readings with start_ts <= timestamp < end_ts in time order, streamed"""
+        ...
+
+    def close(self):
+        pass
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.constants import DEFAULT_ZONE
+from app.settings import STORAGE_DIR, zone_storage_dir
+from app.repositories.backends.base import (
+    StorageBackend, DOCUMENT_STATE, DOCUMENT_DEVICE_STATUS, DOCUMENT_CONFIGS
+)
+from app.repositories.backends.segments import SegmentStore
+
+CONFIG_FILE = STORAGE_DIR / "configurations.json"
+ZONES_DIR = STORAGE_DIR / "zones"
+
+# File names inside a zone's storage directory
+STATE_FILE_NAME = "state.json"
+DEVICE_STATUS_FILE_NAME = "device_status.json"
+HISTORY_DIR_NAME = "history"
+
+
+def _write_json_atomically(path: Path, data: Dict) -> int:
+    """Returns the number of bytes written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(".tmp")
+    encoded = json.dumps(data, indent=4).encode()
+    with open(tmp_file, 'wb') as f:
+        f.write(encoded)
+    os.replace(tmp_file, path)
+    return len(encoded)
+
+
+def _read_json(path: Path) -> Tuple[Dict, int]:
+    """The parsed document and its size in bytes"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return json.loads(raw), len(raw)
+
+
+class JsonBackend(StorageBackend):
+    """
+    One JSON document per repository and zone, history in binary segment files.
+    The default zone keeps its files directly under storage/, other zones under storage/zones/{zone_id}/.
+    Every file has its own lock, so zones never wait for each other.
+    """
+
+    name = "json"
+
+    def __init__(self):
+        self._config_lock = threading.Lock()
+        self._file_locks: Dict[Path, threading.Lock] = {}
+        self._histories: Dict[str, SegmentStore] = {}
+        self._registry_lock = threading.Lock()
+
+    def _file_lock(self, path: Path) -> threading.Lock:
+        lock = self._file_locks.get(path)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._file_locks.setdefault(path, threading.Lock())
+        return lock
+
+    def _history(self, zone_id: str) -> SegmentStore:
+        history = self._histories.get(zone_id)
+        if history is None:
+            with self._registry_lock:
+                history = self._histories.get(zone_id)
+                if history is None:
+                    history = SegmentStore(zone_storage_dir(zone_id) / HISTORY_DIR_NAME)
+                    self._histories[zone_id] = history
+        return history
+
+    def _load_zone_file(self, zone_id: str, file_name: str, document: str) -> Optional[Dict]:
+        path = zone_storage_dir(zone_id) / file_name
+        started = time.perf_counter()
+        with self._file_lock(path):
+            if not path.exists():
+                return None
+            data, size = _read_json(path)
+        self._observe(document, "load", started, size)
+        return data
+
+    def _save_zone_file(self, zone_id: str, file_name: str, document: str, data: Dict):
+        path = zone_storage_dir(zone_id) / file_name
+        started = time.perf_counter()
+        with self._file_lock(path):
+            size = _write_json_atomically(path, data)
+        self._observe(document, "save", started, size)
+
+    def list_zones(self) -> List[str]:
+        zones = []
+        if (STORAGE_DIR / STATE_FILE_NAME).exists():
+            zones.append(DEFAULT_ZONE)
+        if ZONES_DIR.exists():
+            zones.extend(sorted(path.parent.name for path in ZONES_DIR.glob(f"*/{STATE_FILE_NAME}")))
+        return zones
+
+    def load_state(self, zone_id: str) -> Optional[Dict]:
+        return self._load_zone_file(zone_id, STATE_FILE_NAME, DOCUMENT_STATE)
+
+    def save_state(self, zone_id: str, state: Dict):
+        self._save_zone_file(zone_id, STATE_FILE_NAME, DOCUMENT_STATE, state)
+
+    def load_configs(self) -> Dict:
+        started = time.perf_counter()
+        with self._config_lock:
+            if not CONFIG_FILE.exists():
+                return {}
+            configs, size = _read_json(CONFIG_FILE)
+        self._observe(DOCUMENT_CONFIGS, "load", started, size)
+        return configs
+
+    def _write_configs(self, configs: Dict, started: float):
+        """Caller must hold _config_lock. Replaced atomically, API workers may be reading it at any time."""
+        size = _write_json_atomically(CONFIG_FILE, configs)
+        self._observe(DOCUMENT_CONFIGS, "save", started, size)
+
+    def save_configs(self, configs: Dict):
+        started = time.perf_counter()
+        with self._config_lock:
+            self._write_configs(configs, started)
+
+    def save_config(self, name: str, config: Dict):
+        # A single JSON document can only be rewritten as a whole
+        started = time.perf_counter()
+        with self._config_lock:
+            with open(CONFIG_FILE, 'r') as f:
+                configs = json.load(f)
+            configs[name] = config
+            self._write_configs(configs, started)
+
+    def delete_config(self, name: str):
+        started = time.perf_counter()
+        with self._config_lock:
+            with open(CONFIG_FILE, 'r') as f:
+                configs = json.load(f)
+            configs.pop(name, None)
+            self._write_configs(configs, started)
+
+    def configs_signature(self):
+        try:
+            stat = os.stat(CONFIG_FILE)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load_device_status(self, zone_id: str) -> Optional[Dict]:
+        return self._load_zone_file(zone_id, DEVICE_STATUS_FILE_NAME, DOCUMENT_DEVICE_STATUS)
+
+    def save_device_status(self, zone_id: str, status: Dict):
+        self._save_zone_file(zone_id, DEVICE_STATUS_FILE_NAME, DOCUMENT_DEVICE_STATUS, status)
+
+    def append_reading(self, zone_id: str, timestamp: int, temp_tenths: int, boiler: int,
+                       allow_equal: bool = True) -> bool:
+        return self._history(zone_id).append(timestamp, temp_tenths, boiler, allow_equal)
+
+    def iter_readings(self, zone_id: str, start_ts: int, end_ts: int) -> Iterator[Tuple[int, int, int]]:
+        return self._history(zone_id).iter_records(start_ts, end_ts)
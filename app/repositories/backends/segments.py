@@ -0,0 +1,158 @@
+"""
+Binary time-series files used by the JSON backend for temperature history.
+
+Readings are fixed-width records (epoch seconds, temperature in tenths of a degree,
+boiler state) in one append-only segment file per month. Segments are read through mmap,
+a sparse index of every INDEX_STRIDE-th timestamp narrows binary searches to a single block.
+"""
+import mmap
+import struct
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+RECORD = struct.Struct("<IhB")  # epoch seconds, temperature * 10, boiler state
+INDEX_STRIDE = 256  # records between sparse index entries
+
+
+class Segment:
+    """One month of readings in a single append-only file"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._index: List[int] = []
+        self._count = path.stat().st_size // RECORD.size if path.exists() else 0
+        self._last_timestamp = None
+        if self._count:
+            self._last_timestamp = self._timestamp_at(self._count - 1)
+
+    def _view(self) -> memoryview:
+        """Map the file, remapping only when records were appended since the last read"""
+        size = self._count * RECORD.size
+        if size != self._mapped_size:
+            # The old map is not closed explicitly, streaming readers may still hold views of it
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def _timestamp_at(self, position: int) -> int:
+        return RECORD.unpack_from(self._view(), position * RECORD.size)[0]
+
+    def _update_index(self):
+        view = self._view()
+        for position in range(len(self._index) * INDEX_STRIDE, self._count, INDEX_STRIDE):
+            self._index.append(RECORD.unpack_from(view, position * RECORD.size)[0])
+
+    def append(self, timestamp: int, temp_tenths: int, boiler: int, allow_equal: bool = True) -> bool:
+        if self._last_timestamp is not None:
+            if timestamp < self._last_timestamp or (timestamp == self._last_timestamp and not allow_equal):
+                return False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.write(RECORD.pack(timestamp, temp_tenths, boiler))
+        self._count += 1
+        self._last_timestamp = timestamp
+        return True
+
+    def _sync_count(self):
+        """Pick up records appended by another process, API worker processes read what the control loop writes"""
+        count = self.path.stat().st_size // RECORD.size
+        if count != self._count:
+            self._count = count
+            self._last_timestamp = self._timestamp_at(count - 1) if count else None
+
+    def find(self, timestamp: int) -> int:
+        """Position of the first record at or after timestamp"""
+        if not self._count:
+            return 0
+        self._update_index()
+
+        block = max(bisect_left(self._index, timestamp) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + 2 * INDEX_STRIDE, self._count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamp_at(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def records(self, start: int, end: int) -> memoryview:
+        """Zero-copy view of the raw records with start <= timestamp < end"""
+        self._sync_count()
+        first = self.find(start)
+        last = self.find(end)
+        return self._view()[first * RECORD.size:last * RECORD.size]
+
+
+class SegmentStore:
+    """Monthly segments in one directory"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._segments: Dict[str, Segment] = {}
+        self._newest: Optional[str] = None  # name of the newest segment file, read from the directory on first use
+        self._lock = threading.Lock()
+
+    def _get_segment(self, name: str) -> Segment:
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = Segment(self.directory / f"{name}.seg")
+            self._segments[name] = segment
+        return segment
+
+    def _existing_segment(self, name: str) -> Optional[Segment]:
+        """The segment if its file exists, months without readings are not cached. Caller must hold the lock."""
+        segment = self._segments.get(name)
+        if segment is None and (self.directory / f"{name}.seg").exists():
+            segment = self._get_segment(name)
+        return segment if segment is not None and segment.path.exists() else None
+
+    def _last_segment_name(self) -> str:
+        """
+        Name of the last month that can hold readings: the newest segment file, or the current month
+        for segments another process starts. Caller must hold the lock.
+        """
+        if self._newest is None:
+            self._newest = max((path.stem for path in self.directory.glob("*.seg")), default="")
+        return max(self._newest, datetime.now().strftime("%Y_%m"))
+
+    @staticmethod
+    def _segment_names_between(start_ts: int, end_ts: int, last: str) -> List[str]:
+        """Names of the months from start_ts up to end_ts, stopping after last"""
+        start, end = datetime.fromtimestamp(start_ts), datetime.fromtimestamp(max(end_ts - 1, start_ts))
+        names = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            name = f"{year:04d}_{month:02d}"
+            if name > last:
+                break
+            names.append(name)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return names
+
+    def append(self, timestamp: int, temp_tenths: int, boiler: int, allow_equal: bool = True) -> bool:
+        name = datetime.fromtimestamp(timestamp).strftime("%Y_%m")
+        with self._lock:
+            if self._newest is not None:
+                self._newest = max(self._newest, name)
+            return self._get_segment(name).append(timestamp, temp_tenths, boiler, allow_equal)
+
+    def iter_records(self, start_ts: int, end_ts: int) -> Iterator[Tuple[int, int, int]]:
+        """Stream records one segment at a time straight out of the mapped files"""
+        with self._lock:
+            last = self._last_segment_name()
+        for name in self._segment_names_between(start_ts, end_ts, last):
+            with self._lock:
+                segment = self._existing_segment(name)
+                if segment is None:
+                    continue
+                view = segment.records(start_ts, end_ts)
+            yield from RECORD.iter_unpack(view)
@@ -0,0 +1,311 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.constants import DEFAULT_ZONE
+from app.repositories.backends.base import (
+    StorageBackend, DOCUMENT_STATE, DOCUMENT_DEVICE_STATUS, DOCUMENT_CONFIGS
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zone_state (
+    zone_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (zone_id, key)
+);
+CREATE TABLE IF NOT EXISTS configurations (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS zone_devices (
+    zone_id TEXT NOT NULL,
+    device_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ip_address TEXT,
+    device_id TEXT,
+    PRIMARY KEY (zone_id, device_type)
+);
+CREATE TABLE IF NOT EXISTS readings (
+    ts INTEGER NOT NULL,
+    temp INTEGER NOT NULL,
+    boiler INTEGER NOT NULL,
+    zone_id TEXT NOT NULL DEFAULT 'default'
+);
+CREATE INDEX IF NOT EXISTS readings_zone_ts ON readings (zone_id, ts);
+
+-- Bumped by triggers so other processes can cheaply detect configuration changes
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('configs_version', 0);
+CREATE TRIGGER IF NOT EXISTS configurations_inserted AFTER INSERT ON configurations
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'configs_version'; END;
+CREATE TRIGGER IF NOT EXISTS configurations_updated AFTER UPDATE ON configurations
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'configs_version'; END;
+CREATE TRIGGER IF NOT EXISTS configurations_deleted AFTER DELETE ON configurations
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'configs_version'; END;
+"""
+
+# Statements are kept as constants so every connection's statement cache reuses the prepared form
+SELECT_ZONES = "SELECT DISTINCT zone_id FROM zone_state ORDER BY zone_id"
+SELECT_STATE = "SELECT key, value FROM zone_state WHERE zone_id = ?"
+UPSERT_STATE = (
+    "INSERT INTO zone_state (zone_id, key, value) VALUES (?, ?, ?) "
+    "ON CONFLICT(zone_id, key) DO UPDATE SET value = excluded.value"
+)
+SELECT_CONFIGS = "SELECT name, data FROM configurations ORDER BY rowid"
+UPSERT_CONFIG = "INSERT INTO configurations (name, data) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET data = excluded.data"
+DELETE_CONFIG = "DELETE FROM configurations WHERE name = ?"
+SELECT_CONFIGS_VERSION = "SELECT value FROM meta WHERE key = 'configs_version'"
+SELECT_DEVICES = "SELECT device_type, status, ip_address, device_id FROM zone_devices WHERE zone_id = ?"
+UPSERT_DEVICE = (
+    "INSERT INTO zone_devices (zone_id, device_type, status, ip_address, device_id) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(zone_id, device_type) DO UPDATE SET "
+    "status = excluded.status, ip_address = excluded.ip_address, device_id = excluded.device_id"
+)
+SELECT_LAST_READING = "SELECT MAX(ts) FROM readings WHERE zone_id = ?"
+INSERT_READING = "INSERT INTO readings (zone_id, ts, temp, boiler) VALUES (?, ?, ?, ?)"
+# Keyset pagination on (ts, rowid): each batch resumes after the last row of the previous one
+SELECT_READINGS = (
+    "SELECT rowid, ts, temp, boiler FROM readings WHERE zone_id = ? AND ts >= ? AND ts < ? AND (ts > ? OR rowid > ?) "
+    "ORDER BY ts, rowid LIMIT ?"
+)
+
+FETCH_SIZE = 1024  # rows read per batch while streaming readings
+POOL_TIMEOUT = 10  # seconds to wait for a free connection, as long as SQLite waits for a lock
+
+
+def _row_size(row: Tuple) -> int:
+    """Approximate bytes of a row of text columns, for the storage metrics"""
+    return sum(len(value) for value in row if value is not None)
+
+
+def _migrate_single_zone(connection: sqlite3.Connection):
+    """Databases created before zones existed keep their rows as the default zone"""
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "readings" in tables:
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(readings)")}
+        if "zone_id" not in columns:
+            connection.execute(f"ALTER TABLE readings ADD COLUMN zone_id TEXT NOT NULL DEFAULT '{DEFAULT_ZONE}'")
+            connection.execute("DROP INDEX IF EXISTS readings_ts")
+    if "state" in tables:
+        connection.executescript(f"""
+            CREATE TABLE zone_state (zone_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (zone_id, key));
+            INSERT INTO zone_state SELECT '{DEFAULT_ZONE}', key, value FROM state;
+            DROP TABLE state;
+        """)
+    if "devices" in tables:
+        connection.executescript(f"""
+            CREATE TABLE zone_devices (
+                zone_id TEXT NOT NULL, device_type TEXT NOT NULL, status TEXT NOT NULL,
+                ip_address TEXT, device_id TEXT, PRIMARY KEY (zone_id, device_type)
+            );
+            INSERT INTO zone_devices SELECT '{DEFAULT_ZONE}', device_type, status, ip_address, device_id FROM devices;
+            DROP TABLE devices;
+        """)
+
+
+class ConnectionPool:
+    """Up to size connections shared between threads, created on demand"""
+
+    def __init__(self, path: Path, size: int):
+        self._path = path
+        self._size = size
+        self._created = 0
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path, timeout=10, check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Raises sqlite3.OperationalError if no connection frees up within POOL_TIMEOUT"""
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self._size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                connection = self._connect()
+            else:
+                try:
+                    connection = self._idle.get(timeout=POOL_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(f"no free database connection within {POOL_TIMEOUT} seconds")
+
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Everything in one SQLite database in WAL mode, so readers never wait for the writer.
+    State is stored as one row per zone and field and devices as one row per zone and device,
+    saving only touches the rows that changed since the last save.
+    Writers take their connection before the write lock, so a writer waiting for a connection
+    never holds up the others, and no connection is held between two batches of streamed readings.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, pool_size: int = 4):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool = ConnectionPool(path, pool_size)
+        self._write_lock = threading.Lock()
+        # Last saved rows per zone, so saves can skip unchanged ones
+        self._saved_state: Dict[str, Dict] = {}
+        self._saved_devices: Dict[str, Dict] = {}
+        self._last_reading_ts: Dict[str, Optional[int]] = {}
+
+        with self._pool.connection() as connection:
+            _migrate_single_zone(connection)
+            connection.executescript(SCHEMA)
+
+    def is_empty(self) -> bool:
+        with self._pool.connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM configurations").fetchone()[0] == 0
+
+    def list_zones(self) -> List[str]:
+        with self._pool.connection() as connection:
+            return [row[0] for row in connection.execute(SELECT_ZONES)]
+
+    def load_state(self, zone_id: str) -> Optional[Dict]:
+        started = time.perf_counter()
+        with self._pool.connection() as connection:
+            rows = connection.execute(SELECT_STATE, (zone_id,)).fetchall()
+        if not rows:
+            return None
+        state = {key: json.loads(value) for key, value in rows}
+        self._saved_state[zone_id] = dict(state)
+        self._observe(DOCUMENT_STATE, "load", started, sum(len(value) for _, value in rows))
+        return state
+
+    def save_state(self, zone_id: str, state: Dict):
+        started = time.perf_counter()
+        with self._pool.connection() as connection, self._write_lock:
+            saved = self._saved_state.get(zone_id, {})
+            changed = [
+                (zone_id, key, json.dumps(value)) for key, value in state.items() if saved.get(key, ...) != value
+            ]
+            if not changed:
+                return
+            with connection:
+                connection.executemany(UPSERT_STATE, changed)
+            self._saved_state[zone_id] = dict(state)
+        self._observe(DOCUMENT_STATE, "save", started, sum(len(row[2]) for row in changed))
+
+    def load_configs(self) -> Dict:
+        started = time.perf_counter()
+        with self._pool.connection() as connection:
+            rows = connection.execute(SELECT_CONFIGS).fetchall()
+        self._observe(DOCUMENT_CONFIGS, "load", started, sum(len(data) for _, data in rows))
+        return {name: json.loads(data) for name, data in rows}
+
+    def save_configs(self, configs: Dict):
+        started = time.perf_counter()
+        written = 0
+        with self._pool.connection() as connection, self._write_lock, connection:
+            stored = dict(connection.execute(SELECT_CONFIGS).fetchall())
+            for name in stored.keys() - configs.keys():
+                connection.execute(DELETE_CONFIG, (name,))
+            for name, config in configs.items():
+                data = json.dumps(config)
+                if stored.get(name) != data:
+                    connection.execute(UPSERT_CONFIG, (name, data))
+                    written += len(data)
+        self._observe(DOCUMENT_CONFIGS, "save", started, written)
+
+    def save_config(self, name: str, config: Dict):
+        started = time.perf_counter()
+        data = json.dumps(config)
+        with self._pool.connection() as connection, self._write_lock, connection:
+            connection.execute(UPSERT_CONFIG, (name, data))
+        self._observe(DOCUMENT_CONFIGS, "save", started, len(data))
+
+    def delete_config(self, name: str):
+        with self._pool.connection() as connection, self._write_lock, connection:
+            connection.execute(DELETE_CONFIG, (name,))
+
+    def configs_signature(self):
+        with self._pool.connection() as connection:
+            return connection.execute(SELECT_CONFIGS_VERSION).fetchone()[0]
+
+    def load_device_status(self, zone_id: str) -> Optional[Dict]:
+        started = time.perf_counter()
+        with self._pool.connection() as connection:
+            rows = connection.execute(SELECT_DEVICES, (zone_id,)).fetchall()
+        if not rows:
+            return None
+        status = {
+            device_type: {"status": status, "ip_address": ip_address, "device_id": device_id}
+            for device_type, status, ip_address, device_id in rows
+        }
+        self._saved_devices[zone_id] = {device_type: dict(info) for device_type, info in status.items()}
+        self._observe(DOCUMENT_DEVICE_STATUS, "load", started, sum(_row_size(row) for row in rows))
+        return status
+
+    def save_device_status(self, zone_id: str, status: Dict):
+        started = time.perf_counter()
+        with self._pool.connection() as connection, self._write_lock:
+            saved = self._saved_devices.get(zone_id, {})
+            changed = [
+                (zone_id, device_type, info["status"], info.get("ip_address"), info.get("device_id"))
+                for device_type, info in status.items() if saved.get(device_type) != info
+            ]
+            if not changed:
+                return
+            with connection:
+                connection.executemany(UPSERT_DEVICE, changed)
+            self._saved_devices[zone_id] = {device_type: dict(info) for device_type, info in status.items()}
+        self._observe(DOCUMENT_DEVICE_STATUS, "save", started, sum(_row_size(row[1:]) for row in changed))
+
+    def append_reading(self, zone_id: str, timestamp: int, temp_tenths: int, boiler: int,
+                       allow_equal: bool = True) -> bool:
+        with self._pool.connection() as connection, self._write_lock:
+            if zone_id not in self._last_reading_ts:
+                self._last_reading_ts[zone_id] = connection.execute(SELECT_LAST_READING, (zone_id,)).fetchone()[0]
+            last = self._last_reading_ts[zone_id]
+            if last is not None and (timestamp < last or (timestamp == last and not allow_equal)):
+                return False
+            with connection:
+                connection.execute(INSERT_READING, (zone_id, timestamp, temp_tenths, boiler))
+            self._last_reading_ts[zone_id] = timestamp
+            return True
+
+    def iter_readings(self, zone_id: str, start_ts: int, end_ts: int) -> Iterator[Tuple[int, int, int]]:
+        # The connection goes back to the pool before each batch is yielded, slow consumers hold none
+        last_ts, last_rowid = start_ts, -1  # rowids are positive, so the first batch starts at start_ts
+        while True:
+            with self._pool.connection() as connection:
+                rows = connection.execute(
+                    SELECT_READINGS, (zone_id, last_ts, end_ts, last_ts, last_rowid, FETCH_SIZE)
+                ).fetchall()
+            for _, ts, temp, boiler in rows:
+                yield ts, temp, boiler
+            if len(rows) < FETCH_SIZE:
+                return
+            last_rowid, last_ts = rows[-1][0], rows[-1][1]
+
+    def close(self):
+        self._pool.close()
@@ -1,21 +1,143 @@
+import copy
+import hashlib
 import json
-from pathlib import Path
+import threading
+import time as _time
+from collections import OrderedDict
 from app.models.configuration import Configuration
 from app.models.interval import Interval
 from app.models.time import Time
-from typing import List, Dict
+from app.models.schedule import CompiledSchedule, MINUTES_PER_DAY, MINUTES_PER_WEEK, minute_of_week
+from array import array
+from typing import List, Dict, Optional, Tuple
 from app.constants import DAYS_OF_WEEK, DEFAULT_INTERVALS
-from datetime import datetime
+from app.repositories.storage import get_backend
+from app.utils.log import get_logger
+from datetime import datetime, timedelta
 
-CONFIG_FILE = Path("storage/configurations.json")
+log = get_logger(__name__)
+
+CONFIG_CACHE_SIZE = 16  # parsed configurations kept in memory
+CHANGE_CHECK_INTERVAL = 1.0  # seconds between checks for edits made outside the process
+
+_config_lock = threading.Lock()
+
+# Parsed configurations keyed by name, least recently used first.
+# Each entry remembers the raw configuration it was parsed from and its compiled schedule, once built.
+# Editing one configuration replaces its raw dict, so only that configuration's entries go stale.
+_config_cache: "OrderedDict[str, List]" = OrderedDict()
+_config_etags: Dict[str, Tuple[Dict, str]] = {}  # name -> (raw configuration, ETag)
+_raw_configs: Optional[Dict] = None
+_store_signature = None  # backend token of the stored configurations, the same in every process
+_last_change_check = 0.0
+
+
+class ConfigConflictError(Exception):
+    """The configuration changed since the version an edit was based on"""
+
+    def __init__(self, name: str, current_etag: str):
+        super().__init__(f"Configuration '{name}' was modified by someone else")
+        self.name = name
+        self.current_etag = current_etag
+
+    def __reduce__(self):
+        # Raised in the control process and re-raised in the API worker that sent the edit
+        return ConfigConflictError, (self.name, self.current_etag)
+
+
+def _invalidate():
+    """Drop everything cached. Caller must hold _config_lock."""
+    global _raw_configs
+    _raw_configs = None
+    _config_cache.clear()
+    _config_etags.clear()
+
+
+def _check_external_changes(force: bool = False):
+    """Invalidate the cache if the configurations were changed outside this process. Caller must hold _config_lock."""
+    global _store_signature, _last_change_check
+    now = _time.monotonic()
+    if not force and now - _last_change_check < CHANGE_CHECK_INTERVAL:
+        return
+    _last_change_check = now
+
+    signature = get_backend().configs_signature()
+    if signature != _store_signature:
+        _store_signature = signature
+        _invalidate()
+
+
+def _after_write():
+    """Caller must hold _config_lock"""
+    global _store_signature
+    _invalidate()
+    _store_signature = get_backend().configs_signature()
+
+
+def _replace_config(name: str, config: Dict):
+    """After storing one configuration, update the caches for it alone. Caller must hold _config_lock."""
+    global _store_signature
+    if _raw_configs is not None:
+        _raw_configs[name] = config
+    _config_cache.pop(name, None)
+    _config_etags.pop(name, None)
+    _store_signature = get_backend().configs_signature()
+
+
+def _raw_configs_locked() -> Dict:
+    """Return the raw configurations, loading them on a cache miss. Caller must hold _config_lock."""
+    global _raw_configs, _store_signature
+    _check_external_changes()
+    if _raw_configs is None:
+        _raw_configs = get_backend().load_configs()
+        _store_signature = get_backend().configs_signature()
+    return _raw_configs
+
+
+def refresh():
+    """Pick up edits made by other processes now instead of within CHANGE_CHECK_INTERVAL"""
+    with _config_lock:
+        _check_external_changes(force=True)
+
+
+def config_exists(name: str) -> bool:
+    with _config_lock:
+        return name in _raw_configs_locked()
+
+
+def get_store_signature() -> str:
+    """
+    Changes whenever the stored configurations change, and unlike a counter it is the same
+    in every process, so ETags built from it match whichever API worker serves the request
+    """
+    with _config_lock:
+        _check_external_changes()
+        signature = _store_signature
+    return hashlib.sha256(repr(signature).encode()).hexdigest()[:12]
 
 
 def load_config(name: str) -> Configuration:
-    with open(CONFIG_FILE, 'r') as f:
-        all_configs = json.load(f)
+    """Return the parsed configuration. The result is shared between callers and must not be modified."""
+    with _config_lock:
+        raw_configs = _raw_configs_locked()
+
+        raw_config = raw_configs[name]
+        entry = _config_cache.get(name)
+        if entry is not None and entry[0] is raw_config:
+            _config_cache.move_to_end(name)
+            return entry[1]
+
+        config = _parse_config(name, raw_config)
 
-    config =  all_configs[name]
+        _config_cache[name] = [raw_config, config, None]
+        _config_cache.move_to_end(name)
+        while len(_config_cache) > CONFIG_CACHE_SIZE:
+            _config_cache.popitem(last=False)
 
+        return config
+
+
+def _parse_config(name: str, config: Dict) -> Configuration:
     return Configuration(
         name=name,
         monday=parse_intervals(config["monday"]),
@@ -27,6 +149,18 @@ def load_config(name: str) -> Configuration:
         sunday=parse_intervals(config["sunday"]),
     )
 
+def parse_candidate(name: str, config: Dict) -> Configuration:
+    """Parse a configuration that is not stored, e.g. one to compare; raises ValueError if it is invalid"""
+    if not isinstance(config, dict):
+        raise ValueError(f"Configuration '{name}' must be an object with one interval list per day")
+    try:
+        for day in DAYS_OF_WEEK:
+            if config.get(day):
+                _validate_day(config, day)
+        return _parse_config(name, {day: config.get(day) or [] for day in DAYS_OF_WEEK})
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid configuration '{name}': {e}")
+
 def parse_intervals(raw_list: List[Dict]) -> List[Interval]:
     return [
         Interval(
@@ -40,45 +174,164 @@ def parse_intervals(raw_list: List[Dict]) -> List[Interval]:
 
 
 def create_config(name: str):
-    all_configs = load_all_configs()
-
-    if name in all_configs:
+    if config_exists(name):
         raise ValueError(f"Configuration '{name}' already exists.")
 
-    import copy
     new_config = {day: copy.deepcopy(DEFAULT_INTERVALS) for day in DAYS_OF_WEEK}
 
-    all_configs[name] = new_config
+    save_config(name, new_config)
 
-    save_all_configs(all_configs)
-
-    print(f"Configuration '{name}' created with default intervals")
+    log.info("Configuration '%s' created with default intervals", name)
 
 
 def delete_config(name: str, current_selected_config: str = None):
-    all_configs = load_all_configs()
-
-    if name not in all_configs:
+    if not config_exists(name):
         raise ValueError(f"Configuration '{name}' does not exist.")
 
     if current_selected_config and name == current_selected_config:
         raise ValueError(f"Cannot delete '{name}' - it is currently active. Please select a different configuration first.")
 
-    del all_configs[name]
+    with _config_lock:
+        get_backend().delete_config(name)
+        _after_write()
 
-    save_all_configs(all_configs)
-
-    print(f"Configuration '{name}' has been deleted.")
+    log.info("Configuration '%s' has been deleted", name)
 
 
 def load_all_configs() -> Dict:
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
+    """Return a copy of the raw configurations document that the caller is free to modify"""
+    with _config_lock:
+        return copy.deepcopy(_raw_configs_locked())
 
 
 def save_all_configs(configs: Dict):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(configs, f, indent=4)
+    with _config_lock:
+        get_backend().save_configs(configs)
+        _after_write()
+
+
+def save_config(name: str, config: Dict, expected_etag: str = None) -> str:
+    """
+    Store a single configuration, leaving the others untouched, and return its new ETag.
+    With expected_etag, raises ConfigConflictError if the stored configuration no longer has that ETag.
+    """
+    with _config_lock:
+        if expected_etag is not None:
+            _check_etag_locked(name, expected_etag)
+        get_backend().save_config(name, config)
+        _replace_config(name, config)
+        return _etag_locked(name)
+
+
+def _make_etag(config: Dict) -> str:
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+    return f'"{digest[:16]}"'
+
+
+def _etag_locked(name: str) -> str:
+    """ETag of a stored configuration, derived from its content. Caller must hold _config_lock."""
+    raw_config = _raw_configs_locked()[name]
+    cached = _config_etags.get(name)
+    if cached is not None and cached[0] is raw_config:
+        return cached[1]
+    etag = _make_etag(raw_config)
+    _config_etags[name] = (raw_config, etag)
+    return etag
+
+
+def _check_etag_locked(name: str, expected_etag: str):
+    current = _etag_locked(name)
+    if current != expected_etag:
+        raise ConfigConflictError(name, current)
+
+
+def config_etag(name: str) -> str:
+    """Raises KeyError if the configuration does not exist"""
+    with _config_lock:
+        return _etag_locked(name)
+
+
+def _check_day(day: str):
+    if day not in DAYS_OF_WEEK:
+        raise ValueError(f"Unknown day '{day}', expected one of {', '.join(DAYS_OF_WEEK)}")
+
+
+def _validate_day(config: Dict, day: str):
+    try:
+        intervals = parse_intervals(config[day])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid interval on {day}: {e}")
+    check_interval_list(intervals)
+
+
+def _edit_config(name: str, expected_etag: Optional[str], edit) -> str:
+    """
+    Apply edit(config) to a copy of one stored configuration, store the result and return its new ETag.
+    edit returns the days it changed, only those are validated.
+    """
+    with _config_lock:
+        raw_configs = _raw_configs_locked()
+        if name not in raw_configs:
+            raise KeyError(name)
+        if expected_etag is not None:
+            _check_etag_locked(name, expected_etag)
+
+        config = copy.deepcopy(raw_configs[name])
+        for day in edit(config):
+            _validate_day(config, day)
+
+        get_backend().save_config(name, config)
+        _replace_config(name, config)
+        return _etag_locked(name)
+
+
+def update_day(name: str, day: str, intervals: List[Dict], expected_etag: str = None) -> str:
+    """Replace the intervals of one day, returns the new ETag"""
+    _check_day(day)
+
+    def edit(config: Dict) -> List[str]:
+        config[day] = intervals
+        return [day]
+
+    return _edit_config(name, expected_etag, edit)
+
+
+INTERVAL_FIELDS = ("ON_temperature", "OFF_temperature", "start_time", "end_time")
+
+
+def update_interval(name: str, day: str, index: int, changes: Dict, expected_etag: str = None) -> str:
+    """
+    Change some fields of one interval, returns the new ETag.
+    Raises IndexError if the day has no interval at that index.
+    """
+    _check_day(day)
+    unknown = set(changes) - set(INTERVAL_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown interval fields: {', '.join(sorted(unknown))}")
+
+    def edit(config: Dict) -> List[str]:
+        intervals = config[day]
+        if not 0 <= index < len(intervals):
+            raise IndexError(f"{day} has no interval {index}")
+        intervals[index] = {**intervals[index], **changes}
+        return [day]
+
+    return _edit_config(name, expected_etag, edit)
+
+
+def copy_day(name: str, source_day: str, target_days: List[str], expected_etag: str = None) -> str:
+    """Copy the intervals of one day to other days, returns the new ETag"""
+    _check_day(source_day)
+    for day in target_days:
+        _check_day(day)
+
+    def edit(config: Dict) -> List[str]:
+        for day in target_days:
+            config[day] = copy.deepcopy(config[source_day])
+        # Every target is an identical copy of the source, validating it once covers them all
+        return [source_day] if target_days else []
+
+    return _edit_config(name, expected_etag, edit)
 
 
 def check_interval_list(intervals: List[Interval]) -> bool:
@@ -114,20 +367,82 @@ def check_interval_list(intervals: List[Interval]) -> bool:
     return True
 
 
-def find_active_interval(config: Configuration, time: Time) -> str:
-    day = datetime.today().strftime("%A").lower()
-    intervals = getattr(config, day)
-
-    for i, interval in enumerate(intervals):
-        start = interval.start_time.timestamp
-        end = interval.end_time.timestamp
-
-        if start < end:
-            if start <= time.timestamp <= end:
-                return f"{day}:{i}"
-        else:
-            if time.timestamp >= start or time.timestamp <= end:
-                return f"{day}:{i}"
+def compile_schedule(config: Configuration) -> CompiledSchedule:
+    """
+    Compile a stored configuration as it is. Intervals are validated when they are written, a day that
+    does not pass check_interval_list (overlaps or gaps) is compiled anyway with a warning, first match wins.
+    """
+    slots = array('h', [-1]) * MINUTES_PER_WEEK
+
+    for weekday, day in enumerate(DAYS_OF_WEEK):
+        intervals = getattr(config, day)
+        if not intervals:
+            continue
+        try:
+            check_interval_list(intervals)
+        except ValueError as e:
+            log.warning("Configuration %s has invalid intervals on %s, first match wins: %s", config.name, day, e)
+
+        day_start = weekday * MINUTES_PER_DAY
+        # Filled in reverse so the first matching interval wins, as in a linear scan
+        for i in range(len(intervals) - 1, -1, -1):
+            start = intervals[i].start_time.timestamp
+            end = intervals[i].end_time.timestamp
+
+            if start <= end:
+                ranges = [(start, end)]
+            else:
+                ranges = [(start, MINUTES_PER_DAY - 1), (0, end)]
+
+            for first, last in ranges:
+                count = last - first + 1
+                slots[day_start + first:day_start + last + 1] = array('h', [i]) * count
+
+    boundaries = []
+    for minute in range(MINUTES_PER_WEEK):
+        previous = minute - 1 if minute else MINUTES_PER_WEEK - 1
+        if minute % MINUTES_PER_DAY == 0 or slots[minute] != slots[previous]:
+            boundaries.append(minute)
+
+    return CompiledSchedule(slots=slots, boundaries=boundaries)
+
+
+def get_schedule(config: Configuration) -> CompiledSchedule:
+    """Return the compiled schedule of a configuration, building it once per cached configuration"""
+    with _config_lock:
+        entry = _config_cache.get(config.name)
+        if entry is not None and entry[1] is config:
+            if entry[2] is None:
+                entry[2] = compile_schedule(config)
+            return entry[2]
+
+    return compile_schedule(config)
+
+
+def find_active_interval(config: Configuration, time: Time, weekday: int = None) -> str:
+    if weekday is None:
+        weekday = datetime.today().weekday()
+
+    return get_schedule(config).interval_at(minute_of_week(weekday, time.timestamp))
+
+
+def upcoming_transitions(config: Configuration, now: datetime, count: int) -> List[Tuple[datetime, str]]:
+    """Return (start time, interval) pairs of the next count interval changes after now"""
+    schedule = get_schedule(config)
+    now = now.replace(second=0, microsecond=0)
+    current = minute_of_week(now.weekday(), now.hour * 60 + now.minute)
+
+    transitions = []
+    elapsed = 0
+    for _ in range(count):
+        upcoming = schedule.next_transition(current)
+        if upcoming is None:
+            break
+        elapsed += (upcoming - current) % MINUTES_PER_WEEK or MINUTES_PER_WEEK
+        current = upcoming
+        transitions.append((now + timedelta(minutes=elapsed), schedule.interval_at(upcoming)))
+
+    return transitions
 
 
 def get_interval_obj(config: Configuration, target_interval: str) -> Interval:
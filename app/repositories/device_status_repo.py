@@ -1,88 +1,219 @@
-import json
-from pathlib import Path
+"""
+Registry of the zones' devices, kept in memory and written through to the storage backend.
+
+Each zone's status is loaded once, then served from memory. Devices are indexed by device id
+and by device type. Every message from a device refreshes its last-seen time, and a device not
+heard from for its type's TTL is marked offline by a timer, no message needed. The backend is
+only written when a device actually changes, not for every repeated status message.
+"""
 from app.models.device_status import DeviceStatus, DeviceInfo
+from app import settings
+from app.constants import DEFAULT_ZONE
+from app.repositories.storage import get_backend
+from app.utils.log import get_logger
+from app.utils.scheduler import Timer, scheduler
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
 import threading
+import time
 
-_device_status_lock = threading.Lock()
+log = get_logger(__name__)
 
-DEVICE_STATUS_FILE = Path("storage/device_status.json")
+DEVICE_TYPES = ("relay", "sensor")
+OFFLINE = DeviceInfo(status="offline", ip_address=None, device_id=None)
 
+# Serialize updates per zone, reads are served from memory without locking
+_device_status_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+_device_status_versions: Dict[str, int] = defaultdict(int)
+_registry_lock = threading.Lock()
 
-def load_device_status_threadsafe() -> DeviceStatus:
-    """Load device status from JSON file"""
-    with _device_status_lock:
-        if not DEVICE_STATUS_FILE.exists():
-            default_status = DeviceStatus(
-                relay=DeviceInfo(status="offline", ip_address=None, device_id=None),
-                sensor=DeviceInfo(status="offline", ip_address=None, device_id=None)
-            )
-            DEVICE_STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
-            with open(DEVICE_STATUS_FILE, 'w') as f:
-                json.dump({
-                    "relay": {
-                        "status": default_status.relay.status,
-                        "ip_address": default_status.relay.ip_address,
-                        "device_id": default_status.relay.device_id
-                    },
-                    "sensor": {
-                        "status": default_status.sensor.status,
-                        "ip_address": default_status.sensor.ip_address,
-                        "device_id": default_status.sensor.device_id
-                    }
-                }, f, indent=4)
-            return default_status
-
-        with open(DEVICE_STATUS_FILE, 'r') as f:
-            data = json.load(f)
-
-        return DeviceStatus(
-            relay=DeviceInfo(
-                status=data["relay"]["status"],
-                ip_address=data["relay"].get("ip_address"),
-                device_id=data["relay"].get("device_id")
-            ),
-            sensor=DeviceInfo(
-                status=data["sensor"]["status"],
-                ip_address=data["sensor"].get("ip_address"),
-                device_id=data["sensor"].get("device_id")
+# DeviceInfo objects are never mutated in place, every change swaps in a new one
+_statuses: Dict[str, DeviceStatus] = {}  # zone id -> its devices, by device type
+_device_types: Dict[Tuple[str, str], str] = {}  # (zone id, device id) -> device type
+_last_seen: Dict[Tuple[str, str], float] = {}  # (zone id, device type) -> monotonic time of its last message
+_expiry_timers: Dict[Tuple[str, str], Timer] = {}  # (zone id, device type) -> liveness deadline
+_timers_lock = threading.Lock()
+
+
+def get_device_status_version(zone_id: str = DEFAULT_ZONE) -> int:
+    """Counter bumped every time a zone's device status changes"""
+    return _device_status_versions.get(zone_id, 0)
+
+
+def _zone_lock(zone_id: str) -> threading.Lock:
+    lock = _device_status_locks.get(zone_id)
+    if lock is None:
+        with _registry_lock:
+            lock = _device_status_locks[zone_id]
+    return lock
+
+
+def _device_info_to_dict(info: DeviceInfo) -> dict:
+    return {
+        "status": info.status,
+        "ip_address": info.ip_address,
+        "device_id": info.device_id
+    }
+
+
+def _device_info_from_dict(data: dict) -> DeviceInfo:
+    return DeviceInfo(
+        status=data["status"],
+        ip_address=data.get("ip_address"),
+        device_id=data.get("device_id")
+    )
+
+
+def _status(zone_id: str) -> DeviceStatus:
+    """The zone's registry entry, loaded from the backend on first use"""
+    status = _statuses.get(zone_id)
+    if status is not None:
+        return status
+    with _zone_lock(zone_id):
+        status = _statuses.get(zone_id)
+        if status is not None:
+            return status
+
+        data = get_backend().load_device_status(zone_id)
+        if data is None:
+            status = DeviceStatus(relay=OFFLINE, sensor=OFFLINE)
+            _save(status, zone_id)
+        else:
+            status = DeviceStatus(
+                relay=_device_info_from_dict(data["relay"]),
+                sensor=_device_info_from_dict(data["sensor"])
             )
-        )
-
-
-def save_device_status_threadsafe(device_status: DeviceStatus):
-    """Save device status to JSON file"""
-    with _device_status_lock:
-        DEVICE_STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(DEVICE_STATUS_FILE, 'w') as f:
-            json.dump({
-                "relay": {
-                    "status": device_status.relay.status,
-                    "ip_address": device_status.relay.ip_address,
-                    "device_id": device_status.relay.device_id
-                },
-                "sensor": {
-                    "status": device_status.sensor.status,
-                    "ip_address": device_status.sensor.ip_address,
-                    "device_id": device_status.sensor.device_id
-                }
-            }, f, indent=4)
-
-
-def update_device_status(device_type: str, status: str, ip_address: str = None, device_id: str = None):
-    """Update status for a specific device (relay or sensor)"""
-    device_status = load_device_status_threadsafe()
-
-    if device_type == "relay":
-        device_status.relay = DeviceInfo(
-            status=status,
-            ip_address=ip_address if status == "online" else device_status.relay.ip_address,
-            device_id=device_id if status == "online" else device_status.relay.device_id
-        )
-    elif device_type == "sensor":
-        device_status.sensor = DeviceInfo(
-            status=status,
-            ip_address=ip_address if status == "online" else device_status.sensor.ip_address,
-            device_id=device_id if status == "online" else device_status.sensor.device_id
-        )
-
-    save_device_status_threadsafe(device_status)
+        _statuses[zone_id] = status
+
+    now = time.monotonic()
+    for device_type in DEVICE_TYPES:
+        info = getattr(status, device_type)
+        if info.device_id is not None:
+            _device_types[(zone_id, info.device_id)] = device_type
+        if info.status == "online":
+            # Online when we stopped: it has one TTL to show it still is
+            _last_seen[(zone_id, device_type)] = now
+            _watch(zone_id, device_type)
+    return status
+
+
+def _save(device_status: DeviceStatus, zone_id: str):
+    get_backend().save_device_status(zone_id, {
+        "relay": _device_info_to_dict(device_status.relay),
+        "sensor": _device_info_to_dict(device_status.sensor)
+    })
+    _device_status_versions[zone_id] += 1
+
+
+def load_device_status_threadsafe(zone_id: str = DEFAULT_ZONE) -> DeviceStatus:
+    """A zone's device status, storing the default on first use"""
+    status = _status(zone_id)
+    return DeviceStatus(relay=status.relay, sensor=status.sensor)
+
+
+def save_device_status_threadsafe(device_status: DeviceStatus, zone_id: str = DEFAULT_ZONE):
+    """Replace a zone's device status and write it to the storage backend"""
+    _status(zone_id)
+    with _zone_lock(zone_id):
+        status = DeviceStatus(relay=device_status.relay, sensor=device_status.sensor)
+        _statuses[zone_id] = status
+        _save(status, zone_id)
+
+
+def device_type_of(device_id: str, zone_id: str = DEFAULT_ZONE) -> Optional[str]:
+    """The type a device registered with, None for a device never seen in this zone"""
+    _status(zone_id)
+    return _device_types.get((zone_id, device_id))
+
+
+def last_seen(device_type: str, zone_id: str = DEFAULT_ZONE) -> Optional[float]:
+    """time.monotonic() of the device's last message, None if it has not talked since startup"""
+    return _last_seen.get((zone_id, device_type))
+
+
+def update_device_status(device_type: str, status: str, ip_address: str = None, device_id: str = None,
+                         zone_id: str = DEFAULT_ZONE):
+    """Update status for a specific device (relay or sensor) of a zone"""
+    if device_type not in DEVICE_TYPES:
+        return
+    if status == "online":
+        _last_seen[(zone_id, device_type)] = time.monotonic()
+    _status(zone_id)
+    with _zone_lock(zone_id):
+        _update_device_status(device_type, status, ip_address, device_id, zone_id)
+    if status == "online":
+        _watch(zone_id, device_type)
+
+
+def _update_device_status(device_type: str, status: str, ip_address: str, device_id: str, zone_id: str) -> bool:
+    """Returns whether anything changed. Caller must hold the zone lock."""
+    current = _statuses[zone_id]
+    old = getattr(current, device_type)
+    new = DeviceInfo(
+        status=status,
+        ip_address=ip_address if status == "online" else old.ip_address,
+        device_id=device_id if status == "online" else old.device_id
+    )
+    if new == old:
+        return False
+
+    if new.device_id is not None:
+        if old.device_id is not None and old.device_id != new.device_id:
+            _device_types.pop((zone_id, old.device_id), None)
+        _device_types[(zone_id, new.device_id)] = device_type
+    updated = DeviceStatus(relay=current.relay, sensor=current.sensor)
+    setattr(updated, device_type, new)
+    _statuses[zone_id] = updated
+    _save(updated, zone_id)
+    return True
+
+
+def mark_seen(device_type: str, zone_id: str = DEFAULT_ZONE):
+    """
+    Any message from a device proves it is alive. Called for every message, so it costs
+    a dictionary write unless the device was offline.
+    """
+    key = (zone_id, device_type)
+    _last_seen[key] = time.monotonic()
+
+    info = getattr(_status(zone_id), device_type)
+    if info.status != "online" and info.device_id is not None:
+        with _zone_lock(zone_id):
+            info = getattr(_statuses[zone_id], device_type)
+            if _update_device_status(device_type, "online", info.ip_address, info.device_id, zone_id):
+                log.info("Zone %s: %s %s is talking again, back online", zone_id, device_type, info.device_id)
+
+    timer = _expiry_timers.get(key)
+    if timer is None or not timer.pending:
+        _watch(zone_id, device_type)
+
+
+def _watch(zone_id: str, device_type: str):
+    """Arm the device's liveness timer, unless its type never expires or it is armed already"""
+    ttl = settings.DEVICE_TTL.get(device_type, 0)
+    if ttl <= 0:
+        return
+    key = (zone_id, device_type)
+    with _timers_lock:
+        timer = _expiry_timers.get(key)
+        if timer is None:
+            timer = _expiry_timers[key] = scheduler.timer(_check_expiry, zone_id, device_type)
+        if not timer.pending:
+            timer.reschedule(ttl)
+
+
+def _check_expiry(zone_id: str, device_type: str):
+    """
+    Messages do not move the deadline, that would cost a heap operation each;
+    the timer finds the newer last-seen time when it fires and re-arms for its deadline instead.
+    """
+    ttl = settings.DEVICE_TTL[device_type]
+    key = (zone_id, device_type)
+    silent_for = time.monotonic() - _last_seen.get(key, 0.0)
+    if silent_for < ttl:
+        _expiry_timers[key].reschedule(ttl - silent_for)
+        return
+
+    with _zone_lock(zone_id):
+        if _update_device_status(device_type, "offline", None, None, zone_id):
+            log.warning("Zone %s: no message from the %s in %d seconds, marked offline", zone_id, device_type, silent_for)
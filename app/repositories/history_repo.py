@@ -0,0 +1,234 @@
+"""
+Temperature history on top of the storage backend.
+
+Readings are raw (epoch seconds, temperature in tenths of a degree, boiler state) records,
+append-only and in time order. The most recent HOT_TIER_SECONDS of readings are also kept
+in memory, per zone, and serve recent queries without touching storage.
+"""
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app import settings
+from app.constants import DEFAULT_ZONE
+from app.repositories.storage import get_backend
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+LEGACY_READINGS_DIR = Path("temp_readings")
+
+BOILER_OFF = 0
+BOILER_ON = 1
+BOILER_UNKNOWN = 2  # readings imported from the old text logs
+
+HOT_TIER_SECONDS = 48 * 3600
+HOT_TIER_MAX_RECORDS = 100_000
+# API worker processes never append readings, a hot tier there would go stale
+HOT_TIER_ENABLED = settings.PROCESS_ROLE != "api"
+
+
+class _HotTier:
+    """A zone's recent raw records in time order, complete for every timestamp >= start"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records: deque = deque(maxlen=HOT_TIER_MAX_RECORDS)
+        self.start: Optional[int] = None
+
+
+_hot_tiers: Dict[str, _HotTier] = {}
+_hot_tiers_lock = threading.Lock()
+
+
+def _hot_tier(zone_id: str) -> _HotTier:
+    tier = _hot_tiers.get(zone_id)
+    if tier is None:
+        with _hot_tiers_lock:
+            tier = _hot_tiers.setdefault(zone_id, _HotTier())
+    return tier
+
+
+def to_boiler_code(boiler_state: Optional[bool]) -> int:
+    if boiler_state is None:
+        return BOILER_UNKNOWN
+    return BOILER_ON if boiler_state else BOILER_OFF
+
+
+def _warm_hot_tier(tier: _HotTier, zone_id: str):
+    """Fill the hot tier from storage on first use. Caller must hold tier.lock."""
+    if tier.start is not None:
+        return
+
+    start_ts = int(time.time()) - HOT_TIER_SECONDS
+    tier.records.extend(get_backend().iter_readings(zone_id, start_ts, 2 ** 32 - 1))
+    tier.start = tier.records[0][0] if len(tier.records) == HOT_TIER_MAX_RECORDS else start_ts
+
+
+def _push_hot_tier(tier: _HotTier, record: Tuple[int, int, int]):
+    """Caller must hold tier.lock"""
+    records = tier.records
+    if len(records) == HOT_TIER_MAX_RECORDS:
+        tier.start = records[1][0]
+    records.append(record)
+
+    horizon = record[0] - HOT_TIER_SECONDS
+    while records and records[0][0] < horizon:
+        records.popleft()
+    tier.start = max(tier.start, horizon)
+
+
+def append_reading(temp: float, timestamp: datetime, boiler_state: Optional[bool] = None,
+                   allow_equal: bool = True, zone_id: str = DEFAULT_ZONE) -> bool:
+    """Append one reading to a zone's history. Readings older than the newest stored one are skipped."""
+    record = (int(timestamp.timestamp()), round(temp * 10), to_boiler_code(boiler_state))
+    tier = _hot_tier(zone_id)
+    with tier.lock:
+        _warm_hot_tier(tier, zone_id)
+        if not get_backend().append_reading(zone_id, *record, allow_equal):
+            return False
+        if record[0] >= time.time() - HOT_TIER_SECONDS:
+            _push_hot_tier(tier, record)
+        return True
+
+
+def _hot_tier_records(zone_id: str, start_ts: int, end_ts: int) -> Optional[List[Tuple[int, int, int]]]:
+    """Records in range from memory, or None when the hot tier does not cover start_ts"""
+    if not HOT_TIER_ENABLED:
+        return None
+    tier = _hot_tier(zone_id)
+    with tier.lock:
+        _warm_hot_tier(tier, zone_id)
+        if start_ts < tier.start:
+            return None
+
+        records = []
+        for record in reversed(tier.records):
+            if record[0] < start_ts:
+                break
+            if record[0] < end_ts:
+                records.append(record)
+    records.reverse()
+    return records
+
+
+def iter_raw_readings(start: datetime, end: datetime, zone_id: str = DEFAULT_ZONE) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yield raw (epoch seconds, temperature * 10, boiler code) tuples with start <= time < end.
+    Recent ranges come from the hot tier, older ones are streamed from storage.
+    """
+    start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+
+    recent = _hot_tier_records(zone_id, start_ts, end_ts)
+    if recent is not None:
+        yield from recent
+        return
+
+    yield from get_backend().iter_readings(zone_id, start_ts, end_ts)
+
+
+def iter_readings(start: datetime, end: datetime,
+                  zone_id: str = DEFAULT_ZONE) -> Iterator[Tuple[datetime, float, Optional[bool]]]:
+    for timestamp, temp_tenths, boiler in iter_raw_readings(start, end, zone_id):
+        boiler_state = None if boiler == BOILER_UNKNOWN else boiler == BOILER_ON
+        yield datetime.fromtimestamp(timestamp), temp_tenths / 10, boiler_state
+
+
+def iter_buckets(records: Iterator[Tuple[int, int, int]], start_ts: int,
+                 bucket_seconds: int) -> Iterator[Tuple[int, int, int, int, int]]:
+    """
+    Downsample time-ordered raw records in a single pass.
+    Yields (bucket start, min, max, sum, count) with temperatures in tenths, one tuple per non-empty bucket,
+    as soon as the bucket is complete.
+    """
+    current = None
+    low = high = total = count = 0
+
+    for timestamp, tenths, _ in records:
+        bucket = (timestamp - start_ts) // bucket_seconds
+        if bucket != current:
+            if count:
+                yield start_ts + current * bucket_seconds, low, high, total, count
+            current = bucket
+            low = high = tenths
+            total = count = 0
+        elif tenths < low:
+            low = tenths
+        elif tenths > high:
+            high = tenths
+        total += tenths
+        count += 1
+
+    if count:
+        yield start_ts + current * bucket_seconds, low, high, total, count
+
+
+def _parse_text_line(day: datetime, line: str) -> Tuple[datetime, float]:
+    time_str, temp_str = line.split(",")
+    hours, minutes, seconds = time_str.split(":")
+    return day.replace(hour=int(hours), minute=int(minutes), second=int(seconds)), float(temp_str)
+
+
+def iter_text_readings(directory: Path = LEGACY_READINGS_DIR, start: datetime = None, end: datetime = None,
+                       skipped: Dict[str, str] = None) -> Iterator[Tuple[datetime, float]]:
+    """
+    Stream (time, temperature) from the old YYYY_MM_DD.txt logs ("HH:MM:SS,temp" per line), in time order,
+    with start <= time < end. Files of days outside the range are not opened.
+    Malformed lines and unreadable files are logged and skipped, and reported in skipped (file name -> reason).
+    """
+    if not directory.exists():
+        return
+
+    for log_file in sorted(directory.glob("*.txt")):
+        try:
+            day = datetime.strptime(log_file.stem, "%Y_%m_%d")
+        except ValueError:
+            continue
+        if (end is not None and day >= end) or (start is not None and day.date() < start.date()):
+            continue
+
+        malformed, first_error = 0, None
+        try:
+            with open(log_file, 'r') as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        moment, temp = _parse_text_line(day, line)
+                    except ValueError as e:
+                        malformed += 1
+                        first_error = first_error or f"line {line_number}: {e}"
+                        continue
+                    if (start is None or moment >= start) and (end is None or moment < end):
+                        yield moment, temp
+        except (OSError, UnicodeDecodeError) as e:
+            log.warning("Skipped unreadable readings file %s: %s", log_file, e)
+            if skipped is not None:
+                skipped[log_file.name] = str(e)
+            continue
+
+        if malformed:
+            log.warning("Skipped %d malformed lines in %s, first at %s", malformed, log_file, first_error)
+            if skipped is not None:
+                skipped[log_file.name] = f"{malformed} malformed lines, first at {first_error}"
+
+
+def import_text_readings(directory: Path = LEGACY_READINGS_DIR, skipped: Dict[str, str] = None) -> int:
+    """
+    Import the old YYYY_MM_DD.txt logs.
+    Safe to run repeatedly, readings that are already stored are skipped.
+    """
+    imported = 0
+    for moment, temp in iter_text_readings(directory, skipped=skipped):
+        if append_reading(temp, moment, allow_equal=False):
+            imported += 1
+    return imported
+
+
+if __name__ == "__main__":
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else LEGACY_READINGS_DIR
+    print(f"[HISTORY] Imported {import_text_readings(directory)} readings from {directory}")
@@ -0,0 +1,313 @@
+"""
+Append-only journal of boiler toggles, interval changes and configuration switches,
+with hourly, daily and monthly burner-time rollups maintained incrementally on top of it.
+
+Every event records the boiler state, configuration and interval in effect after it, so the
+time between two events can be attributed without looking further back. The rollups file
+remembers how much of the journal it covers and can always be rebuilt from the journal, so it
+is written behind the journal, a few seconds after the events that changed it; hourly buckets
+older than HOURLY_RETENTION_DAYS are dropped when it is written.
+Every zone has its own journal and rollups in its storage directory.
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+from app.constants import DEFAULT_ZONE
+from app.models.state import State
+from app.settings import PROCESS_ROLE, zone_storage_dir
+from app.utils.scheduler import Timer, scheduler
+
+JOURNAL_FILE_NAME = "events.jsonl"
+ROLLUPS_FILE_NAME = "rollups.json"
+# API worker processes only read the journal the control loop appends to, they catch up on every read
+READ_ONLY = PROCESS_ROLE == "api"
+ROLLUPS_FLUSH_DELAY = 30.0  # seconds changed rollups may stay in memory, the journal has every event meanwhile
+HOURLY_RETENTION_DAYS = 90  # hourly buckets kept, daily and monthly ones are kept for good
+
+EVENT_BOILER = "boiler"
+EVENT_INTERVAL = "interval"
+EVENT_CONFIG = "config"
+
+PERIOD_FORMATS = {
+    "hourly": "%Y-%m-%dT%H",
+    "daily": "%Y-%m-%d",
+    "monthly": "%Y-%m",
+}
+
+
+class _ZoneJournal:
+    def __init__(self, zone_id: str):
+        self.zone_id = zone_id
+        directory = zone_storage_dir(zone_id)
+        self.journal_file: Path = directory / JOURNAL_FILE_NAME
+        self.rollups_file: Path = directory / ROLLUPS_FILE_NAME
+        self.lock = threading.Lock()
+        self.rollups: Optional[Dict] = None
+
+
+_journals: Dict[str, _ZoneJournal] = {}
+_journals_lock = threading.Lock()
+
+# One timer writes the rollups of every zone that changed
+_dirty_zones: Set[str] = set()
+_dirty_lock = threading.Lock()
+_flush_timer: Optional[Timer] = None
+
+
+def _journal(zone_id: str) -> _ZoneJournal:
+    journal = _journals.get(zone_id)
+    if journal is None:
+        with _journals_lock:
+            journal = _journals.get(zone_id)
+            if journal is None:
+                journal = _ZoneJournal(zone_id)
+                _journals[zone_id] = journal
+    return journal
+
+
+def _empty_rollups() -> Dict:
+    return {
+        "journal_offset": 0,
+        "cursor": None,
+        "hourly": {},
+        "daily": {},
+        "monthly": {},
+    }
+
+
+def _empty_bucket() -> Dict:
+    return {"on_seconds": 0.0, "seconds": 0.0, "toggles": 0, "intervals": {}}
+
+
+def _hour_pieces(start: float, end: float) -> Iterator[tuple]:
+    """Split [start, end) at local hour boundaries, yielding (hour start datetime, seconds)"""
+    while start < end:
+        moment = datetime.fromtimestamp(start)
+        hour = moment.replace(minute=0, second=0, microsecond=0)
+        piece_end = min((hour + timedelta(hours=1)).timestamp(), end)
+        yield hour, piece_end - start
+        start = piece_end
+
+
+def _add_time(rollups: Dict, start: float, end: float, boiler_state: bool, interval_key: Optional[str]):
+    for hour, seconds in _hour_pieces(start, end):
+        on_seconds = seconds if boiler_state else 0.0
+        for period, key_format in PERIOD_FORMATS.items():
+            bucket = rollups[period].setdefault(hour.strftime(key_format), _empty_bucket())
+            bucket["seconds"] += seconds
+            bucket["on_seconds"] += on_seconds
+            if interval_key:
+                interval = bucket["intervals"].setdefault(interval_key, {"on_seconds": 0.0, "seconds": 0.0})
+                interval["seconds"] += seconds
+                interval["on_seconds"] += on_seconds
+
+
+def _apply_event(rollups: Dict, event: Dict):
+    """Attribute the time since the previous event, then move the cursor to this one"""
+    cursor = rollups["cursor"]
+    if cursor is not None and event["ts"] > cursor["ts"]:
+        _add_time(rollups, cursor["ts"], event["ts"], cursor["boiler_state"], _interval_key(cursor))
+
+    if event["type"] == EVENT_BOILER:
+        moment = datetime.fromtimestamp(event["ts"])
+        for period, key_format in PERIOD_FORMATS.items():
+            rollups[period].setdefault(moment.strftime(key_format), _empty_bucket())["toggles"] += 1
+
+    rollups["cursor"] = {
+        "ts": max(event["ts"], cursor["ts"]) if cursor else event["ts"],
+        "boiler_state": event["boiler_state"],
+        "config": event["config"],
+        "interval": event["interval"],
+    }
+
+
+def _interval_key(cursor: Dict) -> Optional[str]:
+    if not cursor["interval"]:
+        return None
+    return f"{cursor['config']}/{cursor['interval']}"
+
+
+def _read_events(journal: _ZoneJournal, offset: int = 0) -> Iterator[tuple]:
+    """Yield (event, offset after it) for every complete journal line from offset on"""
+    if not journal.journal_file.exists():
+        return
+    with open(journal.journal_file, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield json.loads(line), offset
+
+
+def _prune_hourly(rollups: Dict, now: datetime = None):
+    """Drop hourly buckets older than the retention; the keys sort chronologically"""
+    cutoff = ((now or datetime.now()) - timedelta(days=HOURLY_RETENTION_DAYS)).strftime(PERIOD_FORMATS["hourly"])
+    hourly = rollups["hourly"]
+    for key in [key for key in hourly if key < cutoff]:
+        del hourly[key]
+
+
+def _save_rollups(journal: _ZoneJournal):
+    """Caller must hold journal.lock"""
+    _prune_hourly(journal.rollups)
+    data = json.dumps(journal.rollups)
+    journal.rollups_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = journal.rollups_file.with_suffix(".tmp")
+    with open(tmp_file, 'w') as f:
+        f.write(data)
+    os.replace(tmp_file, journal.rollups_file)
+
+
+def _schedule_flush(zone_id: str):
+    global _flush_timer
+    with _dirty_lock:
+        _dirty_zones.add(zone_id)
+        if _flush_timer is not None:
+            return
+        _flush_timer = scheduler.call_later(ROLLUPS_FLUSH_DELAY, flush_rollups)
+
+
+def flush_rollups():
+    """Write the rollups of every zone that changed since they were last written"""
+    global _flush_timer
+    with _dirty_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        zone_ids = list(_dirty_zones)
+        _dirty_zones.clear()
+
+    for zone_id in zone_ids:
+        journal = _journal(zone_id)
+        with journal.lock:
+            if journal.rollups is not None:
+                _save_rollups(journal)
+
+
+atexit.register(flush_rollups)
+
+
+def _load_rollups(journal: _ZoneJournal) -> Dict:
+    """Load the rollups and catch up with journal lines they do not cover yet. Caller must hold journal.lock."""
+    if journal.rollups is not None:
+        if not READ_ONLY:
+            return journal.rollups
+        rollups = journal.rollups
+    else:
+        if journal.rollups_file.exists():
+            with open(journal.rollups_file, 'r') as f:
+                rollups = json.load(f)
+        else:
+            rollups = _empty_rollups()
+        journal.rollups = rollups
+
+    caught_up = False
+    for event, offset in _read_events(journal, rollups["journal_offset"]):
+        _apply_event(rollups, event)
+        rollups["journal_offset"] = offset
+        caught_up = True
+    if caught_up and not READ_ONLY:
+        _schedule_flush(journal.zone_id)
+
+    return rollups
+
+
+def record_event(event_type: str, state: State, timestamp: datetime = None, zone_id: str = DEFAULT_ZONE):
+    """Append an event with the zone state in effect after it and fold it into the zone's rollups"""
+    event = {
+        "ts": (timestamp or datetime.now()).timestamp(),
+        "type": event_type,
+        "boiler_state": state.boiler_state,
+        "config": state.selected_config,
+        "interval": state.active_interval,
+    }
+    line = (json.dumps(event) + "\n").encode()
+
+    journal = _journal(zone_id)
+    with journal.lock:
+        rollups = _load_rollups(journal)
+
+        journal.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(journal.journal_file, 'ab') as f:
+            f.write(line)
+
+        _apply_event(rollups, event)
+        rollups["journal_offset"] += len(line)
+    _schedule_flush(zone_id)
+
+
+def rebuild_rollups(zone_id: str = DEFAULT_ZONE) -> int:
+    """Recompute a zone's rollups from its journal, returns the number of events replayed"""
+    journal = _journal(zone_id)
+    with journal.lock:
+        journal.rollups = rollups = _empty_rollups()
+        count = 0
+        for event, offset in _read_events(journal):
+            _apply_event(rollups, event)
+            rollups["journal_offset"] = offset
+            count += 1
+        _save_rollups(journal)
+        return count
+
+
+def _period_keys(period: str, start: datetime, end: datetime) -> List[str]:
+    """All bucket keys of a period between start and end, inclusive"""
+    key_format = PERIOD_FORMATS[period]
+    keys = []
+    moment = start.replace(minute=0, second=0, microsecond=0)
+    if period != "hourly":
+        moment = moment.replace(hour=0)
+    if period == "monthly":
+        moment = moment.replace(day=1)
+
+    while moment <= end:
+        keys.append(moment.strftime(key_format))
+        if period == "hourly":
+            moment += timedelta(hours=1)
+        elif period == "daily":
+            moment += timedelta(days=1)
+        else:
+            moment = moment.replace(year=moment.year + 1, month=1) if moment.month == 12 else moment.replace(month=moment.month + 1)
+    return keys
+
+
+def get_rollups(period: str, start: datetime, end: datetime, now: datetime = None,
+                zone_id: str = DEFAULT_ZONE) -> List[Dict]:
+    """
+    Buckets of a period between start and end, including the time elapsed since the last event.
+    Cost depends on the number of buckets in range, not on the length of the journal.
+    """
+    if period not in PERIOD_FORMATS:
+        raise ValueError(f"Unknown period '{period}', expected one of {', '.join(PERIOD_FORMATS)}")
+
+    keys = _period_keys(period, start, end)
+    journal = _journal(zone_id)
+    with journal.lock:
+        rollups = _load_rollups(journal)
+        buckets = {key: copy.deepcopy(rollups[period][key]) for key in keys if key in rollups[period]}
+        cursor = rollups["cursor"]
+
+    # The open stretch since the last event is not in the rollups yet, add it to copies only
+    now_ts = (now or datetime.now()).timestamp()
+    if cursor is not None and now_ts > cursor["ts"]:
+        open_stretch = _empty_rollups()
+        _add_time(open_stretch, cursor["ts"], now_ts, cursor["boiler_state"], _interval_key(cursor))
+        for key in keys:
+            extra = open_stretch[period].get(key)
+            if extra is None:
+                continue
+            bucket = buckets.setdefault(key, _empty_bucket())
+            bucket["seconds"] += extra["seconds"]
+            bucket["on_seconds"] += extra["on_seconds"]
+            for interval_key, values in extra["intervals"].items():
+                interval = bucket["intervals"].setdefault(interval_key, {"on_seconds": 0.0, "seconds": 0.0})
+                interval["seconds"] += values["seconds"]
+                interval["on_seconds"] += values["on_seconds"]
+
+    return [dict(buckets[key], period=key) for key in keys if key in buckets]
@@ -1,132 +1,370 @@
-import json
-from pathlib import Path
+from dataclasses import replace
 from app.models.state import State
 from app.models.time import Time
 from app.models.configuration import Configuration
+from app.constants import DEFAULT_ZONE
 import app.repositories.config_repo as cfg
-from app.utils.temp_logger import log_temperature_change
+import app.repositories.history_repo as history
+import app.repositories.journal_repo as journal
+from app.repositories.storage import get_backend
+from app.utils import metrics
+from app.utils.log import get_logger
+from app.utils.scheduler import Timer, scheduler
 from datetime import time, datetime
+from typing import Dict, List, Optional, Set, Tuple
 import threading
+import atexit
 import math
+from time import perf_counter
 
-_state_lock = threading.Lock()
+log = get_logger(__name__)
 
-STATE_FILE = Path("storage/state.json")
+FLUSH_DELAY = 5.0  # seconds a changed state may stay in memory before it is written to disk
+DEFAULT_TEMP_MEASURE_PERIOD = 15
 
+HEARTBEAT_SECONDS = metrics.Histogram("boiler_temp_heartbeat_seconds", "Time to record a temperature reading and decide on the boiler")
+BOILER_TOGGLES = metrics.Counter("boiler_toggles_total", "Boiler state changes", ["zone", "state"])
 
-def load_state_threadsafe() -> State:
-    with _state_lock:
-        with open(STATE_FILE, 'r') as f:
-            state = json.load(f)
 
-        return State(
-            selected_config=state["selected_configuration"],
-            active_interval=state["active_interval"],
-            boiler_state=state["boiler_state"],
-            current_temp=state["current_temp"],
-            current_timestamp=parse_time(state["current_timestamp"]),
-            prev_temp=state["prev_temp"],
-            prev_timestamp=parse_time(state["prev_timestamp"]),
-            temp_measure_period=state["temp_measure_period"],
-            consecutive_measures=state["consecutive_measures"],
-            hysteresis=state.get("hysteresis", 0.5)
+class _ZoneState:
+    """
+    In-memory state of one zone; the storage backend is written behind it.
+    Every zone has its own locks, so zones never contend with each other.
+    state is never mutated in place, every change swaps in a new object.
+    """
+
+    def __init__(self, zone_id: str):
+        self.zone_id = zone_id
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.state: Optional[State] = None
+        self.version = 0
+        self.flushed_version = 0
+
+
+_zones: Dict[str, _ZoneState] = {}
+_zones_lock = threading.Lock()
+_known_zones: Optional[Set[str]] = None  # zones with a stored state, loaded on first use
+
+# One timer flushes every zone that changed, however many zones there are
+_dirty_zones: Set[str] = set()
+_dirty_lock = threading.Lock()
+_flush_timer: Optional[Timer] = None
+
+
+def _zone(zone_id: str) -> _ZoneState:
+    zone = _zones.get(zone_id)
+    if zone is None:
+        with _zones_lock:
+            zone = _zones.setdefault(zone_id, _ZoneState(zone_id))
+    return zone
+
+
+def _state_from_dict(state: dict) -> State:
+    return State(
+        selected_config=state["selected_configuration"],
+        active_interval=state["active_interval"],
+        boiler_state=state["boiler_state"],
+        current_temp=state["current_temp"],
+        current_timestamp=parse_time(state["current_timestamp"]),
+        prev_temp=state["prev_temp"],
+        prev_timestamp=parse_time(state["prev_timestamp"]),
+        temp_measure_period=state["temp_measure_period"],
+        consecutive_measures=state["consecutive_measures"],
+        hysteresis=state.get("hysteresis", 0.5)
+    )
+
+
+def _state_to_dict(state: State) -> dict:
+    return {
+        "selected_configuration": state.selected_config,
+        "active_interval": state.active_interval,
+        "boiler_state": state.boiler_state,
+        "current_temp": state.current_temp,
+        "current_timestamp": state.current_timestamp.replace(microsecond=0).isoformat(),
+        "prev_temp": state.prev_temp,
+        "prev_timestamp": state.prev_timestamp.replace(microsecond=0).isoformat(),
+        "temp_measure_period": state.temp_measure_period,
+        "consecutive_measures": state.consecutive_measures,
+        "hysteresis": state.hysteresis
+    }
+
+
+def _read_state(zone_id: str) -> State:
+    data = get_backend().load_state(zone_id)
+    if data is None:
+        raise FileNotFoundError(f"No stored state found for zone '{zone_id}'")
+    return _state_from_dict(data)
+
+
+def _current_state(zone: _ZoneState) -> State:
+    """Return the zone's in-memory state, loading it from storage on first use. Caller must hold zone.lock."""
+    if zone.state is None:
+        zone.state = _read_state(zone.zone_id)
+    return zone.state
+
+
+def _commit(zone: _ZoneState, state: State):
+    """Swap in a new state object. Caller must hold zone.lock."""
+    zone.state = state
+    zone.version += 1
+
+
+def _schedule_flush(zone: _ZoneState):
+    global _flush_timer
+    with _dirty_lock:
+        _dirty_zones.add(zone.zone_id)
+        if _flush_timer is not None:
+            return
+        _flush_timer = scheduler.call_later(FLUSH_DELAY, flush_state)
+
+
+def _flush_zone(zone: _ZoneState):
+    with zone.flush_lock:
+        with zone.lock:
+            if zone.state is None or zone.flushed_version == zone.version:
+                return
+            snapshot, version = zone.state, zone.version
+
+        get_backend().save_state(zone.zone_id, _state_to_dict(snapshot))
+        zone.flushed_version = version
+
+
+def flush_state(zone_id: str = None):
+    """Write changed in-memory state to the storage backend, for one zone or for every zone"""
+    global _flush_timer
+    with _dirty_lock:
+        if zone_id is None:
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+            zone_ids = list(_dirty_zones)
+            _dirty_zones.clear()
+        else:
+            _dirty_zones.discard(zone_id)
+            zone_ids = [zone_id]
+
+    for dirty_zone_id in zone_ids:
+        _flush_zone(_zone(dirty_zone_id))
+
+
+atexit.register(flush_state)
+
+
+def _stored_zones() -> Set[str]:
+    """Caller must hold _zones_lock"""
+    global _known_zones
+    if _known_zones is None:
+        _known_zones = set(get_backend().list_zones())
+    return _known_zones
+
+
+def list_zones() -> List[str]:
+    with _zones_lock:
+        return sorted(_stored_zones())
+
+
+def zone_exists(zone_id: str) -> bool:
+    # Zones are never removed, so a hit needs no lock; this runs for every incoming message
+    if _known_zones is not None and zone_id in _known_zones:
+        return True
+    with _zones_lock:
+        return zone_id in _stored_zones()
+
+
+def zones_using_config(name: str) -> List[str]:
+    return [zone_id for zone_id in list_zones() if load_state_threadsafe(zone_id).selected_config == name]
+
+
+def create_zone(zone_id: str, config_name: str = None) -> State:
+    """
+    Create a zone with the boiler off, following config_name (or the first configuration).
+    Creating a zone that already exists returns its current state.
+    """
+    if config_name is None:
+        config_name = next(iter(cfg.load_all_configs()), None)
+    now = datetime.now()
+    active_interval = None
+    if config_name is not None:
+        active_interval = cfg.find_active_interval(cfg.load_config(config_name), Time(now.hour, now.minute), now.weekday())
+
+    zone = _zone(zone_id)
+    with zone.lock:
+        with _zones_lock:
+            zones = _stored_zones()
+            exists = zone_id in zones
+            zones.add(zone_id)
+        if exists:
+            return replace(_current_state(zone))
+
+        state = State(
+            selected_config=config_name,
+            active_interval=active_interval,
+            boiler_state=False,
+            current_temp=0.0,
+            current_timestamp=now,
+            prev_temp=0.0,
+            prev_timestamp=now,
+            temp_measure_period=DEFAULT_TEMP_MEASURE_PERIOD,
+            consecutive_measures=0
         )
+        _commit(zone, state)
+    flush_state(zone_id)
+
+    log.info("Created zone '%s' following configuration '%s'", zone_id, config_name)
+    return replace(state)
+
+
+def get_state_version(zone_id: str = DEFAULT_ZONE) -> int:
+    """Counter bumped on every state change of a zone; cheap way for readers to detect changes"""
+    return _zone(zone_id).version
+
+
+def load_state_threadsafe(zone_id: str = DEFAULT_ZONE) -> State:
+    """Return a snapshot of a zone's current state. Changing it does not affect the store."""
+    zone = _zone(zone_id)
+    with zone.lock:
+        return replace(_current_state(zone))
 
 
-def save_state_threadsafe(state: State):
-    with _state_lock:
-        with open(STATE_FILE, 'w') as f:
-            json.dump({
-                "selected_configuration": state.selected_config,
-                "active_interval": state.active_interval,
-                "boiler_state": state.boiler_state,
-                "current_temp": state.current_temp,
-                "current_timestamp": state.current_timestamp.replace(microsecond=0).isoformat(),
-                "prev_temp": state.prev_temp,
-                "prev_timestamp": state.prev_timestamp.replace(microsecond=0).isoformat(),
-                "temp_measure_period": state.temp_measure_period,
-                "consecutive_measures": state.consecutive_measures,
-                "hysteresis": state.hysteresis
-            }, f, indent=4)
-
-
-def change_selected_configuration(name: str, current_time: Time):
+def save_state_threadsafe(state: State, flush: bool = False, zone_id: str = DEFAULT_ZONE):
+    zone = _zone(zone_id)
+    with zone.lock:
+        _commit(zone, replace(state))
+
+    if flush:
+        flush_state(zone_id)
+    else:
+        _schedule_flush(zone)
+
+
+def change_selected_configuration(name: str, current_time: Time, zone_id: str = DEFAULT_ZONE):
     new_config = cfg.load_config(name)
     new_active_interval =  cfg.find_active_interval(new_config, current_time)
 
-    state = load_state_threadsafe()
-    state.selected_config = new_config.name
-    state.active_interval = new_active_interval
-    save_state_threadsafe(state)
+    zone = _zone(zone_id)
+    with zone.lock:
+        state = replace(_current_state(zone), selected_config=new_config.name, active_interval=new_active_interval)
+        _commit(zone, state)
+    _schedule_flush(zone)
 
+    journal.record_event(journal.EVENT_CONFIG, state, zone_id=zone_id)
 
-def temp_heartbeat(temp: float) -> bool:
+
+def temp_heartbeat(temp: float, zone_id: str = DEFAULT_ZONE) -> bool:
+    started = perf_counter()
     now = datetime.now()
-    time_obj = Time(now.hour, now.minute)
 
     rounded_temp = round_temperature(temp)
-    record_temperature_reading(rounded_temp, now)
-
-    state = load_state_threadsafe()
-    config = cfg.load_config(state.selected_config)
+    state = record_temperature_reading(rounded_temp, now, zone_id)
 
-
-    active_interval = cfg.find_active_interval(config, time_obj)
+    if state.selected_config is None:
+        # Zone created before any configuration existed, nothing to decide against
+        active_interval, boiler_toggle = None, False
+    else:
+        config = cfg.load_config(state.selected_config)
+        active_interval, boiler_toggle = evaluate_reading(rounded_temp, state.boiler_state, config, now)
 
     if active_interval != state.active_interval:
-        update_active_interval(active_interval)
-
-    boiler_toggle = should_toggle_boiler(rounded_temp, state.boiler_state, active_interval, config)
+        update_active_interval(active_interval, zone_id)
 
+    HEARTBEAT_SECONDS.observe(perf_counter() - started)
     return boiler_toggle
 
 
+def evaluate_reading(temp: float, boiler_state: bool, config: Configuration, moment: datetime) -> Tuple[str, bool]:
+    """
+    The decision for one rounded reading taken at moment, without touching any stored state:
+    the interval active then, and whether the boiler has to toggle. Shared by the live loop and replays.
+    """
+    active_interval = cfg.find_active_interval(config, Time(moment.hour, moment.minute), moment.weekday())
+    if active_interval is None:
+        return None, False  # no interval, nothing to decide
+    return active_interval, should_toggle_boiler(temp, boiler_state, active_interval, config)
+
+
 def should_toggle_boiler(temp: float, boiler_state: bool, active_interval: str, config: Configuration) -> bool:
 
     active_interval_obj = cfg.get_interval_obj(config, active_interval)
 
-    print(f"[TOGGLE CHECK] Current: {temp}°C, Boiler: {boiler_state_str(boiler_state)}, "
-          f"ON_temp: {active_interval_obj.ON_temperature}°C, OFF_temp: {active_interval_obj.OFF_temperature}°C")
+    log.debug("Toggle check: current %s°C, boiler %s, ON_temp %s°C, OFF_temp %s°C", temp, boiler_state_str(boiler_state),
+              active_interval_obj.ON_temperature, active_interval_obj.OFF_temperature)
 
     if boiler_state:
         if temp >= active_interval_obj.OFF_temperature:
-            print(f"[TOGGLE CHECK] Boiler ON and temp ({temp}°C) >= OFF threshold ({active_interval_obj.OFF_temperature}°C) - Turn OFF")
+            log.debug("Boiler ON and temp (%s°C) >= OFF threshold (%s°C) - turn OFF", temp, active_interval_obj.OFF_temperature)
             return True
         else:
-            print(f"[TOGGLE CHECK] Boiler ON but temp ({temp}°C) < OFF threshold ({active_interval_obj.OFF_temperature}°C) - Stay ON")
+            log.debug("Boiler ON but temp (%s°C) < OFF threshold (%s°C) - stay ON", temp, active_interval_obj.OFF_temperature)
     else:
         if temp <= active_interval_obj.ON_temperature:
-            print(f"[TOGGLE CHECK] Boiler OFF and temp ({temp}°C) <= ON threshold ({active_interval_obj.ON_temperature}°C) - Turn ON")
+            log.debug("Boiler OFF and temp (%s°C) <= ON threshold (%s°C) - turn ON", temp, active_interval_obj.ON_temperature)
             return True
         else:
-            print(f"[TOGGLE CHECK] Boiler OFF but temp ({temp}°C) > ON threshold ({active_interval_obj.ON_temperature}°C) - Stay OFF")
+            log.debug("Boiler OFF but temp (%s°C) > ON threshold (%s°C) - stay OFF", temp, active_interval_obj.ON_temperature)
 
     return False
 
 
-def toggle_boiler():
-    state = load_state_threadsafe()
+def set_boiler_state(boiler_state: bool, zone_id: str = DEFAULT_ZONE) -> bool:
+    """Set a zone's boiler state, returns False if it already was in that state"""
+    zone = _zone(zone_id)
+    with zone.lock:
+        state = _current_state(zone)
+        old_boiler_state = state.boiler_state
+        if old_boiler_state == boiler_state:
+            return False
+        state = replace(state, boiler_state=boiler_state)
+        _commit(zone, state)
 
-    old_boiler_state = state.boiler_state
-    state.boiler_state = not state.boiler_state
+    # Boiler changes are written through immediately, everything else waits for the debounced flush
+    flush_state(zone_id)
 
-    save_state_threadsafe(state)
+    now = datetime.now()
+    history.append_reading(state.current_temp, now, state.boiler_state, zone_id=zone_id)
+    journal.record_event(journal.EVENT_BOILER, state, now, zone_id=zone_id)
 
-    print(f"[NOTIFY] Boiler state changed from {boiler_state_str(old_boiler_state)} to {boiler_state_str(state.boiler_state)}")
+    BOILER_TOGGLES.labels(zone_id, boiler_state_str(boiler_state)).inc()
+    log.info("Zone %s: boiler state changed from %s to %s", zone_id, boiler_state_str(old_boiler_state), boiler_state_str(boiler_state))
+    return True
 
 
-def update_active_interval(interval: str):
-    state = load_state_threadsafe()
-    config = cfg.load_config(state.selected_config)
+def update_active_interval(interval: str, zone_id: str = DEFAULT_ZONE):
+    zone = _zone(zone_id)
+    with zone.lock:
+        old_state = _current_state(zone)
+        state = replace(old_state, active_interval=interval)
+        _commit(zone, state)
+    _schedule_flush(zone)
 
-    old_interval_string = state.active_interval
-    old_interval_obj = cfg.get_interval_obj(config, old_interval_string)
+    journal.record_event(journal.EVENT_INTERVAL, state, zone_id=zone_id)
+
+    if interval is None:
+        log.info("Zone %s: no interval active", zone_id)
+        return
+    config = cfg.load_config(state.selected_config)
     new_interval_obj = cfg.get_interval_obj(config, interval)
+    if old_state.active_interval is None:
+        # A new zone, or one whose configuration had no interval at the time: entering one
+        log.info("Zone %s: interval entered: %s", zone_id, new_interval_obj)
+        return
+    old_interval_obj = cfg.get_interval_obj(config, old_state.active_interval)
+
+    log.info("Zone %s: interval changed: %s => %s", zone_id, old_interval_obj, new_interval_obj)
 
-    state.active_interval = interval
-    save_state_threadsafe(state)
 
-    print(f"[NOTIFY] Interval changed: {old_interval_obj} => {new_interval_obj}")
+def refresh_active_interval(zone_id: str = DEFAULT_ZONE, now: datetime = None) -> State:
+    """Bring a zone's active interval up to date without waiting for a reading, returns the zone's state"""
+    now = now or datetime.now()
+    state = load_state_threadsafe(zone_id)
+    if state.selected_config is None:
+        return state
+
+    active_interval = cfg.find_active_interval(cfg.load_config(state.selected_config), Time(now.hour, now.minute), now.weekday())
+    if active_interval != state.active_interval:
+        update_active_interval(active_interval, zone_id)
+        state = replace(state, active_interval=active_interval)
+    return state
 
 
 def round_temperature(temp: float) -> float:
@@ -147,19 +385,25 @@ def round_temperature(temp: float) -> float:
     return math.floor(temp * 10) / 10
 
 
-def record_temperature_reading(temp: float, timestamp: time):
-    state = load_state_threadsafe()
-
-    state.prev_temp = state.current_temp
-    state.prev_timestamp = state.current_timestamp
-
-    state.current_temp = temp
-    state.current_timestamp = timestamp
+def record_temperature_reading(temp: float, timestamp: time, zone_id: str = DEFAULT_ZONE) -> State:
+    zone = _zone(zone_id)
+    with zone.lock:
+        previous = _current_state(zone)
+        state = replace(
+            previous,
+            prev_temp=previous.current_temp,
+            prev_timestamp=previous.current_timestamp,
+            current_temp=temp,
+            current_timestamp=timestamp
+        )
+        _commit(zone, state)
+    _schedule_flush(zone)
 
-    save_state_threadsafe(state)
     if state.prev_temp != state.current_temp:
-        print(f"[STATE] Temperature changed from {state.prev_temp} to {state.current_temp}")
-        log_temperature_change(state.current_temp, timestamp)
+        log.debug("Zone %s: temperature changed from %s to %s", zone_id, state.prev_temp, state.current_temp)
+        history.append_reading(state.current_temp, timestamp, state.boiler_state, zone_id=zone_id)
+
+    return replace(state)
 
 
 def parse_time(t: str) -> datetime:
@@ -182,7 +426,8 @@ def boiler_state_str(state: bool) -> str:
     return "ON" if state else "OFF"
 
 
-def update_hysteresis(value: float):
-    state = load_state_threadsafe()
-    state.hysteresis = value
-    save_state_threadsafe(state)
\ No newline at end of file
+def update_hysteresis(value: float, zone_id: str = DEFAULT_ZONE):
+    zone = _zone(zone_id)
+    with zone.lock:
+        _commit(zone, replace(_current_state(zone), hysteresis=value))
+    _schedule_flush(zone)
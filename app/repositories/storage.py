@@ -0,0 +1,50 @@
+import threading
+from app import settings
+from app.repositories.backends.base import StorageBackend
+from app.repositories.backends.json_backend import JsonBackend
+from app.repositories.backends.sqlite_backend import SqliteBackend
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def copy_backend(source: StorageBackend, target: StorageBackend):
+    """Copy configurations and every zone's state, device status and history from one backend into another"""
+    target.save_configs(source.load_configs())
+
+    for zone_id in source.list_zones():
+        target.save_state(zone_id, source.load_state(zone_id))
+
+        device_status = source.load_device_status(zone_id)
+        if device_status is not None:
+            target.save_device_status(zone_id, device_status)
+
+        for record in source.iter_readings(zone_id, 0, 2 ** 32 - 1):
+            target.append_reading(zone_id, *record)
+
+
+def create_backend(name: str) -> StorageBackend:
+    if name == "json":
+        return JsonBackend()
+
+    if name == "sqlite":
+        backend = SqliteBackend(settings.SQLITE_PATH, settings.SQLITE_POOL_SIZE)
+        if backend.is_empty():
+            log.info("Empty database at %s, importing JSON storage", settings.SQLITE_PATH)
+            copy_backend(JsonBackend(), backend)
+        return backend
+
+    raise ValueError(f"Unknown storage backend '{name}', expected 'json' or 'sqlite'")
+
+
+def get_backend() -> StorageBackend:
+    """The backend selected by settings.STORAGE_BACKEND, created on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(settings.STORAGE_BACKEND)
+    return _backend
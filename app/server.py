@@ -1,9 +1,25 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from app.api import config_routes, state_routes
+from app import settings
+from app.utils.log import setup_logging
+from app.api import static_assets
+from app.api import config_routes, state_routes, stream_routes, dashboard_routes, history_routes, stats_routes, zone_routes, ingest_routes, command_routes, metrics_routes, health_routes, what_if_routes
+
+if settings.PROCESS_ROLE == "api":
+    setup_logging()  # worker processes start from a fresh interpreter
 
 app = FastAPI()
+app.add_middleware(metrics_routes.RequestTimingMiddleware)
 app.include_router(config_routes.router)
 app.include_router(state_routes.router)
+app.include_router(stream_routes.router)
+app.include_router(dashboard_routes.router)
+app.include_router(history_routes.router)
+app.include_router(stats_routes.router)
+app.include_router(zone_routes.router)
+app.include_router(ingest_routes.router)
+app.include_router(command_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(health_routes.router)
+app.include_router(what_if_routes.router)
 
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
\ No newline at end of file
+app.mount("/", static_assets.StaticAssets(settings.STATIC_DIR, bundle_js=settings.STATIC_BUNDLE_JS), name="static")
\ No newline at end of file
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+from app.constants import DEFAULT_ZONE
+
+# Storage backend for state, configurations, device status and history: "json" or "sqlite"
+STORAGE_BACKEND = os.environ.get("BOILER_STORAGE_BACKEND", "json")
+
+STORAGE_DIR = Path("storage")
+
+SQLITE_PATH = Path(os.environ.get("BOILER_SQLITE_PATH", "storage/boiler.db"))
+SQLITE_POOL_SIZE = int(os.environ.get("BOILER_SQLITE_POOL_SIZE", "4"))
+
+
+def zone_storage_dir(zone_id: str) -> Path:
+    """Directory holding a zone's files, the default zone keeps using storage/ itself"""
+    if zone_id == DEFAULT_ZONE:
+        return STORAGE_DIR
+    return STORAGE_DIR / "zones" / zone_id
+
+# MQTT broker connection. "paho" connects to MQTT_HOST:MQTT_PORT,
+# "inprocess" uses an in-process broker, for benchmarks and tests without mosquitto.
+MQTT_TRANSPORT = os.environ.get("BOILER_MQTT_TRANSPORT", "paho")
+MQTT_HOST = os.environ.get("BOILER_MQTT_HOST", "localhost")
+MQTT_PORT = int(os.environ.get("BOILER_MQTT_PORT", "1883"))
+# Seconds between attempts while the broker is unreachable, doubling from min to max
+MQTT_RECONNECT_MIN_DELAY = int(os.environ.get("BOILER_MQTT_RECONNECT_MIN_DELAY", "1"))
+MQTT_RECONNECT_MAX_DELAY = int(os.environ.get("BOILER_MQTT_RECONNECT_MAX_DELAY", "60"))
+
+# MQTT ingestion: worker threads and bounds of the non-coalesced queue lanes
+INGEST_WORKERS = int(os.environ.get("BOILER_INGEST_WORKERS", "2"))
+INGEST_MAX_EVENTS = int(os.environ.get("BOILER_INGEST_MAX_EVENTS", "1000"))
+INGEST_MAX_PRIORITY = int(os.environ.get("BOILER_INGEST_MAX_PRIORITY", "1000"))
+
+# Seconds without any message after which a device is marked offline, 0 waits for its offline status message.
+# Sensors publish every few seconds; relays only talk when commanded, so by default they rely on their last will.
+DEVICE_TTL = {
+    "sensor": float(os.environ.get("BOILER_SENSOR_TTL", "120")),
+    "relay": float(os.environ.get("BOILER_RELAY_TTL", "0")),
+}
+
+# Send boiler commands as "ON:<correlation id>" and expect "ACK:<correlation id>" back.
+# Off by default, relays running older firmware only understand a bare "ON"/"OFF" and reply "ACK".
+COMMAND_CORRELATION_IDS = os.environ.get("BOILER_COMMAND_CORRELATION_IDS", "0") == "1"
+
+# Process layout. With API_WORKERS > 1 the control loop (MQTT, ingest, state) stays in the main process and
+# the HTTP API runs in that many worker processes. Workers read state from a snapshot the control loop
+# publishes to SHARED_STATE_PATH and send state changes over the CONTROL_SOCKET_PATH socket.
+API_WORKERS = int(os.environ.get("BOILER_API_WORKERS", "1"))
+PROCESS_ROLE = os.environ.get("BOILER_PROCESS_ROLE", "all")  # "all", "control" or "api", set by app.main
+SHARED_STATE_PATH = Path(os.environ.get("BOILER_SHARED_STATE_PATH", "storage/shared_state.bin"))
+SHARED_STATE_SIZE = int(os.environ.get("BOILER_SHARED_STATE_SIZE", str(4 * 1024 * 1024)))
+SHARED_STATE_PUBLISH_INTERVAL = float(os.environ.get("BOILER_SHARED_STATE_PUBLISH_INTERVAL", "0.05"))
+CONTROL_SOCKET_PATH = Path(os.environ.get("BOILER_CONTROL_SOCKET_PATH", "storage/control.sock"))
+CONTROL_AUTHKEY = os.environ.get("BOILER_CONTROL_AUTHKEY", "")  # generated by app.main for its workers
+
+# Dashboard files, prepared at startup: content-hashed, precompressed (brotli needs the optional
+# brotli package, gzip always works) and, with STATIC_BUNDLE_JS, the scripts joined into one bundle
+STATIC_DIR = Path(os.environ.get("BOILER_STATIC_DIR", "static"))
+STATIC_BUNDLE_JS = os.environ.get("BOILER_STATIC_BUNDLE_JS", "1") == "1"
@@ -0,0 +1,110 @@
+"""
+Startup sequence, run on a background thread while the API is already serving.
+
+Phases, each timed:
+- history_import: legacy text readings into the history store
+- configs: parse every configuration and compile its schedule
+- zones: load the state and device status of every zone into memory
+- mqtt: start the ingest workers, command dispatcher and reconciler, and begin connecting
+The broker connection does not block startup, the transport keeps retrying with backoff.
+A configuration, legacy readings file or zone that fails to load is logged, reported and skipped, and a failed
+warm-up phase does not keep MQTT from starting. Only a failure in the mqtt phase leaves the control loop down.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+import app.repositories.config_repo as cfg
+import app.repositories.device_status_repo as device_repo
+import app.repositories.state_repo as sr
+from app.repositories import history_repo
+from app.mqtt import client, mqtt_service
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+PROCESS_STARTED = time.monotonic()
+
+phases: Dict[str, float] = {}  # phase -> seconds it took, in order
+failed_phase: Optional[str] = None
+skipped: Dict[str, Dict[str, str]] = {}  # phase -> {configuration, file or zone: reason}
+warmed_up = threading.Event()
+_current_phase: Optional[str] = None
+_total: Optional[float] = None
+
+
+@contextmanager
+def _phase(name: str):
+    global _current_phase
+    _current_phase = name
+    started = time.perf_counter()
+    yield
+    phases[name] = round(time.perf_counter() - started, 6)
+    log.info("Startup phase %s took %.1f ms", name, phases[name] * 1000)
+
+
+def _skip(phase: str, item: str, error: Exception):
+    log.warning("Startup phase %s skipped %s: %s", phase, item, error)
+    skipped.setdefault(phase, {})[item] = str(error)
+
+
+def warm_up():
+    with _phase("history_import"):
+        bad_files: Dict[str, str] = {}
+        imported = history_repo.import_text_readings(skipped=bad_files)
+        if imported:
+            log.info("Imported %d readings from %s", imported, history_repo.LEGACY_READINGS_DIR)
+        if bad_files:
+            skipped.setdefault("history_import", {}).update(bad_files)
+
+    with _phase("configs"):
+        for name in cfg.load_all_configs():
+            try:
+                cfg.get_schedule(cfg.load_config(name))
+            except Exception as e:
+                _skip("configs", name, e)
+
+    with _phase("zones"):
+        for zone_id in sr.list_zones():
+            try:
+                sr.load_state_threadsafe(zone_id)
+                device_repo.load_device_status_threadsafe(zone_id)
+            except Exception as e:
+                _skip("zones", zone_id, e)
+
+
+def start_mqtt():
+    with _phase("mqtt"):
+        mqtt_service.init(client.transport)
+        client.start_mqtt()
+        client.start_temperature_watchdog()
+        client.start_interval_boundaries()
+
+
+def run():
+    global failed_phase, _total
+    try:
+        warm_up()
+    except Exception as e:
+        failed_phase = _current_phase
+        log.exception("Startup warm-up failed in phase %s, starting MQTT anyway: %s", failed_phase, e)
+
+    try:
+        start_mqtt()
+    except Exception as e:
+        failed_phase = _current_phase
+        log.exception("Startup failed in phase %s: %s", failed_phase, e)
+        return
+    _total = round(time.monotonic() - PROCESS_STARTED, 6)
+    warmed_up.set()
+    log.info("Started in %.1f ms", _total * 1000)
+
+
+def report() -> Dict:
+    return {
+        "complete": warmed_up.is_set(),
+        "failed_phase": failed_phase,
+        "skipped": {phase: dict(items) for phase, items in skipped.items()},
+        "phases_seconds": dict(phases),
+        "since_process_start_seconds": _total,
+    }
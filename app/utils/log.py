@@ -0,0 +1,98 @@
+"""
+Logging setup: callers only enqueue records, one background thread formats and writes them.
+
+Use a module logger with %-style arguments so nothing is formatted unless the record is emitted:
+    log = get_logger(__name__)
+    log.debug("Temperature ping: %s", temp)
+
+Environment:
+    BOILER_LOG_LEVEL   default level, e.g. INFO (default)
+    BOILER_LOG_LEVELS  per-module levels, e.g. "app.mqtt=DEBUG,app.repositories.state_repo=WARNING"
+    BOILER_LOG_JSON    "1" writes one JSON object per line instead of plain text
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+PLAIN_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records as they are; message formatting happens on the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks reference frames of the calling thread, render them before handing over
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = None, module_levels: str = None, json_lines: bool = None):
+    """Route all logging through a queue to a background writer. Safe to call more than once."""
+    global _listener
+    level = level or os.environ.get("BOILER_LOG_LEVEL", "INFO")
+    module_levels = module_levels if module_levels is not None else os.environ.get("BOILER_LOG_LEVELS", "")
+    if json_lines is None:
+        json_lines = os.environ.get("BOILER_LOG_JSON", "0") == "1"
+
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(PLAIN_FORMAT))
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(records)]
+    root.setLevel(level.upper())
+    for name, module_level in _parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
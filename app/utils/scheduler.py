@@ -0,0 +1,164 @@
+"""
+One thread for every timed job of the process: ACK timeouts, sensor staleness, interval boundaries,
+debounced flushes and periodic sweeps.
+
+Deadlines are kept in a binary heap. Cancelling only marks the timer and rescheduling pushes a new
+entry, leaving the old one behind; stale entries are skipped when they reach the top and the heap is
+rebuilt once they outnumber the live ones. The thread sleeps until the earliest deadline and is woken
+early only when a new timer becomes the earliest, so neither the thread count nor the idle wakeups
+grow with the number of timers.
+
+Callbacks run one after another on the scheduler thread and must be short.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
+COMPACT_MIN_STALE = 64  # stale heap entries tolerated before a rebuild is considered
+
+
+class Timer:
+    __slots__ = ("_scheduler", "callback", "args", "interval", "when", "_generation")
+
+    def __init__(self, scheduler: "Scheduler", callback: Callable, args: tuple, interval: Optional[float]):
+        self._scheduler = scheduler
+        self.callback = callback
+        self.args = args
+        self.interval = interval  # seconds between runs of a periodic timer, None for a one-shot
+        self.when: Optional[float] = None  # monotonic deadline while pending, None once fired or cancelled
+        self._generation = 0  # heap entries of an older generation are stale
+
+    @property
+    def pending(self) -> bool:
+        return self.when is not None
+
+    def cancel(self):
+        """Cancelling a timer whose callback is already running does not interrupt it"""
+        self._scheduler.cancel(self)
+
+    def reschedule(self, delay: float):
+        """Move the deadline to delay seconds from now; re-arms a timer that already fired or was cancelled"""
+        self._scheduler.reschedule(self, time.monotonic() + delay)
+
+
+class Scheduler:
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self._heap: List[Tuple[float, int, int, Timer]] = []  # (deadline, tie breaker, generation, timer)
+        self._condition = threading.Condition()
+        self._order = itertools.count()
+        self._stale = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def timer(self, callback: Callable, *args) -> Timer:
+        """A one-shot timer that is not armed yet, arm it with reschedule()"""
+        return Timer(self, callback, args, None)
+
+    def call_at(self, when: float, callback: Callable, *args) -> Timer:
+        """Run callback(*args) at time.monotonic() == when"""
+        timer = Timer(self, callback, args, None)
+        with self._condition:
+            self._push(timer, when)
+        return timer
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_every(self, interval: float, callback: Callable, *args, first_delay: float = None) -> Timer:
+        """Run callback(*args) every interval seconds; runs missed while the thread was busy are skipped"""
+        timer = Timer(self, callback, args, interval)
+        with self._condition:
+            self._push(timer, time.monotonic() + (interval if first_delay is None else first_delay))
+        return timer
+
+    def reschedule(self, timer: Timer, when: float):
+        with self._condition:
+            self._discard(timer)
+            self._push(timer, when)
+
+    def cancel(self, timer: Timer):
+        with self._condition:
+            self._discard(timer)
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._heap) - self._stale
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _push(self, timer: Timer, when: float):
+        """Caller must hold _condition"""
+        timer.when = when
+        timer._generation += 1
+        entry = (when, next(self._order), timer._generation, timer)
+        heapq.heappush(self._heap, entry)
+
+        if self._thread is None and not self._stopping:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        elif self._heap[0] is entry:
+            self._condition.notify()  # the thread is sleeping towards a later deadline
+
+    def _discard(self, timer: Timer):
+        """Leave the timer's heap entry behind as stale. Caller must hold _condition."""
+        if timer.when is None:
+            return
+        timer.when = None
+        timer._generation += 1
+        self._stale += 1
+        if self._stale > COMPACT_MIN_STALE and self._stale * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if entry[2] == entry[3]._generation]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _next_due(self, now: float) -> Tuple[Optional[Timer], Optional[float]]:
+        """Pop the next due timer, or return how long to sleep. Caller must hold _condition."""
+        heap = self._heap
+        while heap:
+            when, _, generation, timer = heap[0]
+            if generation != timer._generation:
+                heapq.heappop(heap)
+                self._stale -= 1
+                continue
+            if when > now:
+                return None, when - now
+
+            heapq.heappop(heap)
+            timer.when = None
+            if timer.interval is not None:
+                # Re-armed before the callback runs, so the callback may cancel or reschedule it
+                next_when = when + timer.interval
+                self._push(timer, next_when if next_when > now else now + timer.interval)
+            return timer, None
+        return None, None
+
+    def _run(self):
+        with self._condition:
+            while not self._stopping:
+                timer, timeout = self._next_due(time.monotonic())
+                if timer is None:
+                    self._condition.wait(timeout)
+                    continue
+
+                self._condition.release()
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    log.exception("Error in scheduled %s: %s", getattr(timer.callback, "__qualname__", timer.callback), e)
+                finally:
+                    self._condition.acquire()
+
+
+scheduler = Scheduler()  # shared by everything in the process that needs a deadline
@@ -0,0 +1,193 @@
+"""
+"What if" comparison of configurations against a recorded temperature trace.
+
+The zone's history is resampled to one temperature per minute. Every configuration is expanded into
+per-minute ON and OFF threshold arrays over the same minutes, and the boiler's hysteresis runs over
+whole arrays at once: the threshold comparisons are made for every minute in C (map over operator
+functions into bytes), and bytes.find jumps from one switch to the next, so Python only loops once
+per toggle, not once per minute.
+
+The evaluation is open loop: the trace is what the zone actually measured, a candidate does not
+change it. Runtime is how long the candidate would have kept the boiler on given those temperatures,
+comfort deviation how far they were outside the candidate's ON..OFF band, in degree-hours.
+"""
+import math
+import operator
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import compress, repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.constants import DEFAULT_ZONE
+from app.models.configuration import Configuration
+from app.models.schedule import MINUTES_PER_WEEK, minute_of_week
+from app.repositories import config_repo, history_repo
+
+# The history only records changes, so a reading holds until the next one, like in app.replay. Only a
+# gap longer than this is taken as the sensor or the controller being down, its minutes are left out.
+MAX_HOLD_MINUTES = 24 * 60
+_NO_THRESHOLD = math.nan  # minutes without an active interval: every comparison is false, nothing is decided
+
+
+@dataclass
+class Trace:
+    start: datetime  # the minute of temps[0]
+    temps: array  # "d", one temperature per minute, NaN where the sensor was silent for too long
+    # (index into temps, minute of the week) where each stretch with one UTC offset begins; local minutes
+    # count on within a stretch, a daylight saving change starts a new one
+    segments: List[Tuple[int, int]]
+    readings: int
+
+    @property
+    def weeks(self) -> float:
+        return len(self.temps) / MINUTES_PER_WEEK
+
+
+def _utc_offset(timestamp: int) -> timedelta:
+    return datetime.fromtimestamp(timestamp).astimezone().utcoffset()
+
+
+def _local_minute_of_week(timestamp: int) -> int:
+    moment = datetime.fromtimestamp(timestamp)
+    return minute_of_week(moment.weekday(), moment.hour * 60 + moment.minute)
+
+
+def _segments(start_ts: int, count: int) -> List[Tuple[int, int]]:
+    """Stretches of the count minutes from start_ts (a whole minute) that share one UTC offset"""
+    segments = [(0, _local_minute_of_week(start_ts))]
+    offset = _utc_offset(start_ts)
+    # Offsets change at most a few times a year and always on a whole minute: probe every hour,
+    # then find the first minute with the new offset by bisection
+    for hour in range(0, count, 60):
+        probe = min(hour + 60, count - 1)
+        if _utc_offset(start_ts + probe * 60) == offset:
+            continue
+        low, high = hour, probe  # offset at low is the old one, at high the new one
+        while high - low > 1:
+            middle = (low + high) // 2
+            if _utc_offset(start_ts + middle * 60) == offset:
+                low = middle
+            else:
+                high = middle
+        segments.append((high, _local_minute_of_week(start_ts + high * 60)))
+        offset = _utc_offset(start_ts + high * 60)
+    return segments
+
+
+def _hold(temps: array, value: float, minutes: int):
+    held = min(minutes, MAX_HOLD_MINUTES)
+    temps.extend(repeat(value, held))
+    temps.extend(repeat(_NO_THRESHOLD, minutes - held))
+
+
+def build_trace(records: Iterable[Tuple[int, int, int]], end_ts: int) -> Optional[Trace]:
+    """
+    Raw history records in time order, one temperature per minute (the last of each minute) up to end_ts,
+    None without any
+    """
+    temps = array("d")
+    first_ts = None
+    current = -1
+    value = _NO_THRESHOLD
+    readings = 0
+    for timestamp, tenths, _ in records:
+        if first_ts is None:
+            first_ts = timestamp - timestamp % 60
+        minute = (timestamp - first_ts) // 60
+        if minute != current:
+            if current >= 0:
+                _hold(temps, value, minute - current)
+            current = minute
+        value = tenths / 10
+        readings += 1
+
+    if first_ts is None:
+        return None
+    # The last reading holds until the end of the range too
+    _hold(temps, value, max(-(-(end_ts - first_ts) // 60) - current, 1))
+    return Trace(datetime.fromtimestamp(first_ts), temps, _segments(first_ts, len(temps)), readings)
+
+
+def load_trace(start: datetime, end: datetime, zone_id: str = DEFAULT_ZONE) -> Optional[Trace]:
+    """The zone's readings in range, one per minute up to end or now, None without any"""
+    end = min(end, datetime.now())
+    return build_trace(history_repo.iter_raw_readings(start, end, zone_id), int(end.timestamp()))
+
+
+def _expand(week: array, trace: Trace) -> array:
+    """Per-minute values of the week laid over the trace's minutes"""
+    expanded = array("d")
+    segments = trace.segments
+    for i, (first, first_minute) in enumerate(segments):
+        count = (segments[i + 1][0] if i + 1 < len(segments) else len(trace.temps)) - first
+        rotated = week[first_minute:] + week[:first_minute]
+        expanded += (rotated * (count // MINUTES_PER_WEEK + 1))[:count]
+    return expanded
+
+
+def _week_thresholds(config: Configuration) -> Tuple[array, array]:
+    """ON and OFF temperature for every minute of the week, NaN where no interval is active"""
+    schedule = config_repo.get_schedule(config)
+    on = array("d", [_NO_THRESHOLD]) * MINUTES_PER_WEEK
+    off = array("d", [_NO_THRESHOLD]) * MINUTES_PER_WEEK
+    boundaries = schedule.boundaries  # every day's midnight is one, so the first is minute 0
+    for i, first in enumerate(boundaries):
+        last = boundaries[i + 1] if i + 1 < len(boundaries) else MINUTES_PER_WEEK
+        interval_name = schedule.interval_at(first)
+        if interval_name is None:
+            continue
+        interval = config_repo.get_interval_obj(config, interval_name)
+        on[first:last] = array("d", [interval.ON_temperature]) * (last - first)
+        off[first:last] = array("d", [interval.OFF_temperature]) * (last - first)
+    return on, off
+
+
+def evaluate(config: Configuration, trace: Trace, boiler_state: bool = False) -> Dict:
+    """Projected runtime, toggles and comfort deviation of one configuration over the trace, per week"""
+    week_on, week_off = _week_thresholds(config)
+    on = _expand(week_on, trace)
+    off = _expand(week_off, trace)
+    temps = trace.temps
+
+    # Same rule as state_repo.should_toggle_boiler: OFF switches on at temp <= ON, ON switches off at temp >= OFF
+    below_on = bytes(map(operator.le, temps, on))
+    above_off = bytes(map(operator.ge, temps, off))
+
+    position = 0
+    on_since = 0 if boiler_state else None
+    on_minutes = 0
+    toggles = 0
+    while True:
+        switch = (above_off if boiler_state else below_on).find(1, position)
+        if switch < 0:
+            break
+        if boiler_state:
+            on_minutes += switch - on_since
+        else:
+            on_since = switch
+        boiler_state = not boiler_state
+        toggles += 1
+        position = switch + 1
+    if boiler_state:
+        on_minutes += len(temps) - on_since
+
+    # Comparisons with NaN are false, so minutes without a threshold or a temperature are in neither mask
+    too_cold = (sum(compress(on, below_on)) - sum(compress(temps, below_on))) / 60
+    too_warm = (sum(compress(temps, above_off)) - sum(compress(off, above_off))) / 60
+
+    weeks = trace.weeks
+    return {
+        "config": config.name,
+        "runtime_hours_per_week": round(on_minutes / 60 / weeks, 3),
+        "toggles_per_week": round(toggles / weeks, 2),
+        "comfort_deviation_degree_hours_per_week": {
+            "below_on": round(too_cold / weeks, 3),
+            "above_off": round(too_warm / weeks, 3),
+            "total": round((too_cold + too_warm) / weeks, 3),
+        },
+    }
+
+
+def compare(configs: List[Configuration], trace: Trace, boiler_state: bool = False) -> List[Dict]:
+    """Every configuration evaluated against the same trace, in the order given"""
+    return [evaluate(config, trace, boiler_state) for config in configs]
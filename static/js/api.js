@@ -5,6 +5,16 @@ async function fetchState() {
     return await response.json();
 }
 
+async function fetchDashboard() {
+    // The browser revalidates with If-None-Match, an unchanged dashboard comes back as a cheap 304
+    const response = await fetch(`${API_BASE}/dashboard`);
+    return { data: await response.json(), serverDate: response.headers.get('Date') };
+}
+
+function openStateStream() {
+    return new EventSource(`${API_BASE}/state/stream`);
+}
+
 async function fetchActiveIntervalDetails() {
     const response = await fetch(`${API_BASE}/state/active-interval-details`);
     return await response.json();
@@ -155,7 +155,7 @@ async function changeConfiguration(configName) {
 
         if (response.ok) {
             showMessage(`Configuration changed to: ${configName}`, 'success');
-            loadSystemState();
+            loadDashboard();
         } else {
             showMessage(`Error: ${data.detail}`, 'error');
         }
@@ -1,8 +1,12 @@
+const DASHBOARD_POLL_INTERVAL = 1000;
+
+let pollingTimer = null;
+let dashboardData = null;
+let serverClockOffset = 0;
+
 document.addEventListener('DOMContentLoaded', function() {
-    loadSystemState();
-    loadDeviceStatus();
-    setInterval(loadSystemState, 1000);
-    setInterval(loadDeviceStatus, 2000);
+    startStateStream();
+    setInterval(tickServerClock, 1000);
 
     setupConfigViewModal();
     setupChangeConfigModal();
@@ -10,17 +14,93 @@ document.addEventListener('DOMContentLoaded', function() {
     setupHysteresisInput();
 });
 
-async function loadSystemState() {
-    try {
-        const data = await fetchState();
-        updateStatusDisplay(data);
+function startStateStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
 
-        loadActiveIntervalDetails();
+    const source = openStateStream();
 
-        loadActiveConfig();
+    source.addEventListener('snapshot', function(event) {
+        stopPolling();
+        applySnapshot(JSON.parse(event.data));
+    });
+
+    source.addEventListener('delta', function(event) {
+        applyDelta(JSON.parse(event.data));
+    });
+
+    source.onerror = function() {
+        // EventSource reconnects by itself, poll until the next snapshot arrives
+        startPolling();
+    };
+}
+
+function applySnapshot(data) {
+    dashboardData = data;
+    syncServerClock(data.state.server_time);
+    renderDashboard(dashboardData);
+}
+
+function applyDelta(delta) {
+    if (!dashboardData) {
+        return;
+    }
+
+    if (delta.state) {
+        Object.assign(dashboardData.state, delta.state);
+    }
+    ['active_interval', 'active_config', 'devices'].forEach(section => {
+        if (section in delta) {
+            dashboardData[section] = delta[section];
+        }
+    });
+
+    renderDashboard(dashboardData);
+}
+
+function renderDashboard(data) {
+    updateStatusDisplay(data.state);
+    updateActiveIntervalDisplay(data.active_interval);
+    updateConfigDisplay(data.active_config);
+    updateDeviceStatusDisplay(data.devices);
+}
+
+function syncServerClock(serverTime) {
+    serverClockOffset = new Date(serverTime).getTime() - Date.now();
+    tickServerClock();
+}
+
+function tickServerClock() {
+    updateServerTimeDisplay(new Date(Date.now() + serverClockOffset));
+}
+
+function startPolling() {
+    if (pollingTimer) {
+        return;
+    }
+
+    loadDashboard();
+    pollingTimer = setInterval(loadDashboard, DASHBOARD_POLL_INTERVAL);
+}
+
+function stopPolling() {
+    clearInterval(pollingTimer);
+    pollingTimer = null;
+}
+
+async function loadDashboard() {
+    try {
+        const { data, serverDate } = await fetchDashboard();
+        dashboardData = data;
+        if (serverDate) {
+            syncServerClock(serverDate);
+        }
+        renderDashboard(dashboardData);
     } catch (error) {
         showMessage('Failed to connect to server', 'error');
-        console.error('Error loading system state:', error);
+        console.error('Error loading dashboard:', error);
     }
 }
 
@@ -52,33 +132,6 @@ function setupHysteresisInput() {
     });
 }
 
-async function loadActiveIntervalDetails() {
-    try {
-        const data = await fetchActiveIntervalDetails();
-        updateActiveIntervalDisplay(data);
-    } catch (error) {
-        console.error('Error loading interval details:', error);
-    }
-}
-
-async function loadActiveConfig() {
-    try {
-        const data = await fetchActiveConfig();
-        updateConfigDisplay(data);
-    } catch (error) {
-        console.error('Error loading active config:', error);
-    }
-}
-
-async function loadDeviceStatus() {
-    try {
-        const data = await fetchDeviceStatus();
-        updateDeviceStatusDisplay(data);
-    } catch (error) {
-        console.error('Error loading device status:', error);
-    }
-}
-
 function updateDeviceStatusDisplay(data) {
     const sensorBadge = document.getElementById('sensor-status-badge');
     const sensorDeviceId = document.getElementById('sensor-device-id');
@@ -52,8 +52,9 @@ function updateStatusDisplay(state) {
         staleWarning.style.display = 'none';
         tempCard.classList.remove('temp-card-warning');
     }
+}
 
-    const serverTime = new Date(state.server_time);
+function updateServerTimeDisplay(serverTime) {
     const dateOptions = { weekday: 'short', year: 'numeric', month: 'short', day: 'numeric' };
     const dateStr = serverTime.toLocaleDateString(undefined, dateOptions);
     const timeStr = serverTime.toLocaleTimeString(undefined, { hour12: false });
@@ -0,0 +1,52 @@
+from collections import OrderedDict, defaultdict
+from typing import Dict, List
+import pytest
+from app.constants import DAYS_OF_WEEK
+from app.repositories import config_repo, device_status_repo, history_repo, journal_repo, state_repo
+from app.repositories import storage as storage_module
+
+
+def interval(start: str, end: str, on: float = 20.0, off: float = 21.0) -> Dict:
+    """Raw interval from "HH:MM" start and end times"""
+    start_hour, start_minute = map(int, start.split(":"))
+    end_hour, end_minute = map(int, end.split(":"))
+    return {
+        "start_time": {"hour": start_hour, "minute": start_minute},
+        "end_time": {"hour": end_hour, "minute": end_minute},
+        "ON_temperature": on,
+        "OFF_temperature": off,
+    }
+
+
+def week(intervals: List[Dict], days=DAYS_OF_WEEK) -> Dict:
+    """Raw configuration with the same intervals on the given days and none on the others"""
+    return {day: [dict(item) for item in intervals] if day in days else [] for day in DAYS_OF_WEEK}
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Empty JSON storage in a temporary directory, with every repository's in-memory state reset"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage_module, "_backend", None)
+    monkeypatch.setattr(config_repo, "_config_cache", OrderedDict())
+    monkeypatch.setattr(config_repo, "_config_etags", {})
+    monkeypatch.setattr(config_repo, "_raw_configs", None)
+    monkeypatch.setattr(config_repo, "_store_signature", None)
+    monkeypatch.setattr(config_repo, "_last_change_check", 0.0)
+    monkeypatch.setattr(state_repo, "_zones", {})
+    monkeypatch.setattr(state_repo, "_known_zones", None)
+    monkeypatch.setattr(state_repo, "_dirty_zones", set())
+    monkeypatch.setattr(state_repo, "_flush_timer", None)
+    monkeypatch.setattr(journal_repo, "_journals", {})
+    monkeypatch.setattr(journal_repo, "_dirty_zones", set())
+    monkeypatch.setattr(journal_repo, "_flush_timer", None)
+    monkeypatch.setattr(history_repo, "_hot_tiers", {})
+    monkeypatch.setattr(device_status_repo, "_statuses", {})
+    monkeypatch.setattr(device_status_repo, "_device_types", {})
+    monkeypatch.setattr(device_status_repo, "_last_seen", {})
+    monkeypatch.setattr(device_status_repo, "_expiry_timers", {})
+    monkeypatch.setattr(device_status_repo, "_device_status_versions", defaultdict(int))
+    yield tmp_path / "storage"
+    # Write behind while still in the temporary directory, this also cancels the pending flush timers
+    state_repo.flush_state()
+    journal_repo.flush_rollups()
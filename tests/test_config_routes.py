@@ -0,0 +1,57 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import config_routes
+from app.constants import DEFAULT_INTERVALS
+from app.repositories import config_repo
+from conftest import week
+
+
+@pytest.fixture
+def client(storage):
+    config_repo.save_all_configs({"Default": week(DEFAULT_INTERVALS)})
+    app = FastAPI()
+    app.include_router(config_routes.router)
+    return TestClient(app)
+
+
+def test_patch_with_a_stale_etag_is_rejected(client):
+    etag = client.get("/configs/Default").headers["ETag"]
+
+    first = client.patch("/configs/Default/days/monday/intervals/0", json={"ON_temperature": 19.5},
+                         headers={"If-Match": etag})
+    assert first.status_code == 200
+    new_etag = first.headers["ETag"]
+    assert new_etag != etag and first.json()["etag"] == new_etag
+
+    # A second client still holding the first ETag
+    conflict = client.patch("/configs/Default/days/monday/intervals/0", json={"ON_temperature": 18.0},
+                            headers={"If-Match": etag})
+    assert conflict.status_code == 409
+    assert conflict.headers["ETag"] == new_etag
+    assert config_repo.load_config("Default").monday[0].ON_temperature == 19.5
+
+    # Retrying with the ETag from the 409 goes through
+    retry = client.patch("/configs/Default/days/monday/intervals/0", json={"ON_temperature": 18.0},
+                         headers={"If-Match": f"W/{new_etag}"})
+    assert retry.status_code == 200
+    assert config_repo.load_config("Default").monday[0].ON_temperature == 18.0
+
+
+def test_every_edit_checks_the_etag(client):
+    etag = client.get("/configs/Default").headers["ETag"]
+    assert client.patch("/configs/Default/days/monday/intervals/1", json={"OFF_temperature": 22.5},
+                        headers={"If-Match": etag}).status_code == 200
+
+    stale = {"If-Match": etag}
+    assert client.patch("/configs/Default/days/tuesday", json=DEFAULT_INTERVALS, headers=stale).status_code == 409
+    assert client.post("/configs/Default/days/monday/copy", json={"to": ["sunday"]}, headers=stale).status_code == 409
+    assert client.put("/configs/Default", json=week(DEFAULT_INTERVALS), headers=stale).status_code == 409
+
+
+def test_edits_without_if_match_are_not_checked(client):
+    client.patch("/configs/Default/days/monday/intervals/0", json={"ON_temperature": 19.5})
+
+    response = client.patch("/configs/Default/days/monday/intervals/0", json={"ON_temperature": 18.0})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == client.get("/configs/Default").headers["ETag"]
@@ -0,0 +1,144 @@
+import math
+import time
+import pytest
+from app.mqtt import dispatcher as dispatcher_module
+from app.mqtt.dispatcher import CommandDispatcher
+from app.utils.scheduler import Scheduler
+
+
+class ManualScheduler(Scheduler):
+    """Keeps its timers without a thread, the test fires them one by one"""
+
+    def __init__(self):
+        super().__init__("test")
+        self._stopping = True  # never starts the thread
+
+    def fire_next(self):
+        timer, _ = self._next_due(math.inf)
+        assert timer is not None, "no timer pending"
+        timer.callback(*timer.args)
+        return timer
+
+
+@pytest.fixture
+def scheduler():
+    return ManualScheduler()
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def applied():
+    return []
+
+
+@pytest.fixture
+def dispatcher(scheduler, sent, applied):
+    return CommandDispatcher(
+        lambda zone_id, target_state, correlation_id: sent.append((zone_id, target_state, correlation_id)),
+        lambda zone_id, target_state: applied.append((zone_id, target_state)),
+        scheduler
+    )
+
+
+def test_ack_applies_the_command(dispatcher, scheduler, sent, applied):
+    correlation_id = dispatcher.request("default", True)
+
+    assert sent == [("default", True, correlation_id)]
+    assert dispatcher.acknowledge("default", correlation_id)
+    assert applied == [("default", True)]
+    assert dispatcher.in_flight() == []
+    assert scheduler.pending() == 0
+    assert dispatcher.stats()["acknowledged"] == 1
+
+
+def test_bare_ack_matches_the_command_in_flight(dispatcher, applied):
+    dispatcher.request("default", False)
+
+    assert dispatcher.acknowledge("default")
+    assert applied == [("default", False)]
+    assert not dispatcher.acknowledge("default")
+    assert dispatcher.stats()["unmatched_acks"] == 1
+
+
+def test_ack_with_another_correlation_id_is_ignored(dispatcher, applied):
+    dispatcher.request("default", True)
+
+    assert not dispatcher.acknowledge("default", "somebody-else")
+    assert applied == []
+    assert len(dispatcher.in_flight()) == 1
+
+
+def test_same_request_is_deduplicated(dispatcher, sent):
+    first = dispatcher.request("default", True)
+
+    assert dispatcher.request("default", True) == first
+    assert len(sent) == 1
+    assert dispatcher.stats()["deduplicated"] == 1
+
+
+def test_opposite_request_supersedes(dispatcher, scheduler, sent, applied):
+    first = dispatcher.request("default", True)
+    second = dispatcher.request("default", False)
+
+    assert second != first
+    assert [command[1] for command in sent] == [True, False]
+    assert scheduler.pending() == 1  # the superseded command's timer is gone
+    assert not dispatcher.acknowledge("default", first)
+    assert dispatcher.acknowledge("default", second)
+    assert applied == [("default", False)]
+    assert dispatcher.stats()["superseded"] == 1
+
+
+def test_zones_do_not_interfere(dispatcher, applied):
+    attic = dispatcher.request("attic", True)
+    dispatcher.request("cellar", False)
+
+    assert dispatcher.acknowledge("attic", attic)
+    assert applied == [("attic", True)]
+    assert [command["zone_id"] for command in dispatcher.in_flight()] == ["cellar"]
+
+
+def test_unacknowledged_command_is_retried_with_backoff_then_given_up(dispatcher, scheduler, sent, applied):
+    correlation_id = dispatcher.request("default", True)
+
+    retried_at = time.monotonic()
+    timer = scheduler.fire_next()
+    assert sent[-1] == ("default", True, correlation_id)
+    assert dispatcher.in_flight()[0]["attempts"] == 2
+    # The second attempt waits twice as long for its ACK as the first
+    assert timer.when - retried_at == pytest.approx(
+        dispatcher_module.ACK_TIMEOUT * dispatcher_module.BACKOFF_FACTOR, abs=0.5
+    )
+
+    for _ in range(dispatcher_module.MAX_ATTEMPTS - 1):
+        scheduler.fire_next()
+
+    assert len(sent) == dispatcher_module.MAX_ATTEMPTS
+    assert dispatcher.in_flight() == []
+    assert dispatcher.stats()["failed"] == 1
+    assert scheduler.pending() == 0
+    assert not dispatcher.acknowledge("default", correlation_id)
+    assert applied == []
+
+
+def test_ack_after_a_retry_still_applies(dispatcher, scheduler, applied):
+    correlation_id = dispatcher.request("default", True)
+    scheduler.fire_next()
+
+    assert dispatcher.acknowledge("default", correlation_id)
+    assert applied == [("default", True)]
+    assert scheduler.pending() == 0
+
+
+def test_settle_completes_a_command_reported_done(dispatcher, scheduler, applied):
+    dispatcher.request("default", True)
+
+    assert not dispatcher.settle("default", False)
+    assert dispatcher.settle("default", True)
+    assert dispatcher.in_flight() == []
+    assert scheduler.pending() == 0
+    assert applied == []  # the relay already reported the state, nothing to apply
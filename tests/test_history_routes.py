@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import history_routes
+from app.constants import DEFAULT_ZONE
+from app.repositories import history_repo, state_repo
+
+
+@pytest.fixture
+def client(storage):
+    state_repo.create_zone(DEFAULT_ZONE)
+    app = FastAPI()
+    app.include_router(history_routes.router)
+    return TestClient(app)
+
+
+def test_history_accepts_timestamps_with_an_offset(client):
+    moment = datetime.now().replace(microsecond=0) - timedelta(hours=2)
+    history_repo.append_reading(20.5, moment)
+
+    start = (moment - timedelta(hours=1)).astimezone(timezone.utc).isoformat()
+    response = client.get("/history", params={"from": start, "bucket": "1h"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["from"] == (moment - timedelta(hours=1)).isoformat()
+    assert sum(bucket["count"] for bucket in body["buckets"]) == 1
+
+
+def test_history_rejects_malformed_timestamps(client):
+    assert client.get("/history", params={"from": "yesterday"}).status_code == 400
@@ -0,0 +1,55 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.models.state import State
+from app.repositories import journal_repo
+
+
+@pytest.fixture
+def journal(storage):
+    return journal_repo
+
+
+def state(boiler_state: bool) -> State:
+    return State("Default", "monday:0", boiler_state, 20.0, None, 20.0, None, 15, 0)
+
+
+def test_events_do_not_rewrite_the_rollups_file(journal, tmp_path):
+    start = datetime.now() - timedelta(hours=3)
+    for i in range(6):
+        journal.record_event(journal.EVENT_BOILER, state(i % 2 == 0), start + timedelta(minutes=30 * i))
+
+    rollups_file = tmp_path / "storage" / journal.ROLLUPS_FILE_NAME
+    assert not rollups_file.exists()
+    assert journal._flush_timer is not None and journal._flush_timer.pending
+
+    journal.flush_rollups()
+    assert journal._flush_timer is None
+    saved = json.loads(rollups_file.read_text())
+    assert saved["journal_offset"] == (tmp_path / "storage" / journal.JOURNAL_FILE_NAME).stat().st_size
+    assert sum(bucket["toggles"] for bucket in saved["daily"].values()) == 6
+
+
+def test_unflushed_rollups_are_recovered_from_the_journal(journal, monkeypatch):
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+    journal.record_event(journal.EVENT_BOILER, state(True), start)
+    journal.flush_rollups()
+    journal.record_event(journal.EVENT_BOILER, state(False), start + timedelta(minutes=45))
+
+    # A restart before the second event's rollups were written
+    monkeypatch.setattr(journal_repo, "_journals", {})
+    buckets = journal.get_rollups("hourly", start, start, now=start + timedelta(hours=1))
+    assert buckets[0]["on_seconds"] == 45 * 60
+    assert buckets[0]["toggles"] == 2
+
+
+def test_old_hourly_buckets_are_pruned(journal, tmp_path):
+    old = datetime.now() - timedelta(days=journal.HOURLY_RETENTION_DAYS + 2)
+    journal.record_event(journal.EVENT_BOILER, state(True), old)
+    journal.record_event(journal.EVENT_BOILER, state(False), old + timedelta(hours=1))
+    journal.record_event(journal.EVENT_BOILER, state(True), datetime.now() - timedelta(hours=1))
+    journal.flush_rollups()
+
+    saved = json.loads((tmp_path / "storage" / journal.ROLLUPS_FILE_NAME).read_text())
+    assert min(saved["hourly"]) >= (datetime.now() - timedelta(days=journal.HOURLY_RETENTION_DAYS)).strftime("%Y-%m-%dT%H")
+    assert old.strftime("%Y-%m-%d") in saved["daily"]
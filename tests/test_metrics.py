@@ -0,0 +1,27 @@
+import pytest
+from app.utils import metrics
+
+
+def test_labels_returns_one_child_per_label_values():
+    counter = metrics.Counter("test_labels_total", "Test counter", ["zone", "code"])
+
+    counter.labels("attic", 200).inc()
+    counter.labels("attic", "200").inc(2)
+
+    assert counter.labels("attic", 200) is counter.labels("attic", "200")
+    assert counter.labels("attic", 200).value == 3
+    assert list(counter._children) == [("attic", "200")]
+
+
+def test_existing_child_is_not_rebuilt(monkeypatch):
+    histogram = metrics.Histogram("test_labels_seconds", "Test histogram", ["op"])
+    child = histogram.labels("load")
+    monkeypatch.setattr(histogram, "_new_child", lambda: pytest.fail("child built for an existing label set"))
+
+    assert histogram.labels("load") is child
+
+
+def test_wrong_number_of_labels():
+    counter = metrics.Counter("test_label_count_total", "Test counter", ["zone"])
+    with pytest.raises(ValueError):
+        counter.labels("attic", "extra")
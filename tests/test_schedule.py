@@ -0,0 +1,79 @@
+from datetime import datetime
+from app.models.schedule import MINUTES_PER_DAY, MINUTES_PER_WEEK, minute_of_week
+from app.repositories import config_repo
+from conftest import interval, week
+
+SUNDAY = 6
+
+
+def compile_week(raw):
+    return config_repo.compile_schedule(config_repo.parse_candidate("test", raw))
+
+
+def test_interval_at_follows_each_day():
+    schedule = compile_week(week([interval("00:00", "11:59"), interval("12:00", "23:59")]))
+
+    assert schedule.interval_at(0) == "monday:0"
+    assert schedule.interval_at(11 * 60 + 59) == "monday:0"
+    assert schedule.interval_at(12 * 60) == "monday:1"
+    assert schedule.interval_at(minute_of_week(2, 12 * 60)) == "wednesday:1"
+    assert schedule.interval_at(MINUTES_PER_WEEK - 1) == "sunday:1"
+
+
+def test_interval_wrapping_midnight_covers_both_ends_of_its_day():
+    schedule = compile_week(week([interval("06:00", "21:59"), interval("22:00", "05:59")]))
+
+    assert schedule.interval_at(minute_of_week(1, 5 * 60 + 59)) == "tuesday:1"
+    assert schedule.interval_at(minute_of_week(1, 6 * 60)) == "tuesday:0"
+    assert schedule.interval_at(minute_of_week(1, 23 * 60)) == "tuesday:1"
+    # After midnight the next day's own list applies, even though the interval continues
+    assert schedule.interval_at(minute_of_week(2, 0)) == "wednesday:1"
+
+
+def test_next_transition_across_midnight():
+    schedule = compile_week(week([interval("06:00", "21:59"), interval("22:00", "05:59")]))
+
+    assert schedule.next_transition(minute_of_week(0, 22 * 60)) == minute_of_week(1, 0)
+    assert schedule.next_transition(minute_of_week(0, 23 * 60 + 59)) == minute_of_week(1, 0)
+    assert schedule.next_transition(minute_of_week(1, 0)) == minute_of_week(1, 6 * 60)
+
+
+def test_next_transition_wraps_into_next_week():
+    schedule = compile_week(week([interval("06:00", "21:59"), interval("22:00", "05:59")]))
+
+    assert schedule.next_transition(minute_of_week(SUNDAY, 22 * 60)) == 0
+    assert schedule.next_transition(MINUTES_PER_WEEK - 1) == 0
+    assert schedule.next_transition(0) == 6 * 60
+
+
+def test_days_without_intervals():
+    schedule = compile_week(week([interval("00:00", "11:59"), interval("12:00", "23:59")], days=["monday"]))
+
+    assert schedule.interval_at(minute_of_week(1, 0)) is None
+    assert schedule.interval_at(MINUTES_PER_WEEK - 1) is None
+    # Every midnight is a boundary, so a day without intervals still ends the previous day's last one
+    assert schedule.next_transition(12 * 60) == MINUTES_PER_DAY
+    assert schedule.next_transition(minute_of_week(3, 0)) == minute_of_week(4, 0)
+    assert schedule.next_transition(minute_of_week(SUNDAY, 0)) == 0
+
+
+def test_upcoming_transitions_across_week_wrap():
+    config = config_repo.parse_candidate("test", week([interval("06:00", "21:59"), interval("22:00", "05:59")]))
+    sunday_evening = datetime(2025, 11, 9, 21, 30, 45)
+
+    assert config_repo.upcoming_transitions(config, sunday_evening, 3) == [
+        (datetime(2025, 11, 9, 22, 0), "sunday:1"),
+        (datetime(2025, 11, 10, 0, 0), "monday:1"),
+        (datetime(2025, 11, 10, 6, 0), "monday:0"),
+    ]
+
+
+def test_stored_overlapping_intervals_compile_with_first_match_winning(storage):
+    # Not continuous, rejected on write, but it may already be stored
+    config_repo.save_all_configs({"Old": week([interval("06:00", "18:00"), interval("12:00", "22:00")])})
+    schedule = config_repo.compile_schedule(config_repo.load_config("Old"))
+    monday = 0
+
+    assert schedule.interval_at(minute_of_week(monday, 13 * 60)) == "monday:0"
+    assert schedule.interval_at(minute_of_week(monday, 20 * 60)) == "monday:1"
+    assert schedule.interval_at(minute_of_week(monday, 23 * 60)) is None
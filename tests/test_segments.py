@@ -0,0 +1,23 @@
+from datetime import datetime
+from app.repositories.backends.segments import SegmentStore
+
+
+def test_open_ended_range_stops_at_the_newest_segment(tmp_path):
+    store = SegmentStore(tmp_path)
+    timestamp = int(datetime(2025, 3, 10, 12, 0).timestamp())
+    store.append(timestamp, 205, 1)
+
+    reader = SegmentStore(tmp_path)  # another process, it only knows the files on disk
+    assert list(reader.iter_records(timestamp - 86400, 2 ** 32 - 1)) == [(timestamp, 205, 1)]
+    assert list(reader._segments) == ["2025_03"]
+    names = reader._segment_names_between(timestamp, 2 ** 32 - 1, reader._last_segment_name())
+    assert names[0] == "2025_03" and names[-1] == datetime.now().strftime("%Y_%m")
+
+
+def test_months_without_readings_are_not_cached(tmp_path):
+    store = SegmentStore(tmp_path)
+    start = int(datetime(2024, 1, 1).timestamp())
+    end = int(datetime(2024, 7, 1).timestamp())
+
+    assert list(store.iter_records(start, end)) == []
+    assert store._segments == {}
@@ -0,0 +1,43 @@
+import sqlite3
+import pytest
+from app.repositories.backends import sqlite_backend
+from app.repositories.backends.sqlite_backend import SqliteBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SqliteBackend(tmp_path / "boiler.db", pool_size=1)
+    yield backend
+    backend.close()
+
+
+def test_iter_readings_streams_every_row_in_order(backend):
+    expected = [(1000 + i // 3, 200 + i % 50, i % 2) for i in range(3 * sqlite_backend.FETCH_SIZE)]
+    for record in expected:
+        assert backend.append_reading("default", *record)
+
+    assert list(backend.iter_readings("default", 1000, 2000)) == [record for record in expected if record[0] < 2000]
+    assert list(backend.iter_readings("default", 1500, 1502)) == [record for record in expected if 1500 <= record[0] < 1502]
+
+
+def test_streaming_reader_does_not_hold_a_connection(backend):
+    for i in range(2 * sqlite_backend.FETCH_SIZE):
+        backend.append_reading("default", i, 200, 0)
+
+    reader = backend.iter_readings("default", 0, 10 ** 6)
+    next(reader)
+    # The pool has one connection; a writer must still get it while the reader is paused mid-stream
+    assert backend.append_reading("default", 10 ** 5, 210, 1)
+    backend.save_state("default", {"boiler_state": "ON"})
+
+    assert len(list(reader)) == 2 * sqlite_backend.FETCH_SIZE  # the first row plus the new one
+    reader.close()
+
+
+def test_exhausted_pool_raises_instead_of_waiting_forever(backend, monkeypatch):
+    monkeypatch.setattr(sqlite_backend, "POOL_TIMEOUT", 0.05)
+    with backend._pool.connection():
+        with pytest.raises(sqlite3.OperationalError):
+            backend.save_state("default", {"boiler_state": "ON"})
+    backend.save_state("default", {"boiler_state": "ON"})
+    assert backend.load_state("default") == {"boiler_state": "ON"}
@@ -0,0 +1,45 @@
+from app import startup
+from app.constants import DEFAULT_INTERVALS
+from app.repositories import config_repo, history_repo
+from conftest import week
+
+
+def test_bad_configuration_and_readings_file_are_skipped_and_mqtt_still_starts(storage, tmp_path, monkeypatch):
+    readings = tmp_path / "temp_readings"
+    readings.mkdir()
+    (readings / "2025_01_01.txt").write_text("08:00:00,20.5\nnot a reading\n08:05:00,20.7\n")
+    monkeypatch.setattr(history_repo, "LEGACY_READINGS_DIR", readings)
+    config_repo.save_all_configs({"Default": week(DEFAULT_INTERVALS), "Broken": {"monday": [{"start_time": {}}]}})
+
+    monkeypatch.setattr(startup, "phases", {})
+    monkeypatch.setattr(startup, "skipped", {})
+    monkeypatch.setattr(startup, "failed_phase", None)
+    monkeypatch.setattr(startup, "warmed_up", startup.threading.Event())
+    mqtt_started = []
+    monkeypatch.setattr(startup, "start_mqtt", lambda: mqtt_started.append(True))
+
+    startup.run()
+
+    report = startup.report()
+    assert mqtt_started and report["complete"] and report["failed_phase"] is None
+    assert set(report["skipped"]) == {"history_import", "configs"}
+    assert "line 2" in report["skipped"]["history_import"]["2025_01_01.txt"]
+    assert list(report["skipped"]["configs"]) == ["Broken"]
+    assert len(list(history_repo.iter_text_readings(readings))) == 2
+
+
+def test_failed_warm_up_phase_does_not_keep_mqtt_down(storage, monkeypatch):
+    def fail():
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(startup, "phases", {})
+    monkeypatch.setattr(startup, "failed_phase", None)
+    monkeypatch.setattr(startup, "warmed_up", startup.threading.Event())
+    monkeypatch.setattr(config_repo, "load_all_configs", fail)
+    mqtt_started = []
+    monkeypatch.setattr(startup, "start_mqtt", lambda: mqtt_started.append(True))
+
+    startup.run()
+
+    assert mqtt_started
+    assert startup.report()["failed_phase"] == "configs"
@@ -0,0 +1,32 @@
+from dataclasses import replace
+from datetime import datetime
+from app.constants import DEFAULT_INTERVALS
+from app.repositories import config_repo, state_repo
+from conftest import week
+
+
+def test_first_reading_of_a_zone_without_an_active_interval(storage):
+    state = state_repo.create_zone("attic")  # no configuration exists yet, so no interval either
+    assert state.active_interval is None
+
+    config_repo.save_all_configs({"Default": week(DEFAULT_INTERVALS)})
+    state_repo.save_state_threadsafe(replace(state, selected_config="Default"), zone_id="attic")
+
+    assert state_repo.temp_heartbeat(15.0, "attic") is True
+    assert state_repo.load_state_threadsafe("attic").active_interval is not None
+
+
+def test_reading_of_a_zone_when_no_configuration_was_ever_saved(storage):
+    state_repo.create_zone("attic")
+
+    assert state_repo.temp_heartbeat(15.0, "attic") is False
+    state = state_repo.load_state_threadsafe("attic")
+    assert state.selected_config is None and state.active_interval is None
+    assert state.current_temp == 15.0
+
+
+def test_reading_on_a_day_without_intervals_decides_nothing(storage):
+    config = config_repo.parse_candidate("Weekdays", week(DEFAULT_INTERVALS, days=["monday"]))
+    sunday = datetime(2025, 11, 9, 12, 0)
+
+    assert state_repo.evaluate_reading(15.0, False, config, sunday) == (None, False)
@@ -0,0 +1,16 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import stats_routes
+from app.constants import DEFAULT_ZONE
+from app.repositories import state_repo
+
+
+def test_stats_accept_timestamps_with_an_offset(storage):
+    state_repo.create_zone(DEFAULT_ZONE)
+    app = FastAPI()
+    app.include_router(stats_routes.router)
+
+    response = TestClient(app).get("/stats", params={"from": "2025-01-01T00:00:00+00:00"})
+
+    assert response.status_code == 200
+    assert response.json()["period"] == "daily"
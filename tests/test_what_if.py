@@ -0,0 +1,110 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import replay, what_if
+from app.api import what_if_routes
+from app.constants import DEFAULT_ZONE
+from app.repositories import config_repo, history_repo, state_repo
+from conftest import interval, week
+
+
+@pytest.fixture
+def config():
+    return config_repo.parse_candidate("test", week([
+        interval("06:00", "21:59", on=20.0, off=21.0),
+        interval("22:00", "05:59", on=17.0, off=18.0),
+    ]))
+
+
+def sparse_readings(start: datetime, days: int):
+    """A reading every 97 minutes, never on a schedule boundary; far apart compared to the sensor's cadence"""
+    readings = []
+    for i in range(days * 24 * 60 // 97):
+        moment = start + timedelta(minutes=7 + 97 * i)
+        if moment.hour * 60 + moment.minute in (0, 6 * 60, 22 * 60):
+            continue
+        readings.append((moment, 16.5 + (i * 37 % 50) / 10))
+    return readings
+
+
+@pytest.mark.parametrize("boiler_on", [False, True])
+def test_what_if_agrees_with_replay_on_a_sparse_trace(config, boiler_on):
+    start = datetime(2025, 11, 3)
+    end = start + timedelta(days=10)
+    readings = sparse_readings(start, 10)
+    records = [(int(moment.timestamp()), round(temp * 10), 0) for moment, temp in readings]
+
+    replayed = replay.replay(config, readings, boiler_on, end)
+    trace = what_if.build_trace(records, int(end.timestamp()))
+    result = what_if.evaluate(config, trace, boiler_on)
+
+    assert trace.start == readings[0][0]
+    assert not any(math.isnan(temp) for temp in trace.temps)
+    assert result["runtime_hours_per_week"] * trace.weeks == pytest.approx(replayed.on_seconds / 3600, abs=0.01)
+    assert result["toggles_per_week"] * trace.weeks == pytest.approx(len(replayed.toggles), abs=0.1)
+
+
+def test_steady_temperature_counts_as_discomfort(config):
+    start = datetime(2025, 11, 3, 8, 0)
+    end = start + timedelta(hours=10)
+    trace = what_if.build_trace([(int(start.timestamp()), 185, 0)], int(end.timestamp()))
+
+    result = what_if.evaluate(config, trace)
+
+    assert len(trace.temps) == 10 * 60
+    # 1.5 degrees below ON for the whole 10 hours
+    assert result["comfort_deviation_degree_hours_per_week"]["below_on"] * trace.weeks == pytest.approx(15.0, abs=0.01)
+    assert result["toggles_per_week"] * trace.weeks == pytest.approx(1)
+
+
+def test_long_silence_is_left_out():
+    start = datetime(2025, 11, 3, 8, 0)
+    silence = what_if.MAX_HOLD_MINUTES + 120
+    records = [(int(start.timestamp()), 200, 0), (int(start.timestamp()) + silence * 60, 200, 0)]
+    trace = what_if.build_trace(records, records[-1][0] + 60)
+
+    assert trace.temps[what_if.MAX_HOLD_MINUTES - 1] == 20.0
+    assert math.isnan(trace.temps[what_if.MAX_HOLD_MINUTES])
+    assert trace.temps[silence] == 20.0
+
+
+@pytest.fixture
+def berlin(monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_thresholds_follow_local_time_across_both_daylight_saving_changes(config, berlin):
+    start = datetime(2025, 1, 1)
+    end = datetime(2026, 1, 1)
+    trace = what_if.build_trace([(int(start.timestamp()), 200, 0)], int(end.timestamp()))
+    on = what_if._expand(what_if._week_thresholds(config)[0], trace)
+
+    # Same UTC offset at both ends, the summer in between is one hour ahead
+    assert len(trace.segments) == 3
+    for moment in (datetime(2025, 1, 15, 6, 0), datetime(2025, 7, 1, 6, 0), datetime(2025, 12, 15, 6, 0)):
+        index = (int(moment.timestamp()) - int(start.timestamp())) // 60
+        assert on[index - 1] == 17.0, moment
+        assert on[index] == 20.0, moment
+
+
+def test_route_accepts_timestamps_with_an_offset(storage):
+    state_repo.create_zone(DEFAULT_ZONE)
+    now = datetime.now().replace(second=0, microsecond=0)
+    for hours in range(12, 0, -1):
+        history_repo.append_reading(19.0 + hours % 3, now - timedelta(hours=hours))
+    app = FastAPI()
+    app.include_router(what_if_routes.router)
+
+    start = (now - timedelta(hours=13)).astimezone(timezone.utc).isoformat()
+    response = TestClient(app).post("/what-if", json={"from": start, "candidates": {"Test": week([
+        interval("06:00", "21:59"), interval("22:00", "05:59")])}})
+
+    assert response.status_code == 200
+    assert response.json()["readings"] == 12